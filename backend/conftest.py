@@ -0,0 +1,29 @@
+# backend/conftest.py
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+
+def fake_month(path, start, days=3):
+    """Hourly tp/t2m NetCDF on a 2x3 grid, laid out like the extracted CDS files."""
+    times = pd.date_range(start, periods=24 * days, freq="h")
+    lats = np.array([35.3, 35.2])
+    lons = np.array([33.1, 33.2, 33.3])
+    rng = np.random.default_rng(0)
+    shape = (len(times), len(lats), len(lons))
+    ds = xr.Dataset(
+        {
+            "tp": (("valid_time", "latitude", "longitude"), rng.random(shape) / 1000),
+            "t2m": (("valid_time", "latitude", "longitude"), 280 + rng.random(shape)),
+        },
+        coords={"valid_time": times, "latitude": lats, "longitude": lons},
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    ds.to_netcdf(path)
+
+
+@pytest.fixture
+def write_fake_month():
+    return fake_month
@@ -0,0 +1,62 @@
+# backend/test_aggregate_era5.py
+import sys
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import aggregate_era5, preprocess_era5
+
+
+def test_netcdf_daily_matches_table_path(tmp_path, write_fake_month):
+    data_dir = tmp_path / "extracted"
+    write_fake_month(str(data_dir / "era5_2023_01" / "data_0.nc"), "2023-01-29", days=3)
+    write_fake_month(str(data_dir / "era5_2023_02" / "data_0.nc"), "2023-02-01", days=2)
+
+    csv_path = str(tmp_path / "era5_combined.csv")
+    preprocess_era5.preprocess_real_nc(str(data_dir), csv_path)
+    aggregate_era5.aggregate(csv_path, str(tmp_path / "from_table.csv"))
+    rows = aggregate_era5.aggregate_netcdf(str(data_dir), str(tmp_path / "from_nc.csv"), chunk_days=2)
+
+    keys = ["date", "latitude", "longitude"]
+    a = pd.read_csv(tmp_path / "from_table.csv").sort_values(keys).reset_index(drop=True)
+    b = pd.read_csv(tmp_path / "from_nc.csv").sort_values(keys).reset_index(drop=True)
+
+    assert rows == len(b) == 5 * 6
+    assert list(a.columns) == list(b.columns) == keys + ["tp", "t2m", "t2m_max", "t2m_min"]
+    assert (a["date"] == b["date"]).all()
+    np.testing.assert_allclose(a[["tp", "t2m", "t2m_max", "t2m_min"]], b[["tp", "t2m", "t2m_max", "t2m_min"]])
+
+
+def test_precipitation_is_summed_not_averaged(tmp_path, write_fake_month):
+    path = str(tmp_path / "m" / "data_0.nc")
+    write_fake_month(path, "2023-03-01", days=1)
+    aggregate_era5.aggregate_netcdf(str(tmp_path), str(tmp_path / "daily.csv"))
+
+    daily = pd.read_csv(tmp_path / "daily.csv")
+    with xr.open_dataset(path) as ds:
+        expected = ds["tp"].sum("valid_time").values
+    got = daily.sort_values(["latitude", "longitude"], ascending=[False, True])["tp"].to_numpy()
+    np.testing.assert_allclose(got, expected.ravel())
+
+
+def test_flat_monthly_files_are_grouped_by_month(tmp_path, write_fake_month):
+    # download_era5 layout: one file per month in one folder
+    data_dir = tmp_path / "data"
+    write_fake_month(str(data_dir / "era5_2023_01.nc"), "2023-01-29", days=3)
+    write_fake_month(str(data_dir / "era5_2023_02.nc"), "2023-02-01", days=2)
+    # one month cut into time slices with no date in the names
+    write_fake_month(str(data_dir / "slices" / "a.nc"), "2023-03-01", days=1)
+    write_fake_month(str(data_dir / "slices" / "b.nc"), "2023-03-02", days=1)
+
+    groups = aggregate_era5.find_month_groups(str(data_dir))
+    assert [[os.path.basename(p) for p in g] for g in groups] == [["era5_2023_01.nc"], ["era5_2023_02.nc"],
+                                                                  ["a.nc", "b.nc"]]
+
+    rows = aggregate_era5.aggregate_netcdf(str(data_dir), str(tmp_path / "daily.csv"))
+    daily = pd.read_csv(tmp_path / "daily.csv")
+    assert list(daily.columns) == ["date", "latitude", "longitude", "tp", "t2m", "t2m_max", "t2m_min"]
+    assert rows == len(daily) == 7 * 6
+    assert not daily.duplicated(["date", "latitude", "longitude"]).any()
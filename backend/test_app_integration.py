@@ -2,7 +2,7 @@
 import sys
 import os
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, patch
 
 # Add root to path so we can import src.app_api
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -26,12 +26,9 @@ def test_predict_endpoint_valid():
     assert "flood_risk" in data
     assert "predicted_rainfall_mm" in data
 
-@patch("src.app_api.requests.get")
-def test_predict_location(mock_get):
-    # Mock OWM response
-    mock_resp = MagicMock()
-    mock_resp.status_code = 200
-    mock_resp.json.return_value = {
+def test_predict_location():
+    from src.app_api import weather_client
+    weather = {
         "weather": [{"description": "clear sky"}],
         "main": {
             "temp": 25.0,
@@ -41,33 +38,36 @@ def test_predict_location(mock_get):
         "wind": {"speed": 3.5},
         "clouds": {"all": 10}
     }
-    mock_get.return_value = mock_resp
+    forecast = {"list": [
+        {"dt": 1700000000 + 10800 * i, "main": {"temp": 24.0, "temp_max": 26.0, "temp_min": 18.0}, "pop": 0.2,
+         "wind": {"speed": 3.0}, "weather": [{"main": "Rain", "description": "light rain"}]}
+        for i in range(25)
+    ]}
 
-    # Need API key env var for this endpoint check, or mock os.getenv (but we are running in same env)
-    # The endpoint checks if key is missing.
-    with patch("os.getenv", return_value="fake_key"):
+    # Mock the OpenWeather round trip; the cache must not answer from an earlier test
+    weather_client.clear()
+    with patch.object(weather_client, "fetch", AsyncMock(return_value=(weather, forecast))) as fetch:
         response = client.get("/predict-location?lat=35.1&lon=33.3")
-    
+    weather_client.clear()
+
     assert response.status_code == 200
+    fetch.assert_awaited_once()
     data = response.json()
+    assert data["weather_summary"] == "clear sky"
     assert "prediction" in data
     assert data["prediction"]["flood_risk"] in ["Low", "Moderate", "High"]
 
-@patch("src.app_api.subprocess.run")
+@patch("src.app_api.hourly_prediction_pipeline.run_pipeline")
 def test_grid_refresh(mock_run):
-    mock_run.return_value = MagicMock(stdout="Pipeline success")
-    
-    # We must mock os.path.exists to pass the check for script existence
-    # because the test might run from backend/ dir where path resolution is tricky
-    # But updated app_api uses os.path.join("src", ...)
-    
+    from src.app_api import refresh_jobs
+    mock_run.return_value = {"processed": 1}
+
     response = client.post("/grid/refresh")
-    # This might fail 404 if it can't find the script relative to CWD
-    # Start test from root to be safe
-    
-    if response.status_code == 404:
-        # Script not found, understandable in test env if CWD wrong
-        pytest.skip("Test skipped due to script path resolution in test env")
-    else:
-        assert response.status_code == 200
-        assert "success" in response.json()["status"]
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert refresh_jobs.get(job_id).finished.wait(10)
+
+    response = client.get(f"/grid/jobs/{job_id}")
+    assert response.status_code == 200
+    assert response.json()["state"] == "succeeded"
+    assert mock_run.call_args.kwargs["model"] == "rf"
@@ -0,0 +1,121 @@
+# backend/test_batching.py
+import sys
+import os
+import asyncio
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import inference
+from batching import MicroBatcher
+
+
+class SumModel:
+    """Stand-in model: rainfall = row sum, probability = first feature; records batch sizes."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        return X.sum(axis=1)
+
+    def predict_proba(self, X):
+        return np.column_stack([1 - X[:, 0], X[:, 0]])
+
+
+def make_batcher(window_ms=5, max_rows=256):
+    model = SumModel()
+    bundle = {"reg": model, "clf": model, "scaler": None}
+    return MicroBatcher(lambda m_type: bundle, window_ms=window_ms, max_rows=max_rows), model
+
+
+def rows(n, seed=0):
+    return np.random.default_rng(seed).random((n, 10))
+
+
+def test_concurrent_requests_share_one_batch_and_get_their_own_rows():
+    batcher, model = make_batcher()
+    inputs = [rows(1, seed=i) for i in range(20)]
+
+    async def main():
+        return await asyncio.gather(*[batcher.score("xgb", X) for X in inputs])
+
+    results = asyncio.run(main())
+    assert model.calls == [20]
+    for X, out in zip(inputs, results):
+        np.testing.assert_allclose(out["predicted_rainfall_mm"], X.sum(axis=1))
+        np.testing.assert_allclose(out["flood_probability"], X[:, 0])
+
+    m = batcher.metrics()
+    assert m["batches"] == 1 and m["requests"] == 20 and m["max_queue_depth"] == 20
+    assert m["batch_rows_histogram"]["32"] == 1 and m["queue_depth"] == 0
+
+
+def test_max_rows_flushes_early_and_window_zero_disables_batching():
+    batcher, model = make_batcher(window_ms=1000, max_rows=8)
+
+    async def main(b):
+        return await asyncio.gather(*[b.score("xgb", rows(2, seed=i)) for i in range(8)])
+
+    asyncio.run(asyncio.wait_for(main(batcher), timeout=5))
+    assert model.calls == [8, 8]
+
+    batcher, model = make_batcher(window_ms=0)
+    asyncio.run(main(batcher))
+    assert model.calls == [2] * 8
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    def broken(m_type):
+        raise KeyError(m_type)
+
+    batcher = MicroBatcher(broken, window_ms=5)
+
+    async def main():
+        return await asyncio.gather(*[batcher.score("rf", rows(1)) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(r, KeyError) for r in asyncio.run(main()))
+    m = batcher.metrics()
+    assert m["errors"] == 3 and m["split_batches"] == 1
+
+
+def test_malformed_requests_are_rejected_before_queueing():
+    batcher, model = make_batcher()
+
+    async def main(X):
+        return await batcher.score("xgb", np.array(X, dtype=float).reshape(1, -1), rows=1)
+
+    for n in (9, 20):
+        try:
+            asyncio.run(main([0.5] * n))
+        except inference.PayloadError as e:
+            assert "(1, 10)" in str(e)
+        else:
+            raise AssertionError(f"{n} features were accepted")
+    assert model.calls == [] and batcher.metrics()["requests"] == 0
+
+
+def test_a_failing_request_does_not_fail_its_batch():
+    class FinickyModel(SumModel):
+        def predict(self, X):
+            if (X[:, 1] > 100).any():
+                raise ValueError("out of range")
+            return super().predict(X)
+
+    model = FinickyModel()
+    bundle = {"reg": model, "clf": model, "scaler": None}
+    batcher = MicroBatcher(lambda m_type: bundle, window_ms=5)
+    inputs = [rows(1, seed=i) for i in range(3)]
+    inputs[1][0, 1] = 1000.0
+    inf = rows(1)
+    inf[0, 2] = np.inf
+
+    async def main():
+        return await asyncio.gather(*[batcher.score("rf", X) for X in inputs + [inf]], return_exceptions=True)
+
+    ok0, bad, ok2, not_finite = asyncio.run(main())
+    assert isinstance(bad, ValueError) and isinstance(not_finite, inference.PayloadError)
+    np.testing.assert_allclose(ok0["predicted_rainfall_mm"], inputs[0].sum(axis=1))
+    np.testing.assert_allclose(ok2["predicted_rainfall_mm"], inputs[2].sum(axis=1))
+    assert batcher.metrics()["errors"] == 1
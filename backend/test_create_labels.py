@@ -0,0 +1,72 @@
+# backend/test_create_labels.py
+import sys
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from benchmarks import synthetic_daily
+from create_labels import create_labels, create_labels_streaming
+from quantile_sketch import QuantileSketch
+
+
+def test_sketch_quantile_within_relative_accuracy():
+    rng = np.random.default_rng(3)
+    values = np.concatenate([np.zeros(5000), rng.gamma(0.4, 0.004, 50000)])
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for part in np.array_split(values, 7):
+        sketch.merge(QuantileSketch(relative_accuracy=0.01).add(part))
+
+    assert sketch.count() == len(values)
+    for q in [0.05, 0.5, 0.9, 0.95, 0.99]:
+        exact = np.quantile(values, q, method="lower")
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * exact + 1e-12
+
+
+def test_grouped_sketch_matches_per_group_sketch():
+    rng = np.random.default_rng(4)
+    values = rng.gamma(0.4, 0.004, 3000)
+    groups = rng.integers(0, 3, 3000)
+    grouped = QuantileSketch().add(values, groups).quantiles(0.95)
+    for g in range(3):
+        assert grouped.loc[g] == QuantileSketch().add(values[groups == g]).quantile(0.95)
+
+
+def test_streaming_labels_match_in_memory_labels(tmp_path):
+    daily = synthetic_daily(9, 40).drop(columns=["next_tp", "flood_label"]).sort_values("date")
+    daily_path = str(tmp_path / "daily.csv")
+    daily.to_csv(daily_path, index=False)
+
+    create_labels(daily_path, str(tmp_path / "exact.csv"))
+    thresholds = create_labels_streaming(daily_path, str(tmp_path / "stream.csv"), chunksize=50)
+
+    keys = ["latitude", "longitude", "date"]
+    exact = pd.read_csv(tmp_path / "exact.csv").sort_values(keys).reset_index(drop=True)
+    stream = pd.read_csv(tmp_path / "stream.csv").sort_values(keys).reset_index(drop=True)
+    pd.testing.assert_frame_equal(stream[keys + ["tp", "next_tp"]], exact[keys + ["tp", "next_tp"]])
+
+    threshold = thresholds.iloc[0]
+    assert np.isclose(threshold, daily["tp"].quantile(0.95, interpolation="lower"), rtol=0.01)
+    assert (stream["flood_label"] == (stream["next_tp"] >= threshold)).all()
+
+
+def test_per_cell_thresholds(tmp_path):
+    daily = synthetic_daily(4, 60).drop(columns=["next_tp", "flood_label"]).sort_values("date")
+    daily_path = str(tmp_path / "daily.csv")
+    daily.to_csv(daily_path, index=False)
+
+    thresholds = create_labels_streaming(daily_path, str(tmp_path / "cell.csv"), mode="cell", chunksize=37)
+    assert len(thresholds) == 4
+    for (lat, lon), g in daily.groupby(["latitude", "longitude"]):
+        assert np.isclose(thresholds.loc[f"{lat},{lon}"], g["tp"].quantile(0.95, interpolation="lower"), rtol=0.01)
+
+
+def test_streaming_labels_refuse_unordered_input(tmp_path):
+    daily = synthetic_daily(4, 30).drop(columns=["next_tp", "flood_label"]).sort_values("date", ascending=False)
+    daily_path = str(tmp_path / "daily.csv")
+    daily.to_csv(daily_path, index=False)
+
+    with pytest.raises(ValueError, match="not ordered by date"):
+        create_labels_streaming(daily_path, str(tmp_path / "stream.csv"), chunksize=25)
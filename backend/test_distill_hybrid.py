@@ -0,0 +1,42 @@
+# backend/test_distill_hybrid.py
+import sys
+import os
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import distill_hybrid
+import inference
+from benchmarks import synthetic_daily
+from prepare_features import build_features
+from train_models import build_estimator, load_training_data
+
+
+def test_student_tracks_teacher_and_reports_latency(tmp_path):
+    path = str(tmp_path / "features.csv")
+    build_features(synthetic_daily(8, 120)).to_csv(path, index=False)
+    data = load_training_data(path)
+
+    # any fitted pair can stand in for the (slow to fit) stacking teacher
+    teacher_reg = build_estimator("xgb", "regression").fit(data["X_train"], data["y_reg_train"])
+    teacher_clf = build_estimator("xgb", "classification").fit(data["X_train"], data["y_clf_train"])
+
+    reg, clf, report = distill_hybrid.distill(teacher_reg, teacher_clf, data["X_train"], data["X_test"],
+                                              data["y_clf_test"], rounds=80)
+
+    X = data["X_test"][:5]
+    assert reg.predict(X).shape == (5,)
+    assert clf.predict_proba(X).shape == (5, 2)
+
+    fid = report["fidelity"]
+    assert fid["rows"] == len(data["X_test"])
+    assert fid["risk_band_agreement"] >= 0.8
+    assert fid["probability_mae_vs_teacher"] < 0.1
+    assert report["transfer_rows"] == len(data["X_train"]) * (distill_hybrid.AUGMENT_COPIES + 1)
+    for side in ("teacher", "student"):
+        assert report["latency"][side]["single_row_ms"] > 0
+
+
+def test_risk_bands_match_api_thresholds():
+    bands = inference.risk_levels(np.array([0.0, 0.0999, 0.10, 0.30, 0.3001, 1.0]))
+    assert bands.tolist() == [0, 0, 1, 1, 2, 2]
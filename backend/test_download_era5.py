@@ -0,0 +1,115 @@
+# backend/test_download_era5.py
+import sys
+import os
+import json
+import threading
+
+import numpy as np
+import xarray as xr
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import download_era5
+
+
+class FakeCDS:
+    """Stands in for cdsapi.Client: writes a deterministic file per request."""
+
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def retrieve(self, name, request, target):
+        key = f"{request['year']}-{request['month']}"
+        with self.lock:
+            self.calls.append(key)
+            if self.failures.get(key, 0) > 0:
+                self.failures[key] -= 1
+                # leave a truncated part file behind, like a dropped connection
+                with open(target, "wb") as f:
+                    f.write(b"partial")
+                raise ConnectionError("CDS dropped the connection")
+        with open(target, "wb") as f:
+            f.write(f"netcdf {key} {request['area']}".encode() * 100)
+
+
+def run(tmp_path, client, **kwargs):
+    return download_era5.download_all(
+        client, years=["2023"], months=["01", "02", "03"], out_dir=str(tmp_path),
+        workers=3, base_delay=0, sleep=lambda s: None, **kwargs
+    )
+
+
+def test_download_retries_and_writes_manifest(tmp_path):
+    client = FakeCDS(failures={"2023-02": 2})
+    results = run(tmp_path, client)
+
+    assert results == {"2023-01": "downloaded", "2023-02": "downloaded", "2023-03": "downloaded"}
+    assert client.calls.count("2023-02") == 3
+    assert not any(p.name.endswith(".part") for p in tmp_path.iterdir())
+
+    manifest = json.loads((tmp_path / download_era5.MANIFEST_FILE).read_text())
+    entry = manifest["2023-02"]
+    assert entry["size"] == os.path.getsize(tmp_path / "era5_2023_02.nc")
+    assert entry["sha256"] == download_era5.file_sha256(str(tmp_path / "era5_2023_02.nc"))
+
+
+def test_retry_cap_gives_up(tmp_path):
+    client = FakeCDS(failures={"2023-03": 10})
+    results = run(tmp_path, client, max_retries=2)
+
+    assert results["2023-03"] == "failed"
+    assert client.calls.count("2023-03") == 3
+    assert not (tmp_path / "era5_2023_03.nc").exists()
+
+
+def test_resume_skips_verified_and_refetches_truncated(tmp_path):
+    run(tmp_path, FakeCDS())
+
+    # truncate one finished month behind the manifest's back
+    with open(tmp_path / "era5_2023_01.nc", "r+b") as f:
+        f.truncate(10)
+
+    client = FakeCDS()
+    results = run(tmp_path, client)
+
+    assert results == {"2023-01": "downloaded", "2023-02": "skipped", "2023-03": "skipped"}
+    assert client.calls == ["2023-01"]
+
+
+def write_netcdf(path):
+    ds = xr.Dataset({"tp": (("time", "latitude"), np.arange(48.0).reshape(24, 2))},
+                    coords={"time": np.arange(24), "latitude": [35.0, 35.1]})
+    ds.to_netcdf(path)
+
+
+def test_files_from_before_the_manifest_are_adopted(tmp_path):
+    write_netcdf(tmp_path / "era5_2023_01.nc")
+    (tmp_path / "era5_2023_02.nc.part").write_bytes(b"partial")
+
+    client = FakeCDS()
+    results = run(tmp_path, client)
+
+    assert results == {"2023-01": "adopted", "2023-02": "downloaded", "2023-03": "downloaded"}
+    assert sorted(client.calls) == ["2023-02", "2023-03"]
+    entry = json.loads((tmp_path / download_era5.MANIFEST_FILE).read_text())["2023-01"]
+    assert entry["adopted"] and entry["sha256"] == download_era5.file_sha256(str(tmp_path / "era5_2023_01.nc"))
+
+    # adopted months are verified like any other on the next run
+    assert run(tmp_path, FakeCDS())["2023-01"] == "skipped"
+
+
+def test_unreadable_files_from_before_the_manifest_are_fetched_again(tmp_path):
+    good = tmp_path / "era5_2023_01.nc"
+    write_netcdf(good)
+    data = good.read_bytes()
+    good.write_bytes(data[:len(data) // 2])
+    (tmp_path / "era5_2023_02.nc").write_bytes(b"<html>CDS error page</html>")
+
+    client = FakeCDS()
+    results = run(tmp_path, client)
+
+    assert results == {"2023-01": "downloaded", "2023-02": "downloaded", "2023-03": "downloaded"}
+    assert sorted(client.calls) == ["2023-01", "2023-02", "2023-03"]
+    assert not any(e.get("adopted") for e in json.loads((tmp_path / download_era5.MANIFEST_FILE).read_text()).values())
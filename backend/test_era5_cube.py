@@ -0,0 +1,64 @@
+# backend/test_era5_cube.py
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import era5_cube
+from benchmarks import synthetic_daily
+from create_labels import create_labels
+from prepare_features import build_features
+
+
+def daily_csv(tmp_path):
+    daily = synthetic_daily(12, 30).drop(columns=["next_tp", "flood_label"])
+    path = str(tmp_path / "era5_daily.csv")
+    daily.to_csv(path, index=False)
+    return path
+
+
+def test_cube_slices(tmp_path):
+    cube = era5_cube.build_cube(daily_csv(tmp_path), str(tmp_path / "cube"), dtype="float64")
+    daily = pd.read_csv(tmp_path / "era5_daily.csv", parse_dates=["date"])
+
+    row = daily.iloc[100]
+    t = cube.day_index(row["date"])
+    i = np.searchsorted(cube.lats, row["latitude"])
+    j = np.searchsorted(cube.lons, row["longitude"])
+    assert cube["tp"][t, i, j] == row["tp"]
+    assert cube.shape == (daily["date"].nunique(), len(cube.lats), len(cube.lons))
+
+
+def test_cube_labels_and_features_match_table_path(tmp_path):
+    daily_path = daily_csv(tmp_path)
+    cube = era5_cube.build_cube(daily_path, str(tmp_path / "cube"), dtype="float64")
+
+    create_labels(daily_path, str(tmp_path / "labeled.csv"))
+    labeled = pd.read_csv(tmp_path / "labeled.csv", parse_dates=["date"])
+    threshold = era5_cube.flood_threshold(cube)
+    assert np.isclose(threshold, pd.read_csv(daily_path)["tp"].quantile(0.95))
+
+    era5_cube.write_labels(cube, str(tmp_path / "labeled_cube.csv"), threshold)
+    from_cube = pd.read_csv(tmp_path / "labeled_cube.csv", parse_dates=["date"])
+    pd.testing.assert_frame_equal(from_cube, labeled[from_cube.columns])
+
+    era5_cube.write_features(cube, str(tmp_path / "features_cube.csv"), threshold)
+    features = pd.read_csv(tmp_path / "features_cube.csv", parse_dates=["date"])
+    expected = build_features(labeled)
+    assert len(features) == len(expected)
+    pd.testing.assert_frame_equal(features, expected)
+
+
+def test_flood_threshold_streams_and_matches_numpy(tmp_path):
+    daily = synthetic_daily(12, 30).drop(columns=["next_tp", "flood_label"])
+    rng = np.random.default_rng(1)
+    # mostly dry days, repeated values and a few missing cell-days
+    daily["tp"] = np.where(rng.random(len(daily)) < 0.7, 0.0, np.round(daily["tp"], 2))
+    daily = daily.drop(index=daily.sample(frac=0.05, random_state=0).index)
+    daily.to_csv(tmp_path / "era5_daily.csv", index=False)
+    cube = era5_cube.build_cube(str(tmp_path / "era5_daily.csv"), str(tmp_path / "cube"), dtype="float64")
+
+    for q in (0.5, 0.8, 0.95, 0.99, 1.0):
+        assert np.isclose(era5_cube.flood_threshold(cube, q), np.quantile(daily["tp"], q))
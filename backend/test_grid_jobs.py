@@ -0,0 +1,66 @@
+# backend/test_grid_jobs.py
+import sys
+import os
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from grid_jobs import JobRunner, SUCCEEDED, FAILED
+
+
+def test_same_model_joins_and_jobs_run_one_at_a_time():
+    release = threading.Event()
+    running = []
+
+    def run(model, progress):
+        running.append(model)
+        assert len(running) - len(finished) == 1   # never two runs at once
+        progress(1, 4)
+        release.wait(10)
+        progress(4, 4)
+        return {"model": model}
+
+    finished = []
+    runner = JobRunner(run, on_success=lambda job: finished.append(job.model))
+    job, joined = runner.submit("rf")
+    again, joined_again = runner.submit("rf")
+    other, _ = runner.submit("xgb")
+    assert not joined and joined_again and again is job and job.joined == 1
+    assert other is not job and other.state == "queued"
+
+    release.set()
+    assert job.finished.wait(10) and other.finished.wait(10)
+    assert job.state == other.state == SUCCEEDED and finished == ["rf", "xgb"]
+    info = job.to_dict()
+    assert info["points_done"] == info["points_total"] == 4 and info["percent"] == 100.0
+    assert info["result"] == {"model": "rf"} and info["eta_seconds"] is None
+
+    # a finished job is not joined
+    third, joined = runner.submit("rf")
+    assert not joined and third is not job
+    third.finished.wait(10)
+    assert [j["job_id"] for j in runner.list()][:1] == [third.id]
+
+
+def test_failed_job_reports_the_error():
+    def run(model, progress):
+        raise FileNotFoundError("grid.json")
+
+    runner = JobRunner(run)
+    job, _ = runner.submit("rf")
+    assert job.finished.wait(10)
+    assert job.state == FAILED and job.to_dict()["error"] == "grid.json"
+
+
+def test_failing_on_success_hook_keeps_the_job_succeeded():
+    seen = []
+
+    def hook(job):
+        seen.append(job.state)
+        raise RuntimeError("cache write failed")
+
+    runner = JobRunner(lambda model, progress: {"model": model}, on_success=hook)
+    job, _ = runner.submit("rf")
+    assert job.finished.wait(10)
+    assert seen == [SUCCEEDED]
+    assert job.state == SUCCEEDED and job.error is None and job.result == {"model": "rf"}
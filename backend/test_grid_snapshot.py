@@ -0,0 +1,184 @@
+# backend/test_grid_snapshot.py
+import sys
+import os
+import gzip
+import json
+import numpy as np
+import pyarrow as pa
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import app_api
+import grid_snapshot
+from grid_snapshot import GridSnapshots
+from train_models import build_estimator
+
+
+def make_bundle(seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, 10))
+    y = X[:, 0] + 0.1 * rng.normal(size=200)
+    reg = build_estimator("xgb", "regression", params={"n_estimators": 5}).fit(X, y)
+    clf = build_estimator("xgb", "classification", params={"n_estimators": 5}).fit(X, (y > 0).astype(int))
+    return {"reg": reg, "clf": clf, "scaler": None, "metadata": {"name": "XGB Model"}}
+
+
+def write_grid(path, n=5, temp=20.0):
+    points = [{"lat": 35.0 + i / 10, "lon": -84.0, "temp_c": temp, "flood_risk": "Low"} for i in range(n)]
+    path.write_text(json.dumps(points))
+    return points
+
+
+def test_snapshot_is_encoded_once_and_revalidates(tmp_path):
+    grid = tmp_path / "grid.json"
+    write_grid(grid)
+    snaps = GridSnapshots([str(tmp_path / "missing.json"), str(grid)], {})
+
+    first = snaps.get()
+    assert first is snaps.get() and snaps.builds == 1
+    assert json.loads(first.body)["count"] == 5
+    assert first.matches(first.etag) and first.matches(f'W/{first.etag}, "other"') and first.matches("*")
+    assert not first.matches('"other"') and not first.matches(None)
+
+    # unknown model names share the file-as-written snapshot
+    assert snaps.get("nope") is first
+
+    write_grid(grid, n=7)
+    second = snaps.get()
+    assert second is not first and second.etag != first.etag
+    assert json.loads(second.body)["count"] == 7
+
+    snaps.invalidate()
+    third = snaps.get()
+    assert snaps.generation == 1 and third is not second and snaps.builds == 3
+    # same points, same ETag: clients keep their 304s and delta base across a rebuild
+    assert third.etag == second.etag
+
+
+def test_model_snapshot_scores_every_point_once(tmp_path):
+    grid = tmp_path / "grid.json"
+    write_grid(grid, temp=0)
+    bundle = make_bundle()
+    registry = {"xgb": bundle}
+    snaps = GridSnapshots([str(grid)], registry)
+
+    snap = snaps.get("XGB")
+    assert snaps.get("xgb") is snap and snaps.builds == 1
+    payload = json.loads(snap.body)
+    assert payload["model_applied"] == "xgb"
+    assert all(p["prediction"]["model_used"] == "XGB Model" for p in payload["data"])
+    assert all(0.0 <= p["flood_probability"] <= 1.0 for p in payload["data"])
+
+    # the file-as-written snapshot is not touched by scoring
+    assert "prediction" not in json.loads(snaps.get().body)["data"][0]
+
+    # a reloaded model pair rebuilds the snapshot
+    registry["xgb"] = make_bundle(seed=1)
+    assert snaps.get("xgb") is not snap
+
+
+def test_failed_scoring_is_not_cached_under_the_model(tmp_path):
+    grid = tmp_path / "grid.json"
+    write_grid(grid)
+    bundle = make_bundle()
+    registry = {"xgb": {**bundle, "reg": None}}
+    snaps = GridSnapshots([str(grid)], registry)
+
+    fallback = snaps.get("xgb")
+    assert json.loads(fallback.body)["model_applied"] == grid_snapshot.CACHED
+    assert fallback is snaps.get() and "xgb" not in snaps.snapshots
+    assert snaps.metrics()["failed_builds"] == 1
+
+    registry["xgb"] = bundle
+    assert json.loads(snaps.get("xgb").body)["model_applied"] == "xgb"
+
+
+def test_grid_latest_etag_and_304(tmp_path, monkeypatch):
+    grid = tmp_path / "grid.json"
+    write_grid(grid)
+    monkeypatch.setattr(app_api, "grid_snapshots", GridSnapshots([str(grid)], {}))
+    client = TestClient(app_api.app)
+
+    response = client.get("/grid/latest")
+    assert response.status_code == 200
+    assert response.json()["count"] == 5
+    etag = response.headers["etag"]
+    assert "no-store" not in response.headers["cache-control"]
+
+    response = client.get("/grid/latest", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.headers["etag"] == etag and not response.content
+
+    assert client.get("/metrics/grid").json()["builds"] == 1
+
+    monkeypatch.setattr(app_api, "grid_snapshots", GridSnapshots([str(tmp_path / "none.json")], {}))
+    assert client.get("/grid/latest").status_code == 404
+
+
+def test_negotiation():
+    assert grid_snapshot.negotiate_format(None, None) == "json"
+    assert grid_snapshot.negotiate_format(None, "*/*") == "json"
+    assert grid_snapshot.negotiate_format("Columnar", "application/json") == "columnar"
+    accept = f"application/json;q=0.5, {grid_snapshot.COLUMNAR}"
+    assert grid_snapshot.negotiate_format(None, accept) == "columnar"
+    assert grid_snapshot.negotiate_format(None, "application/vnd.apache.arrow.stream") == "arrow"
+    with pytest.raises(grid_snapshot.UnsupportedFormat):
+        grid_snapshot.negotiate_format("xml", None)
+
+    assert grid_snapshot.negotiate_encoding(None) is None
+    assert grid_snapshot.negotiate_encoding("gzip, deflate") == "gzip"
+    assert grid_snapshot.negotiate_encoding("gzip;q=0, identity") is None
+    assert grid_snapshot.negotiate_encoding("*") == ("br" if grid_snapshot.brotli else "gzip")
+
+
+def test_columnar_variants_round_trip(tmp_path):
+    grid = tmp_path / "grid.json"
+    write_grid(grid, n=50)
+    snap = GridSnapshots([str(grid)], {"xgb": make_bundle()}).get("xgb")
+    rows = json.loads(snap.body)["data"]
+
+    body, etag = snap.variant("columnar")
+    assert snap.variant("columnar") == (body, etag) and etag != snap.etag
+    doc = json.loads(body)
+    cols = doc["columns"]
+    assert doc["model_name"] == "XGB Model" and "prediction" not in cols and "flood_risk" not in cols
+    assert cols["lat"] == [p["lat"] for p in rows] and cols["temp_c"] == [p["temp_c"] for p in rows]
+    assert [doc["risk_labels"][c] for c in cols["risk_code"]] == [p["flood_risk"] for p in rows]
+    assert [doc["actions"][c] for c in cols["risk_code"]] == [p["recommended_action"] for p in rows]
+    assert len(body) < len(snap.body) / 2
+
+    gz, gz_etag = snap.variant("columnar", "gzip")
+    assert gzip.decompress(gz) == body and gz_etag not in (etag, snap.etag)
+    assert snap.matches(gz_etag, gz_etag) and not snap.matches(snap.etag, gz_etag)
+
+    table = pa.ipc.open_stream(snap.variant("arrow")[0]).read_all()
+    assert table.column("flood_probability").to_pylist() == cols["flood_probability"]
+    assert table.column("flood_risk").to_pylist() == [p["flood_risk"] for p in rows]
+    assert table.schema.metadata[b"model_applied"] == b"xgb"
+
+
+def test_grid_latest_formats_and_encodings(tmp_path, monkeypatch):
+    grid = tmp_path / "grid.json"
+    write_grid(grid, n=20)
+    monkeypatch.setattr(app_api, "grid_snapshots", GridSnapshots([str(grid)], {}))
+    client = TestClient(app_api.app)
+
+    response = client.get("/grid/latest?format=columnar", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == grid_snapshot.COLUMNAR
+    assert response.headers["content-encoding"] == "gzip" and "Accept-Encoding" in response.headers["vary"]
+    assert response.json()["columns"]["risk_code"] == [0] * 20
+    etag = response.headers["etag"]
+
+    response = client.get("/grid/latest?format=columnar",
+                          headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    # a different representation does not revalidate against that tag
+    assert client.get("/grid/latest", headers={"If-None-Match": etag}).status_code == 200
+
+    response = client.get("/grid/latest", headers={"Accept": "application/vnd.apache.arrow.stream"})
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    assert pa.ipc.open_stream(response.content).read_all().num_rows == 20
+
+    assert client.get("/grid/latest?format=xml").status_code == 406
@@ -0,0 +1,117 @@
+# backend/test_grid_stream.py
+import sys
+import os
+import asyncio
+import json
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from grid_snapshot import GridSnapshots
+from grid_stream import Broadcaster, GridFeed, RESYNC, grid_delta
+
+
+def points(n=10, high=()):
+    return [{"lat": 35.0 + i / 100, "lon": 33.0, "flood_risk": "High" if i in high else "Low",
+             "flood_probability": 0.5 if i in high else 0.05, "predicted_rainfall_mm": 1.0} for i in range(n)]
+
+
+def parse(frame):
+    fields = dict(line.split(": ", 1) for line in frame.decode().strip().split("\n") if line and not line.startswith("retry"))
+    return fields["event"], json.loads(fields["data"])
+
+
+def test_grid_delta():
+    old, new = points(), points(high={2, 3})
+    new.pop(9)
+    new.append({"lat": 36.0, "lon": 33.0, "flood_risk": "Low", "flood_probability": 0.01})
+    delta = grid_delta(old, new)
+    assert [r[0] for r in delta["changed"]] == [35.02, 35.03, 36.0]
+    assert delta["changed"][0][2:] == [0.5, 1.0, 2]
+    assert delta["removed"] == [[35.09, 33.0]]
+
+    assert grid_delta(old, points()) == {"changed": [], "removed": []}
+    assert grid_delta(old, points(high=range(8))) is None
+
+
+def test_broadcaster_fans_out_and_resyncs_slow_clients():
+    async def main():
+        broadcaster = Broadcaster(queue_size=3)
+        fast, slow = broadcaster.subscribe(), broadcaster.subscribe()
+        received = []
+
+        async def drain():
+            for _ in range(6):
+                received.append(await fast.queue.get())
+
+        reader = asyncio.ensure_future(drain())
+        for i in range(6):
+            # published from another thread, like a finishing refresh job
+            t = threading.Thread(target=broadcaster.publish, args=("snapshot", {"n": i}))
+            t.start()
+            t.join()
+            await asyncio.sleep(0.01)
+        await asyncio.wait_for(reader, 5)
+
+        assert [parse(f)[1]["n"] for f in received] == list(range(6))
+        backlog = [slow.queue.get_nowait() for _ in range(slow.queue.qsize())]
+        assert backlog[0] == RESYNC and len(backlog) <= 3 and slow.resyncs >= 1
+        broadcaster.unsubscribe(slow)
+        assert broadcaster.metrics()["subscribers"] == 1 and broadcaster.metrics()["published"] == 6
+
+    asyncio.run(main())
+
+
+def test_feed_publishes_snapshot_with_delta(tmp_path):
+    grid = tmp_path / "grid.json"
+    grid.write_text(json.dumps(points()))
+    snapshots = GridSnapshots([str(grid)], {})
+    feed = GridFeed(snapshots, Broadcaster())
+
+    first = feed.check()
+    assert first["deltas"] == {} and feed.check() is None
+    base = first["digests"]["cached"]
+
+    grid.write_text(json.dumps(points(high={4})))
+    event = feed.check()
+    delta = event["deltas"]["cached"]
+    assert delta["base"] == base and delta["digest"] == snapshots.get().digest
+    assert [r[0] for r in delta["changed"]] == [35.04] and delta["removed"] == []
+
+    # most of the grid changed: no delta, clients re-fetch
+    grid.write_text(json.dumps(points(high=range(10))))
+    assert feed.check()["deltas"] == {}
+
+
+def test_events_start_with_hello_and_deliver_snapshots(tmp_path):
+    grid = tmp_path / "grid.json"
+    grid.write_text(json.dumps(points()))
+    snapshots = GridSnapshots([str(grid)], {})
+    feed = GridFeed(snapshots, Broadcaster())
+    feed.check()
+
+    async def main():
+        sub = feed.broadcaster.subscribe()
+        frames = []
+        disconnected = asyncio.Event()
+
+        async def is_disconnected():
+            return disconnected.is_set()
+
+        async def consume():
+            async for frame in feed.events(sub, is_disconnected, keepalive=2.0):
+                frames.append(frame)
+                if len(frames) == 2:
+                    disconnected.set()
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        grid.write_text(json.dumps(points(high={1})))
+        await asyncio.get_running_loop().run_in_executor(None, feed.check)
+        await asyncio.wait_for(task, 5)
+        return frames
+
+    hello, snapshot = asyncio.run(main())
+    assert parse(hello)[0] == "hello" and "cached" in parse(hello)[1]["digests"]
+    event, data = parse(snapshot)
+    assert event == "snapshot" and data["deltas"]["cached"]["changed"][0][0] == 35.01
@@ -0,0 +1,98 @@
+# backend/test_hourly_pipeline.py
+import sys
+import os
+import json
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import app_api
+import hourly_prediction_pipeline as pipeline
+from prediction_history import PredictionHistory
+
+WEATHER = {"name": "Nicosia", "main": {"temp": 20.0}, "weather": [{"description": "clear"}]}
+
+
+@pytest.fixture
+def tmp_grid(tmp_path, monkeypatch):
+    grid = [{"lat": 35.25, "lon": 33.5}, {"lat": 35.2, "lon": 33.6}, {"lat": 34.0, "lon": 32.0}]
+    (tmp_path / "grid.json").write_text(json.dumps(grid))
+    monkeypatch.setattr(pipeline, "GRID_FILE", str(tmp_path / "grid.json"))
+    monkeypatch.setattr(pipeline, "HISTORY_DB", str(tmp_path / "history.sqlite"))
+    monkeypatch.setattr(pipeline, "OUTPUT_FILE_JSON", str(tmp_path / "latest.json"))
+
+    def fetch_grid(points, progress=None, **kwargs):
+        for i in range(len(points)):
+            progress and progress(i + 1, len(points))
+        return [WEATHER] * len(points)
+
+    monkeypatch.setattr(pipeline.weather_fetch, "fetch_grid", fetch_grid)
+    return tmp_path
+
+
+def test_pipeline_scores_the_grid_in_one_call(tmp_grid):
+    calls, steps = [], []
+
+    def score(X, model):
+        calls.append((X, model))
+        return [{"predicted_rainfall_mm": 0.5, "flood_probability": 0.2, "flood_risk": "Moderate",
+                 "recommended_action": "Prepare", "model_name": "XGB"}] * len(X)
+
+    summary = pipeline.run_pipeline(model="xgb", score=score, progress=lambda d, t: steps.append((d, t)))
+    assert summary["total"] == 2 and summary["processed"] == 2 and summary["skipped"] == 1
+    assert steps == [(1, 2), (2, 2)]
+    assert len(calls) == 1 and calls[0][1] == "xgb"
+    assert calls[0][0].shape == (2, 10) and (calls[0][0][:, -1] == 20.0).all()
+    points = json.loads((tmp_grid / "latest.json").read_text())
+    assert [p["flood_risk"] for p in points] == ["Moderate", "Moderate"]
+    history = PredictionHistory(str(tmp_grid / "history.sqlite"))
+    grid = history.grid_at()
+    assert len(grid) == 2 and grid[0]["flood_risk"] == "Moderate" and history.runs()[0]["model"] == "xgb"
+
+
+def test_local_and_remote_scoring_agree(monkeypatch):
+    if "xgb" not in app_api.loaded_models:
+        pytest.skip("xgb models not available")
+    client = TestClient(app_api.app)
+    sent = []
+
+    def post(url, json=None, timeout=None):
+        sent.append(url)
+        return client.post("/predict/batch", json=json)
+
+    monkeypatch.setattr(pipeline.requests, "post", post)
+    X = np.column_stack([np.zeros((5, 9)), np.linspace(10, 35, 5)])
+
+    local = pipeline.score_local(X, "xgb", registry=app_api.loaded_models)
+    remote = pipeline.score_remote(X, "xgb")
+    assert len(sent) == 1 and sent[0] == pipeline.API_URL
+    assert [r["flood_risk"] for r in local] == [r["flood_risk"] for r in remote]
+    assert np.allclose([r["flood_probability"] for r in local], [r["flood_probability"] for r in remote])
+    assert local[0]["model_name"] == remote[0]["model_name"] == app_api.loaded_models["xgb"]["metadata"]["name"]
+
+
+def test_local_scoring_without_models_fails():
+    with pytest.raises(RuntimeError):
+        pipeline.score_local(np.zeros((1, 10)), "xgb", registry={})
+
+
+def test_run_without_any_weather_fails_and_keeps_the_grid(tmp_grid, monkeypatch):
+    (tmp_grid / "latest.json").write_text('[{"lat": 35.25, "lon": 33.5}]')
+    monkeypatch.setattr(pipeline.weather_fetch, "fetch_grid",
+                        lambda points, **kwargs: [RuntimeError("HTTP 401")] * len(points))
+
+    with pytest.raises(RuntimeError, match="No grid point"):
+        pipeline.run_pipeline(model="xgb", score=lambda X, model: [])
+    assert json.loads((tmp_grid / "latest.json").read_text()) == [{"lat": 35.25, "lon": 33.5}]
+    assert not (tmp_grid / "history.sqlite").exists()
+
+
+def test_unknown_models_are_rejected_not_replaced():
+    with pytest.raises(RuntimeError, match="bogus"):
+        pipeline.score_local(np.zeros((1, 10)), "bogus", registry={"rf": object()})
+
+    response = TestClient(app_api.app).post("/grid/refresh?model=bogus")
+    assert response.status_code == 400 and "bogus" in response.json()["detail"]
+    assert all(job["model"] != "bogus" for job in app_api.refresh_jobs.list())
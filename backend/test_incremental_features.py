@@ -0,0 +1,49 @@
+# backend/test_incremental_features.py
+import sys
+import os
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import incremental_features
+from benchmarks import synthetic_daily
+from create_labels import create_labels
+from prepare_features import prepare_features
+
+
+def test_incremental_updates_match_full_rebuild(tmp_path):
+    daily = synthetic_daily(10, 75).drop(columns=["next_tp", "flood_label"])
+    # short decimals survive the CSV round trips of the full rebuild unchanged
+    daily = daily.round({"tp": 7, "t2m": 3})
+    # one cell starts late so it is still short of history when updates begin
+    late = (daily["latitude"] == daily["latitude"].max()) & (daily["date"] < "2020-02-05")
+    daily = daily[~late]
+
+    days = sorted(daily["date"].unique())
+    first, second, third = days[:35], days[35:36], days[36:]
+
+    features = str(tmp_path / "features_inc.csv")
+    state = str(tmp_path / "state")
+    incremental_features.init_state(daily[daily["date"].isin(first)], features, state)
+    incremental_features.update(daily[daily["date"].isin(second)], features, state)
+    incremental_features.update(daily[daily["date"].isin(third)], features, state)
+
+    threshold = incremental_features.load_state(state)[0]["threshold"]
+    daily.to_csv(tmp_path / "daily.csv", index=False)
+    create_labels(str(tmp_path / "daily.csv"), str(tmp_path / "labeled.csv"), threshold=threshold)
+    prepare_features(str(tmp_path / "labeled.csv"), str(tmp_path / "features_full.csv"))
+
+    keys = ["latitude", "longitude", "date"]
+    inc = pd.read_csv(features).sort_values(keys).reset_index(drop=True)
+    full = pd.read_csv(tmp_path / "features_full.csv").sort_values(keys).reset_index(drop=True)
+    pd.testing.assert_frame_equal(inc, full, check_exact=True)
+
+
+def test_update_rejects_overlapping_days(tmp_path):
+    daily = synthetic_daily(3, 20).drop(columns=["next_tp", "flood_label"])
+    features = str(tmp_path / "features.csv")
+    state = str(tmp_path / "state")
+    incremental_features.init_state(daily, features, state)
+    with pytest.raises(ValueError):
+        incremental_features.update(daily.tail(3), features, state)
@@ -0,0 +1,79 @@
+# backend/test_model_registry.py
+import sys
+import os
+import time
+import joblib
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import tree_engine
+from model_registry import ModelRegistry
+from train_models import build_estimator
+
+
+def save_pair(model_dir, m_type, n_estimators=10, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(300, 10))
+    y = X[:, 0] + 0.1 * rng.normal(size=300)
+    reg = build_estimator("xgb", "regression", params={"n_estimators": n_estimators}).fit(X, y)
+    clf = build_estimator("xgb", "classification", params={"n_estimators": n_estimators}).fit(X, (y > 0).astype(int))
+    meta = {"name": f"{m_type.upper()} Model", "version": "1.0"}
+    joblib.dump({"model": reg, "scaler": None, "metadata": meta}, os.path.join(model_dir, f"{m_type}_regressor.joblib"))
+    joblib.dump({"model": clf, "scaler": None, "metadata": meta}, os.path.join(model_dir, f"{m_type}_classifier.joblib"))
+
+
+def test_pairs_are_discovered_but_loaded_on_first_use(tmp_path):
+    save_pair(str(tmp_path), "xgb")
+    save_pair(str(tmp_path), "rf")
+    joblib.dump({"model": None}, str(tmp_path / "orphan_regressor.joblib"))
+
+    registry = ModelRegistry(str(tmp_path))
+    assert registry.keys() == ["rf", "xgb"]
+    assert "orphan" not in registry
+    assert all(m["state"] == "available" for m in registry.describe()["models"].values())
+
+    bundle = registry["xgb"]
+    assert bundle["reg"].predict(np.zeros((2, 10))).shape == (2,)
+    info = registry.describe()["models"]
+    assert info["xgb"]["state"] == "loaded" and info["xgb"]["backend"] == "native"
+    assert info["xgb"]["size_mb"] > 0 and info["xgb"]["load_seconds"] >= 0
+    assert info["rf"]["state"] == "available"
+
+
+def test_lru_eviction_keeps_the_budget(tmp_path):
+    for m_type in ["a", "b", "c"]:
+        save_pair(str(tmp_path), m_type)
+    one_pair = sum(os.path.getsize(str(tmp_path / f"a_{k}.joblib")) for k in ["regressor", "classifier"])
+
+    registry = ModelRegistry(str(tmp_path), memory_budget_mb=2.5 * one_pair / 1e6)
+    registry["a"], registry["b"]
+    registry["a"]              # a is now the most recently used
+    registry["c"]              # over budget: b goes
+    assert list(registry.entries) == ["a", "c"]
+    assert registry.loaded_bytes() <= registry.budget_bytes
+
+
+def test_changed_bundle_is_hot_reloaded(tmp_path):
+    save_pair(str(tmp_path), "xgb", n_estimators=5)
+    registry = ModelRegistry(str(tmp_path), check_interval=0)
+    X = np.ones((1, 10))
+    before = registry["xgb"]["reg"].predict(X)
+    assert registry["xgb"] is registry["xgb"]
+
+    save_pair(str(tmp_path), "xgb", n_estimators=40, seed=1)
+    later = time.time() + 5
+    for kind in ["regressor", "classifier"]:
+        os.utime(str(tmp_path / f"xgb_{kind}.joblib"), (later, later))
+    after = registry["xgb"]["reg"].predict(X)
+
+    assert not np.allclose(before, after)
+    assert registry.describe()["models"]["xgb"]["loads"] == 2
+
+
+def test_compiled_export_is_preferred(tmp_path):
+    save_pair(str(tmp_path), "xgb")
+    tree_engine.export_bundles(str(tmp_path))
+    registry = ModelRegistry(str(tmp_path))
+    assert registry["xgb"]["backend"] == "compiled"
+    assert ModelRegistry(str(tmp_path), backend="native")["xgb"]["backend"] == "native"
@@ -0,0 +1,87 @@
+# backend/test_predict_batch.py
+import sys
+import os
+import io
+import numpy as np
+import pyarrow as pa
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.app_api import app
+from fastapi.testclient import TestClient
+
+client = TestClient(app)
+
+FEATURES = np.column_stack([np.linspace(0, 0.01, 6)[:, None].repeat(9, axis=1), np.linspace(10, 35, 6)])
+
+
+def single(row):
+    response = client.post("/predict", json={"features": row.tolist(), "model_type": "xgb"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_json_batch_matches_single_predictions():
+    response = client.post("/predict/batch", json={"features": FEATURES.tolist(), "model_type": "xgb"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == len(FEATURES)
+    for i, row in enumerate(FEATURES):
+        one = single(row)
+        assert data["flood_probability"][i] == pytest.approx(one["flood_probability"], rel=1e-6)
+        assert data["predicted_rainfall_mm"][i] == pytest.approx(one["predicted_rainfall_mm"], rel=1e-6)
+        assert data["flood_risk"][i] == one["flood_risk"]
+        assert data["recommended_action"][i] == one["recommended_action"]
+
+
+def test_npy_batch_round_trip():
+    buf = io.BytesIO()
+    np.save(buf, FEATURES)
+    response = client.post("/predict/batch?model_type=xgb", content=buf.getvalue(),
+                           headers={"content-type": "application/x-npy"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-npy"
+    out = np.load(io.BytesIO(response.content))
+    ref = client.post("/predict/batch", json={"features": FEATURES.tolist(), "model_type": "xgb"}).json()
+    np.testing.assert_allclose(out["flood_probability"], ref["flood_probability"])
+    assert [response.headers["x-risk-levels"].split(",")[i] for i in out["risk_level"]] == ref["flood_risk"]
+
+
+def test_arrow_stream_batch_round_trip():
+    table = pa.table({f"f{i}": FEATURES[:, i] for i in range(FEATURES.shape[1])})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    response = client.post("/predict/batch?model_type=xgb", content=sink.getvalue().to_pybytes(),
+                           headers={"content-type": "application/vnd.apache.arrow.stream"})
+    assert response.status_code == 200
+    out = pa.ipc.open_stream(response.content).read_all()
+    ref = client.post("/predict/batch", json={"features": FEATURES.tolist(), "model_type": "xgb"}).json()
+    assert out.column("flood_risk").to_pylist() == ref["flood_risk"]
+    np.testing.assert_allclose(out.column("predicted_rainfall_mm").to_numpy(), ref["predicted_rainfall_mm"])
+
+
+def test_bad_payloads_are_rejected():
+    assert client.post("/predict/batch", json={"features": [[1, 2, 3]]}).status_code == 400
+    response = client.post("/predict/batch", content=b"x", headers={"content-type": "text/csv"})
+    assert response.status_code == 415
+
+
+def test_non_finite_features_are_rejected():
+    # NaN is not JSON, but Python's json module reads it (and null becomes NaN as a float)
+    row = ", ".join(["0.001"] * 9)
+    for bad in ("NaN", "Infinity", "null"):
+        body = f'{{"features": [[{row}, {bad}]], "model_type": "xgb"}}'.encode()
+        response = client.post("/predict/batch", content=body, headers={"content-type": "application/json"})
+        assert response.status_code == 400, bad
+        assert "finite" in response.json()["detail"]
+
+    X = FEATURES.copy()
+    X[2, 4] = np.nan
+    buf = io.BytesIO()
+    np.save(buf, X)
+    response = client.post("/predict/batch?model_type=xgb", content=buf.getvalue(),
+                           headers={"content-type": "application/x-npy"})
+    assert response.status_code == 400
+    assert "finite" in response.json()["detail"]
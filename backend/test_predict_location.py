@@ -0,0 +1,55 @@
+# backend/test_predict_location.py
+import sys
+import os
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import src.app_api as app_api
+from fastapi.testclient import TestClient
+
+client = TestClient(app_api.app)
+
+LAT, LON = 35.2, 33.4
+
+
+def fake_weather():
+    now = int(datetime(2026, 1, 10, 12).timestamp())
+    item = lambda i: {
+        "dt": now + i * 3 * 3600,
+        "main": {"temp": 8 + i % 12, "temp_max": 10 + i % 12, "temp_min": 6 + i % 12},
+        "wind": {"speed": 4.0}, "pop": 0.5, "weather": [{"main": "Rain", "description": "light rain"}],
+    }
+    weather = {"name": "Test", "main": {"temp": 12.0, "humidity": 80}, "wind": {"speed": 3.0},
+               "weather": [{"description": "light rain"}]}
+    return weather, {"list": [item(i) for i in range(40)]}
+
+
+def call(**params):
+    # a fresh cache entry keeps the endpoint off the network
+    app_api.weather_client.put(LAT, LON, fake_weather())
+    before = app_api.dispatcher.metrics()["batches"]
+    response = client.get("/predict-location", params={"lat": LAT, "lon": LON, "model": "xgb", **params})
+    assert response.status_code == 200
+    return response.json()["prediction"], app_api.dispatcher.metrics()["batches"] - before
+
+
+def test_now_and_horizons_are_scored_in_one_call():
+    pred, batches = call()
+    assert batches == 1
+    assert set(pred["future_horizons"]) == {"24h", "48h", "72h"}
+    assert "trajectory" not in pred
+
+
+def test_trajectory_covers_every_step_and_agrees_with_horizons():
+    pred, batches = call(trajectory="true")
+    assert batches == 1
+    _, forecast = fake_weather()
+    assert [s["dt"] for s in pred["trajectory"]] == [x["dt"] for x in forecast["list"]]
+    for label, idx in [("24h", 8), ("48h", 16), ("72h", 24)]:
+        step = pred["trajectory"][idx]
+        assert pred["future_horizons"][label] == {k: v for k, v in step.items() if k != "dt"}
+
+    plain, _ = call()
+    assert plain["flood_probability"] == pred["flood_probability"]
+    assert plain["future_horizons"] == pred["future_horizons"]
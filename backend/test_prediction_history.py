@@ -0,0 +1,119 @@
+# backend/test_prediction_history.py
+import sys
+import os
+import csv
+import sqlite3
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import app_api
+import prediction_history
+from prediction_history import PredictionHistory
+
+START = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def grid_rows(hour):
+    return [(35.0 + i * 0.04, 33.0 + j * 0.04, 0.1 * hour, 0.05 * (hour % 8), "Moderate" if hour % 2 else "Low")
+            for i in range(4) for j in range(5)]
+
+
+@pytest.fixture
+def history(tmp_path):
+    h = PredictionHistory(str(tmp_path / "history.sqlite"))
+    for hour in range(48):
+        h.write_run(START + timedelta(hours=hour), grid_rows(hour), model="xgb")
+    yield h
+    h.close()
+
+
+def test_point_series_and_grid_reads(history):
+    series = history.point_series(35.04, 33.08)
+    assert len(series) == 48
+    assert series[0]["timestamp"] == START.isoformat() and series[-1]["predicted_rainfall_mm"] == pytest.approx(4.7)
+    assert [s["flood_risk"] for s in series[:2]] == ["Low", "Moderate"]
+
+    window = history.point_series(35.04, 33.08, start=START + timedelta(hours=10), end="2026-10-01T12:00:00")
+    assert [s["timestamp"][11:13] for s in window] == ["10", "11", "12"]
+    assert [s["timestamp"][11:13] for s in history.point_series(35.04, 33.08, limit=2)] == ["22", "23"]
+
+    latest = history.grid_at()
+    assert len(latest) == 20 and latest[0]["timestamp"] == (START + timedelta(hours=47)).isoformat()
+    at = history.grid_at("2026-10-01T05:30:00Z")
+    assert {p["timestamp"] for p in at} == {(START + timedelta(hours=5)).isoformat()}
+    assert history.grid_at(START - timedelta(days=1)) == []
+
+
+def test_reads_use_the_indexes(history):
+    def plan(sql, params):
+        return " ".join(r[-1] for r in history.conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+    assert "predictions_point" in plan("SELECT * FROM predictions WHERE lat = ? AND lon = ? AND ts >= ? AND ts <= ?",
+                                       (35.0, 33.0, 0, 1))
+    assert "PRIMARY KEY" in plan("SELECT * FROM predictions WHERE ts = ?", (1,))
+
+
+def test_rewrite_prune_and_compact(history):
+    assert history.write_run(START, grid_rows(1)[:3]) == 3
+    assert len(history.grid_at(START)) == 3
+
+    removed = history.prune(keep_days=1, now=START + timedelta(hours=47))
+    assert removed == 3 + 22 * 20
+    assert history.stats()["runs"] == 25 and history.point_series(35.0, 33.0)[0]["timestamp"].startswith(
+        "2026-10-01T23")
+    history.compact()
+    assert history.stats()["rows"] == 25 * 20
+
+
+def test_csv_round_trip(history, tmp_path):
+    path = str(tmp_path / "export.csv")
+    assert history.export_csv(path, start=START + timedelta(hours=46)) == 40
+
+    copy = PredictionHistory(str(tmp_path / "copy.sqlite"))
+    assert copy.import_csv(path) == 40
+    assert copy.grid_at() == history.grid_at()
+    with open(path) as f:
+        assert next(csv.reader(f))[0] == "timestamp"
+
+
+def test_history_endpoints(history, monkeypatch):
+    monkeypatch.setattr(app_api, "prediction_history", history)
+    client = TestClient(app_api.app)
+
+    body = client.get("/history/point", params={"lat": 35.04, "lon": 33.08, "limit": 5}).json()
+    assert body["count"] == 5 and body["data"][-1]["timestamp"].startswith("2026-10-02T23")
+    body = client.get("/history/grid", params={"at": "2026-10-01T05:00:00"}).json()
+    assert body["count"] == 20 and body["timestamp"].startswith("2026-10-01T05")
+    assert client.get("/history/runs").json()["runs"] == 48
+    assert client.get("/history/grid", params={"at": "yesterday"}).status_code == 400
+    assert client.get("/history/grid", params={"at": "2020-01-01T00:00:00"}).status_code == 404
+
+
+def test_runs_in_the_same_second_stay_apart(tmp_path):
+    h = PredictionHistory(str(tmp_path / "history.sqlite"))
+    h.write_run("2026-10-01T10:00:00.250000", grid_rows(1), model="xgb")
+    h.write_run("2026-10-01T10:00:00.750000", grid_rows(2), model="rf")
+
+    assert [r["model"] for r in h.runs()] == ["rf", "xgb"]
+    assert h.grid_at("2026-10-01T10:00:00.5")[0]["timestamp"] == "2026-10-01T10:00:00.250000+00:00"
+    assert len(h.point_series(35.0, 33.0)) == 2
+    h.close()
+
+
+def test_whole_second_files_are_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    conn = sqlite3.connect(path)
+    conn.executescript(prediction_history.SCHEMA)
+    ts = int(START.timestamp())
+    conn.execute("INSERT INTO runs VALUES (?, 'xgb', 1, '')", (ts,))
+    conn.execute("INSERT INTO predictions VALUES (?, 35.0, 33.0, 1.0, 0.2, 1)", (ts,))
+    conn.commit()
+    conn.close()
+
+    h = PredictionHistory(path)
+    assert h.grid_at()[0]["timestamp"] == START.isoformat()
+    h.close()
+    assert PredictionHistory(path).grid_at()[0]["timestamp"] == START.isoformat()
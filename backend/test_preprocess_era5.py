@@ -0,0 +1,28 @@
+# backend/test_preprocess_era5.py
+import sys
+import os
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import preprocess_era5, era5_store
+
+
+def test_store_matches_legacy_csv(tmp_path, write_fake_month):
+    data_dir = tmp_path / "extracted"
+    write_fake_month(str(data_dir / "era5_2023_01" / "data_0.nc"), "2023-01-01")
+    write_fake_month(str(data_dir / "era5_2023_02" / "data_0.nc"), "2023-02-01")
+
+    csv_path = str(tmp_path / "era5_combined.csv")
+    store = str(tmp_path / "era5_combined")
+    preprocess_era5.preprocess_real_nc(str(data_dir), csv_path)
+    rows = preprocess_era5.preprocess_to_store(str(data_dir), store, workers=2, chunk_hours=10)
+
+    assert [(y, m) for y, m, _ in era5_store.list_partitions(store)] == [(2023, 1), (2023, 2)]
+
+    keys = ["time", "latitude", "longitude"]
+    legacy = pd.read_csv(csv_path, parse_dates=["time"]).sort_values(keys).reset_index(drop=True)
+    streamed = era5_store.read_table(store).sort_values(keys).reset_index(drop=True)
+
+    assert rows == len(legacy)
+    pd.testing.assert_frame_equal(streamed[legacy.columns], legacy, check_dtype=False)
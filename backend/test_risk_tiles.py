@@ -0,0 +1,109 @@
+# backend/test_risk_tiles.py
+import sys
+import os
+import json
+import struct
+import zlib
+import numpy as np
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import app_api
+import risk_tiles
+from grid_snapshot import GridSnapshots
+
+
+def decode_png(png):
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+    pos, idat, header = 8, b"", None
+    while pos < len(png):
+        length, kind = struct.unpack(">I4s", png[pos:pos + 8])
+        data = png[pos + 8:pos + 8 + length]
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", data)
+        elif kind == b"IDAT":
+            idat += data
+        pos += 12 + length
+    w, h = header[:2]
+    rows = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(h, 1 + 4 * w)
+    return rows[:, 1:].reshape(h, w, 4)
+
+
+def write_grid(path, risks):
+    """A 0.04 deg mesh over part of Cyprus with the given risk label per row of latitude."""
+    points = [{"lat": round(35.0 + 0.04 * i, 5), "lon": round(33.0 + 0.04 * j, 5), "flood_risk": risk}
+              for i, risk in enumerate(risks) for j in range(10)]
+    path.write_text(json.dumps(points))
+    return points
+
+
+def pixel_of(lat, lon, z):
+    n = 2 ** z
+    fx = (lon + 180.0) / 360.0 * n
+    fy = (1 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2 * n
+    x, y = int(fx), int(fy)
+    return x, y, int((fy - y) * risk_tiles.TILE_SIZE), int((fx - x) * risk_tiles.TILE_SIZE)
+
+
+def test_geometry():
+    west, south, east, north = risk_tiles.tile_bounds(0, 0, 0)
+    assert (west, east) == (-180.0, 180.0) and round(north, 4) == 85.0511 and round(south, 4) == -85.0511
+    assert risk_tiles.tiles_covering((-180, -85, 180, 85), 1) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    assert not risk_tiles.valid_tile(3, 8, 0) and risk_tiles.valid_tile(3, 7, 7)
+
+
+def test_field_colours_cells_and_leaves_gaps(tmp_path):
+    grid = tmp_path / "grid.json"
+    points = write_grid(grid, ["Low", "Moderate", "High"])
+    points.pop(15)   # a "sea" point in the Moderate row
+    field = risk_tiles.RiskField.from_payload({"data": points})
+    assert abs(field.dlat - 0.04) < 1e-9 and field.codes.shape == (3, 10)
+
+    z = 12
+    for lat, lon, expected in [(35.0, 33.0, 0), (35.04, 33.08, 1), (35.08, 33.36, 2), (35.04, 33.2, None)]:
+        x, y, row, col = pixel_of(lat, lon, z)
+        rgba = decode_png(risk_tiles.encode_png(field.render(z, x, y)))
+        if expected is None:
+            assert rgba[row, col, 3] == 0
+        else:
+            assert (rgba[row, col] == risk_tiles.RISK_RGBA[expected]).all()
+
+    assert field.render(12, 0, 0) is None
+
+
+def test_tiles_are_cached_per_snapshot(tmp_path):
+    grid = tmp_path / "grid.json"
+    write_grid(grid, ["Low", "High"])
+    cache = risk_tiles.TileCache(GridSnapshots([str(grid)], {}))
+    x, y, _, _ = pixel_of(35.02, 33.1, 10)
+
+    png, etag = cache.get(None, 10, x, y)
+    assert cache.get(None, 10, x, y) == (png, etag)
+    assert cache.counters["renders"] == 1 and cache.counters["hits"] == 1
+    assert cache.get(None, 10, 0, 0)[0] is risk_tiles.EMPTY_TILE
+
+    write_grid(grid, ["High", "High"])
+    png2, etag2 = cache.get(None, 10, x, y)
+    assert etag2 != etag and png2 != png
+
+    assert cache.warm([None], zooms=[8, 9]) >= 2
+    assert cache.counters["renders"] >= 3
+
+
+def test_tile_endpoint(tmp_path, monkeypatch):
+    grid = tmp_path / "grid.json"
+    write_grid(grid, ["Moderate"] * 3)
+    snapshots = GridSnapshots([str(grid)], {})
+    monkeypatch.setattr(app_api, "tile_cache", risk_tiles.TileCache(snapshots))
+    client = TestClient(app_api.app)
+    x, y, row, col = pixel_of(35.04, 33.2, 11)
+
+    response = client.get(f"/tiles/cached/11/{x}/{y}.png")
+    assert response.status_code == 200 and response.headers["content-type"] == "image/png"
+    assert (decode_png(response.content)[row, col] == risk_tiles.RISK_RGBA[1]).all()
+
+    etag = response.headers["etag"]
+    assert client.get(f"/tiles/cached/11/{x}/{y}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/tiles/cached/1/5/0.png").status_code == 404
+    assert client.get("/tiles/cached/1/0/abc").status_code == 404
@@ -0,0 +1,41 @@
+# backend/test_stream_training.py
+import sys
+import os
+import numpy as np
+from sklearn.metrics import roc_auc_score
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import stream_training
+from benchmarks import synthetic_daily
+from prepare_features import build_features, FEATURE_COLS
+from train_models import load_training_data
+
+
+def test_streamed_split_and_scaler_match_in_memory(tmp_path):
+    path = str(tmp_path / "features.csv")
+    build_features(synthetic_daily(8, 120)).to_csv(path, index=False)
+
+    cutoff = stream_training.split_date(path, batch_rows=150)
+    scaler = stream_training.fit_scaler(path, cutoff, batch_rows=150)
+    ref = load_training_data(path)
+
+    assert scaler.n_samples_seen_ == len(ref["X_train"])
+    np.testing.assert_allclose(scaler.mean_, ref["scaler"].mean_)
+    np.testing.assert_allclose(scaler.var_, ref["scaler"].var_)
+
+
+def test_out_of_core_training_and_batched_evaluation(tmp_path):
+    path = str(tmp_path / "features.csv")
+    df = build_features(synthetic_daily(8, 120))
+    df.to_csv(path, index=False)
+
+    reg, clf, scaler, metrics = stream_training.train_out_of_core(path, batch_rows=200, num_rounds=20)
+
+    ref = load_training_data(path)
+    p_proba = clf.predict_proba(ref["X_test"])[:, 1]
+    assert metrics["rows"] == len(ref["X_test"])
+    assert abs(metrics["auc"] - roc_auc_score(ref["y_clf_test"], p_proba)) < 1e-3
+    rmse = float(np.sqrt(((reg.predict(ref["X_test"]) - ref["y_reg_test"]) ** 2).mean()))
+    assert np.isclose(metrics["rmse"], rmse, rtol=1e-6)
+    assert reg.predict(scaler.transform(df[FEATURE_COLS].iloc[:3])).shape == (3,)
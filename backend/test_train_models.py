@@ -0,0 +1,52 @@
+# backend/test_train_models.py
+import sys
+import os
+import json
+import joblib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import train_models
+from benchmarks import synthetic_daily
+from prepare_features import build_features
+
+
+def features_csv(tmp_path):
+    df = build_features(synthetic_daily(3, 40))
+    path = tmp_path / "features.csv"
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_plan_parallelism_uses_every_core():
+    assert train_models.plan_parallelism(6, 8) == (6, [2, 2, 1, 1, 1, 1])
+    assert train_models.plan_parallelism(6, 3) == (3, [1] * 6)
+    assert train_models.plan_parallelism(2, 7) == (2, [4, 3])
+    assert train_models.plan_parallelism(4, 0) == (1, [1] * 4)
+
+
+def test_fit_all_in_a_spawn_pool_on_shared_arrays(tmp_path):
+    data = train_models.load_training_data(features_csv(tmp_path))
+    results = train_models.fit_all(data, jobs=2, names=("rf", "xgb"))
+
+    assert set(results) == {(n, t) for n in ("rf", "xgb") for t in train_models.TASKS}
+    for (name, task), (model, pred, timing) in results.items():
+        assert len(pred) == len(data["X_test"]) == timing["predict_rows"]
+        assert timing["n_jobs"] == 1 and timing["fit_seconds"] >= 0 and timing["peak_rss_mb"] > 0
+        if task == "classification":
+            assert ((pred >= 0) & (pred <= 1)).all()
+
+
+def test_train_writes_models_and_timing_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(train_models, "FEATURES_FILE", features_csv(tmp_path))
+    monkeypatch.setattr(train_models, "MODEL_DIR", str(tmp_path / "models"))
+    train_models.train(jobs=2)
+
+    with open(tmp_path / "models" / train_models.TIMING_REPORT) as f:
+        report = json.load(f)
+    assert report["cores"] == 2 and report["wall_seconds"] > 0
+    assert set(report["models"]) == set(train_models.MODEL_NAMES)
+    for name in train_models.MODEL_NAMES:
+        assert set(report["models"][name]) == set(train_models.TASKS)
+        bundle = joblib.load(tmp_path / "models" / f"{name}_classifier.joblib")
+        assert bundle["metadata"]["task"] == "classification" and hasattr(bundle["model"], "predict_proba")
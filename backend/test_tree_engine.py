@@ -0,0 +1,67 @@
+# backend/test_tree_engine.py
+import sys
+import os
+import time
+import joblib
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import tree_engine
+from train_models import build_estimator
+
+
+def make_data(n=1500, n_features=10, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, n_features))
+    y = 2 * X[:, 0] - X[:, 3] + 0.1 * rng.normal(size=n)
+    X[rng.random(X.shape) < 0.02] = np.nan
+    return X, y, (y > 1).astype(int)
+
+
+@pytest.mark.parametrize("name", ["rf", "xgb"])
+@pytest.mark.parametrize("task", ["regression", "classification"])
+def test_compiled_matches_original_model(name, task):
+    X, y_reg, y_clf = make_data()
+    X_test, _, _ = make_data(seed=1)
+    model = build_estimator(name, task, params={"n_estimators": 30}).fit(X, y_reg if task == "regression" else y_clf)
+    compiled = tree_engine.export_model(model, task)
+
+    if task == "regression":
+        np.testing.assert_allclose(compiled.predict(X_test), model.predict(X_test), rtol=1e-5, atol=1e-5)
+    else:
+        np.testing.assert_allclose(compiled.predict_proba(X_test), model.predict_proba(X_test), atol=1e-6)
+        assert (compiled.predict(X_test) == model.predict(X_test)).mean() > 0.999
+    # single rows go through the same path as batches
+    np.testing.assert_allclose(compiled.raw(X_test[:1]), compiled.raw(X_test)[:1])
+
+
+def test_save_load_and_stale_exports_are_ignored(tmp_path):
+    X, y_reg, _ = make_data()
+    model = build_estimator("xgb", "regression", params={"n_estimators": 20}).fit(X, y_reg)
+    bundle = str(tmp_path / "xgb_regressor.joblib")
+    joblib.dump({"model": model}, bundle)
+
+    assert tree_engine.export_bundles(str(tmp_path)) == ["xgb_regressor.joblib"]
+    loaded = tree_engine.load_compiled(bundle)
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X), rtol=1e-5, atol=1e-5)
+
+    # a retrained bundle must not be served through the old arrays
+    later = time.time() + 5
+    os.utime(bundle, (later, later))
+    assert tree_engine.load_compiled(bundle) is None
+
+
+def test_distilled_regressor_folds_target_scaling():
+    import distill_hybrid
+
+    X, y_reg, y_clf = make_data()
+    reg, _ = distill_hybrid.fit_students(np.nan_to_num(X), y_reg * 1e-3, y_clf.astype(float), rounds=20)
+    compiled = tree_engine.export_model(reg, "regression")
+    np.testing.assert_allclose(compiled.predict(X), reg.predict(X), rtol=1e-4, atol=1e-9)
+
+
+def test_unsupported_models_are_rejected():
+    with pytest.raises(TypeError):
+        tree_engine.export_model(build_estimator("hybrid", "regression"), "regression")
@@ -0,0 +1,85 @@
+# backend/test_tune_models.py
+import sys
+import os
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import tune_models
+from benchmarks import synthetic_daily
+from prepare_features import build_features, FEATURE_COLS
+from train_models import build_estimator
+
+
+def test_rolling_origin_folds_expand_and_never_look_ahead():
+    dates = pd.Series(np.repeat(pd.date_range("2023-01-01", periods=40), 3))
+    folds = tune_models.rolling_origin_folds(dates, n_folds=3)
+
+    assert len(folds) == 3
+    prev_train = 0
+    for train_mask, val_mask in folds:
+        assert train_mask.sum() > prev_train
+        assert dates[train_mask].max() < dates[val_mask].min()
+        assert not (train_mask & val_mask).any()
+        prev_train = train_mask.sum()
+    assert dates[folds[-1][1]].max() == dates.max()
+
+
+def test_tune_writes_best_params_within_budget(tmp_path):
+    df = build_features(synthetic_daily(6, 90))
+    t0 = time.monotonic()
+    report = tune_models.tune(df, FEATURE_COLS, build_estimator, models=("xgb",), n_candidates=4,
+                              max_trees=30, budget_s=20, out_dir=str(tmp_path))
+    assert time.monotonic() - t0 < 40
+
+    entry = report["xgb"]["regression"]
+    assert entry["metric"] == "rmse" and entry["cv_score"] > 0
+    assert set(entry["best_params"]) == set(tune_models.SEARCH_SPACE["xgb"]) | {"n_estimators"}
+    assert tune_models.load_tuned_params(str(tmp_path)) == report
+
+
+def test_budget_is_checked_between_folds():
+    df = build_features(synthetic_daily(4, 60))
+    fits = []
+
+    def slow_build(name, task, n_jobs, params):
+        model = build_estimator(name, task, n_jobs, params)
+        fit = model.fit
+
+        def timed_fit(X, y):
+            fits.append(1)
+            time.sleep(0.3)
+            return fit(X, y)
+
+        model.fit = timed_fit
+        return model
+
+    folds = tune_models.rolling_origin_folds(df["date"], n_folds=3)
+    cache = tune_models.FoldCache(df[FEATURE_COLS], df["next_tp"], df["flood_label"], folds)
+    t0 = time.monotonic()
+    params, score, trials = tune_models.successive_halving(
+        "xgb", "regression", cache, slow_build, tune_models.sample_candidates("xgb", 3), max_trees=10, budget_s=0.5)
+    assert time.monotonic() - t0 < 1.5
+    assert len(fits) == 2 and trials == [] and params is None
+
+
+def test_run_tuning_never_sees_the_test_dates(tmp_path, monkeypatch):
+    import train_models
+
+    df = build_features(synthetic_daily(4, 60)).dropna(subset=["next_tp", "flood_label"])
+    df.to_csv(tmp_path / "features.csv", index=False)
+    monkeypatch.setattr(train_models, "FEATURES_FILE", str(tmp_path / "features.csv"))
+    monkeypatch.setattr(train_models, "MODEL_DIR", str(tmp_path / "models"))
+    seen = {}
+
+    def record(frame, *args, **kwargs):
+        seen["dates"] = frame["date"]
+        return {}
+
+    monkeypatch.setattr(tune_models, "tune", record)
+    train_models.run_tuning(("xgb",), budget=5, candidates=2, folds=2, jobs=1)
+
+    test_dates = pd.to_datetime(df["date"])[~train_models.time_split_mask(pd.to_datetime(df["date"]))]
+    assert seen["dates"].max() < test_dates.min()
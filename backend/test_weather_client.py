@@ -0,0 +1,115 @@
+# backend/test_weather_client.py
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from weather_client import WeatherClient
+
+
+class FakeOpenWeather(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    delay = 0.05
+    fail = False
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path.split("?")[0])
+            server.peers.add(self.client_address)
+        time.sleep(self.delay)
+        if FakeOpenWeather.fail:
+            body, status = b"{}", 503
+        elif self.path.startswith("/weather"):
+            body, status = json.dumps({"name": "Fake", "main": {"temp": 20.0}}).encode(), 200
+        else:
+            body, status = json.dumps({"list": []}).encode(), 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenWeather)
+    server.requests, server.peers, server.lock = [], set(), threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    FakeOpenWeather.fail = False
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_concurrent_misses_share_one_fetch_and_then_hit(fake_server):
+    client = WeatherClient(base_url=url(fake_server), api_key="k")
+
+    async def main():
+        results = await asyncio.gather(*[client.get(35.1, 33.3) for _ in range(10)])
+        again = await client.get(35.1000001, 33.3)
+        await client.aclose()
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert all(r[0]["name"] == "Fake" for r in results) and again == results[0]
+    assert sorted(fake_server.requests) == ["/forecast", "/weather"]
+    m = client.metrics()
+    assert (m["misses"], m["coalesced"], m["hits"]) == (1, 9, 1)
+
+
+def test_pooled_client_reuses_connections(fake_server):
+    client = WeatherClient(base_url=url(fake_server), api_key="k", max_keepalive=2, max_connections=2)
+
+    async def main():
+        for i in range(6):
+            await client.get(35.0 + i, 33.0)
+        await client.aclose()
+
+    asyncio.run(main())
+    assert len(fake_server.requests) == 12
+    assert len(fake_server.peers) <= 2
+    assert client.metrics()["clients_created"] == 1
+
+
+def test_cache_is_bounded_and_expires(fake_server):
+    client = WeatherClient(base_url=url(fake_server), api_key="k", max_entries=3, ttl=0.2)
+
+    async def main():
+        for i in range(5):
+            await client.get(35.0 + i / 10, 33.0)
+        assert len(client.cache) == 3
+        await client.get(35.4, 33.0)          # newest entry: hit
+        await asyncio.sleep(0.25)
+        await client.get(35.4, 33.0)          # expired: refetch
+        await client.aclose()
+
+    asyncio.run(main())
+    m = client.metrics()
+    assert m["evictions"] == 2 and m["expired"] == 1 and m["hits"] == 1 and m["misses"] == 6
+
+
+def test_failed_fetch_reaches_all_waiters_and_is_not_cached(fake_server):
+    FakeOpenWeather.fail = True
+    client = WeatherClient(base_url=url(fake_server), api_key="k")
+
+    async def main():
+        out = await asyncio.gather(*[client.get(35.1, 33.3) for _ in range(3)], return_exceptions=True)
+        await client.aclose()
+        return out
+
+    assert all(isinstance(r, Exception) for r in asyncio.run(main()))
+    assert len(client.cache) == 0 and client.metrics()["errors"] == 1
@@ -0,0 +1,107 @@
+# backend/test_weather_fetch.py
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import weather_fetch
+from weather_fetch import TokenBucket, fetch_grid
+
+
+class FakeWeather(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    delay = 0.05
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)
+        key = (query["lat"][0], query["lon"][0])
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            server.calls[key] = server.calls.get(key, 0) + 1
+            attempt = server.calls[key]
+        time.sleep(self.delay)
+        with server.lock:
+            server.active -= 1
+        if key in server.always_fail:
+            status, body = 500, b"{}"
+        elif key in server.flaky and attempt == 1:
+            status, body = 429, b"{}"
+        else:
+            status, body = 200, json.dumps({"name": f"{key[0]},{key[1]}", "main": {"temp": 20.0}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeWeather)
+    server.lock, server.calls, server.active, server.max_active = threading.Lock(), {}, 0, 0
+    server.flaky, server.always_fail = set(), set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(weather_fetch, "backoff", lambda attempt: 0.01)
+    yield server
+    server.shutdown()
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def grid(n):
+    return [(35.0 + i / 100, 33.0) for i in range(n)]
+
+
+def test_concurrent_fetch_in_order_with_progress(fake_server):
+    steps, stats = [], {}
+    t0 = time.perf_counter()
+    results = fetch_grid(grid(40), base_url=url(fake_server), api_key="k", concurrency=8, rate_per_minute=60_000,
+                         burst=40, progress=lambda d, t: steps.append((d, t)), stats=stats)
+    wall = time.perf_counter() - t0
+
+    assert [r["name"] for r in results] == [f"{lat},{lon}" for lat, lon in grid(40)]
+    assert steps[-1] == (40, 40) and len(steps) == 40
+    assert 1 < fake_server.max_active <= 8
+    assert wall < 40 * FakeWeather.delay / 2
+    assert stats["requests"] == 40 and stats["failed"] == 0
+
+
+def test_retries_then_reports_failures(fake_server):
+    points = grid(6)
+    fake_server.flaky = {(str(points[1][0]), str(points[1][1]))}
+    fake_server.always_fail = {(str(points[2][0]), str(points[2][1]))}
+    stats = {}
+    results = fetch_grid(points, base_url=url(fake_server), api_key="k", rate_per_minute=60_000, burst=20,
+                         retries=2, stats=stats)
+
+    assert results[1]["main"]["temp"] == 20.0
+    assert isinstance(results[2], Exception)
+    assert all(isinstance(r, dict) for i, r in enumerate(results) if i != 2)
+    assert stats["failed"] == 1 and stats["retries"] == 1 + 2 and stats["requests"] == 6 + 3
+
+
+def test_token_bucket_holds_the_rate():
+    async def main():
+        bucket = TokenBucket(rate_per_minute=600, burst=2)   # 10/s
+        t0 = time.perf_counter()
+        for _ in range(7):
+            await bucket.acquire()
+        return time.perf_counter() - t0
+
+    # 2 from the burst, then 5 at 10/s
+    assert 0.45 < asyncio.run(main()) < 1.0
@@ -1,4 +1,4 @@
-import { useState, useMemo, useEffect } from "react";
+import { useState, useMemo, useEffect, useRef } from "react";
 import "./App.css";
 import MapView from "./MapView";
 import Header from "./components/Header";
@@ -9,10 +9,32 @@ import { jsPDF } from "jspdf";
 // Cache buster - verify latest code is loaded
 console.log("🔄 App loaded - Ocean Filter v4.0 (User Feedback) - " + new Date().toISOString());
 
+// /grid/latest?format=columnar sends parallel arrays; rebuild one object per point
+const rowsFromColumns = (doc) => {
+  const cols = doc?.columns || {};
+  const names = Object.keys(cols);
+  return (cols.lat || []).map((_, i) => {
+    const row = {};
+    for (const name of names) row[name] = cols[name][i];
+    const code = row.risk_code;
+    if (code !== null && code !== undefined) {
+      row.flood_risk = doc.risk_labels[code];
+      row.recommended_action = doc.actions[code];
+    }
+    return row;
+  });
+};
+
+// Polling of a grid refresh job: every 2 s, for at most 30 minutes
+const JOB_POLL_INTERVAL_MS = 2000;
+const JOB_POLL_TIMEOUT_MS = 30 * 60 * 1000;
+
 function App() {
   // Application State
   const [gridData, setGridData] = useState([]);
   const [selectedPoint, setSelectedPoint] = useState(null);
+  // ETag of the grid we hold; /grid/stream deltas apply only on top of that version
+  const gridEtag = useRef(null);
 
   const [status, setStatus] = useState({
     loading: true,
@@ -131,12 +153,13 @@ function App() {
     try {
       console.log(`🔄 Fetching grid data for model: ${model}`);
       setStatus((s) => ({ ...s, loading: true, error: null }));
-      const res = await fetch(`/api/grid/latest?model=${model}`);
+      const res = await fetch(`/api/grid/latest?model=${model}&format=columnar`);
       const json = await res.json();
       if (!res.ok) throw new Error(json?.detail || `HTTP ${res.status}`);
       if (json?.status !== "success") throw new Error(json?.message || "Grid API returned non-success status");
 
-      setGridData(json.data || []);
+      gridEtag.current = res.headers.get("ETag");
+      setGridData(json.columns ? rowsFromColumns(json) : (json.data || []));
       setStatus({
         loading: false,
         error: null,
@@ -163,6 +186,20 @@ function App() {
         const errJson = await r.json().catch(() => ({}));
         throw new Error(errJson?.detail?.message || errJson?.detail || `Refresh failed (HTTP ${r.status})`);
       }
+      // The refresh runs as a background job: poll it until it finishes
+      const { job_id } = await r.json();
+      const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+      for (;;) {
+        if (Date.now() > deadline) throw new Error("Grid refresh is taking too long; check back later");
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        const res = await fetch(`/api/grid/jobs/${job_id}`);
+        // 404 after an API restart or once the job was dropped from the history
+        if (!res.ok) throw new Error(`Lost track of the refresh job (HTTP ${res.status})`);
+        const job = await res.json();
+        if (job.state === "failed") throw new Error(job.error || "Grid refresh failed");
+        if (job.state === "succeeded") break;
+        if (job.state !== "queued" && job.state !== "running") throw new Error(`Unexpected job state: ${job.state}`);
+      }
       await loadGrid();
     } catch (err) {
       setStatus({ loading: false, error: err?.message || String(err), lastUpdated: null });
@@ -170,10 +207,44 @@ function App() {
   };
 
   // Unified auto-load + refresh logic (Handles Model Changes)
+  // New grids are pushed over /grid/stream: apply the delta for our version, otherwise re-fetch
   useEffect(() => {
     loadGrid(selectedModel);
-    const id = setInterval(() => loadGrid(selectedModel), 5 * 60 * 1000);
-    return () => clearInterval(id);
+    const source = new EventSource("/api/grid/stream");
+    const holds = (digest) => Boolean(digest && gridEtag.current && gridEtag.current.includes(digest));
+
+    source.addEventListener("hello", (e) => {
+      const digest = JSON.parse(e.data).digests?.[selectedModel];
+      if (digest && gridEtag.current && !holds(digest)) loadGrid(selectedModel);
+    });
+    source.addEventListener("snapshot", (e) => {
+      const msg = JSON.parse(e.data);
+      const delta = msg.deltas?.[selectedModel];
+      if (!delta || !holds(delta.base)) {
+        loadGrid(selectedModel);
+        return;
+      }
+      // rows are [lat, lon, flood_probability, predicted_rainfall_mm, risk_code]
+      const key = (lat, lon) => `${lat},${lon}`;
+      const values = (r) => ({
+        flood_probability: r[2], predicted_rainfall_mm: r[3],
+        flood_risk: msg.risk_labels[r[4]], recommended_action: msg.actions[r[4]]
+      });
+      const changed = new Map(delta.changed.map((r) => [key(r[0], r[1]), r]));
+      const removed = new Set(delta.removed.map((r) => key(r[0], r[1])));
+      setGridData((rows) => {
+        const held = new Set(rows.map((p) => key(p.lat, p.lon)));
+        const added = delta.changed.filter((r) => !held.has(key(r[0], r[1])));
+        return rows
+          .filter((p) => !removed.has(key(p.lat, p.lon)))
+          .map((p) => (changed.has(key(p.lat, p.lon)) ? { ...p, ...values(changed.get(key(p.lat, p.lon))) } : p))
+          .concat(added.map((r) => ({ lat: r[0], lon: r[1], ...values(r) })));
+      });
+      gridEtag.current = `"${delta.digest}"`;
+      setStatus((s) => ({ ...s, lastUpdated: new Date(), generatedAt: msg.generated_at_utc }));
+    });
+    source.addEventListener("resync", () => loadGrid(selectedModel));
+    return () => source.close();
   }, [selectedModel]);
 
   // INSTANT UPDATE: Sync selected point with new grid data when model switches
@@ -29,6 +29,8 @@ let DefaultIcon = L.icon({
 L.Marker.prototype.options.icon = DefaultIcon;
 
 const northCyprusCenter = [35.33, 33.25];
+// Above this many points the grid is drawn only as server-rendered risk tiles
+const MAX_GRID_MARKERS = 1500;
 const northCyprusBounds = [
   [35.00, 32.20],
   [35.80, 34.85],
@@ -282,6 +284,14 @@ function MapView({ onSelectPoint, selectedPoint, flyToLocation, onGridLoaded, gr
             <TileLayer url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png" />
           )}
 
+          {/* Risk surface rendered server-side; the version changes with every new grid snapshot */}
+          <TileLayer
+            key={`${status?.activeModel}-${status?.generatedAt}`}
+            url={`/api/tiles/${status?.activeModel || "cached"}/{z}/{x}/{y}.png?v=${encodeURIComponent(status?.generatedAt || "")}`}
+            opacity={0.6}
+            zIndex={5}
+          />
+
           {/* Dynamic Color Overlay for Selected Area */}
           {(() => {
             const current = selectedPoint || selected;
@@ -346,7 +356,7 @@ function MapView({ onSelectPoint, selectedPoint, flyToLocation, onGridLoaded, gr
             </Marker>
           )}
 
-          {filteredGrid.map((p, i) => {
+          {filteredGrid.length <= MAX_GRID_MARKERS && filteredGrid.map((p, i) => {
             const isSelected = (selected && selected.lat === p.lat && selected.lon === p.lon);
             const isHigh = p.flood_risk === "High";
 
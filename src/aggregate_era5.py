@@ -1,22 +1,199 @@
+import os
+import sys
+import argparse
+import re
+from collections import defaultdict
+import numpy as np
 import pandas as pd
+import xarray as xr
 
-print("Loading combined dataset...")
-df = pd.read_csv("../data/era5_combined.csv")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import era5_store
 
-# Convert time to datetime
-df["time"] = pd.to_datetime(df["time"])
+IN = "../data/era5_combined.csv"
+NC_DIR = "../data/extracted"
+OUT = "../data/era5_daily.csv"
 
-print("Aggregating (grouping by date, latitude, longitude)...")
+CELL_COLS = ["latitude", "longitude"]
+CHUNK_DAYS = 7  # days of hourly data reduced per slice when reading NetCDF
 
-# Group by date + lat/lon
-daily = df.groupby([
-    df["time"].dt.date,
-    "latitude",
-    "longitude"
-], as_index=False).mean()
+# (output column, ERA5 variable, daily reduction)
+# Precipitation is a flux, so the daily value is the total, not the average.
+DAILY_COLUMNS = [
+    ("tp", "tp", "sum"),
+    ("t2m", "t2m", "mean"),
+    ("t2m_max", "t2m", "max"),
+    ("t2m_min", "t2m", "min"),
+    ("swvl1", "swvl1", "mean"),
+]
 
-print("Saving output...")
-daily.rename(columns={"time": "date"}, inplace=True)
-daily.to_csv("../data/era5_daily.csv", index=False)
 
-print("DONE! File saved to ../data/era5_daily.csv")
+def write_daily(daily, out_path, first):
+    """Append one block of daily rows to a CSV file or a partitioned store."""
+    if out_path.endswith(".csv"):
+        daily.to_csv(out_path, index=False, mode="w" if first else "a", header=first)
+    else:
+        name = pd.Timestamp(daily["date"].min()).strftime("%Y%m%d")
+        era5_store.write_partitioned(daily, out_path, name, time_col="date")
+
+
+# ---------------------------
+# Long-format input (CSV / Parquet store)
+# ---------------------------
+def daily_reduce(df):
+    # Convert time to datetime
+    df["time"] = pd.to_datetime(df["time"])
+    present = [(out, var, how) for out, var, how in DAILY_COLUMNS if var in df.columns]
+    df = df.dropna(subset=sorted({var for _, var, _ in present}), how="all")
+
+    daily = df.groupby([df["time"].dt.floor("D").rename("date")] + CELL_COLS).agg(
+        **{out: (var, how) for out, var, how in present}
+    ).reset_index()
+    return daily
+
+
+def aggregate(in_path=IN, out_path=OUT):
+    if era5_store.is_store(in_path):
+        # Days never span two monthly partitions, so each month can be
+        # aggregated on its own and appended.
+        print("Aggregating partitioned store month by month...")
+        first = True
+        for part in era5_store.iter_partitions(in_path):
+            write_daily(daily_reduce(part), out_path, first)
+            first = False
+    else:
+        print("Loading combined dataset...")
+        df = pd.read_csv(in_path)
+
+        print("Aggregating (grouping by date, latitude, longitude)...")
+        daily = daily_reduce(df)
+
+        print("Saving output...")
+        write_daily(daily, out_path, True)
+
+    print(f"DONE! File saved to {out_path}")
+
+
+# ---------------------------
+# Gridded input (NetCDF cube)
+# ---------------------------
+def time_dim(ds):
+    return "valid_time" if "valid_time" in ds.dims else "time"
+
+
+def reduce_cube(ds, chunk_days=CHUNK_DAYS):
+    """
+    Reduce one hourly (time, lat, lon) dataset to daily values, `chunk_days`
+    whole days at a time. Reductions run on the gridded arrays; only the
+    small daily result is turned into a DataFrame.
+    """
+    t_dim = time_dim(ds)
+    present = [(out, var, how) for out, var, how in DAILY_COLUMNS if var in ds.data_vars]
+    if not present:
+        return pd.DataFrame(columns=["date"] + CELL_COLS)
+
+    days = ds[t_dim].values.astype("datetime64[D]")
+    unique_days = np.unique(days)
+    frames = []
+    for i in range(0, len(unique_days), chunk_days):
+        block = unique_days[i:i + chunk_days]
+        idx = np.flatnonzero((days >= block[0]) & (days <= block[-1]))
+        hourly = ds.isel({t_dim: idx})
+        by_day = {var: hourly[var].resample({t_dim: "1D"}) for var in {v for _, v, _ in present}}
+
+        daily = xr.Dataset({
+            out: by_day[var].sum(min_count=1) if how == "sum" else getattr(by_day[var], how)()
+            for out, var, how in present
+        })
+        df = daily.to_dataframe().reset_index().rename(columns={t_dim: "date"})
+        frames.append(df[["date"] + CELL_COLS + [out for out, _, _ in present]])
+
+    return pd.concat(frames, ignore_index=True)
+
+
+MONTH_IN_PATH = re.compile(r"(?<!\d)((?:19|20)\d{2})[_-]?(0[1-9]|1[0-2])(?!\d)")
+
+
+def month_key(path, root):
+    """(year, month) of a .nc file from its name or folder (era5_2023_01), else from its first time step."""
+    match = MONTH_IN_PATH.search(os.path.relpath(path, root))
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    with xr.open_dataset(path) as ds:
+        first = pd.Timestamp(ds[time_dim(ds)].values.min())
+    return first.year, first.month
+
+
+def find_month_groups(nc_dir):
+    """
+    Group .nc files by (year, month). download_era5 writes one flat file per
+    month, while newer CDS exports split a month over several files in a
+    folder; both layouts give one group per month.
+    """
+    groups = defaultdict(list)
+    for root, dirs, files in os.walk(nc_dir):
+        for f in files:
+            if f.endswith(".nc"):
+                path = os.path.join(root, f)
+                groups[month_key(path, nc_dir)].append(path)
+    return [sorted(groups[k]) for k in sorted(groups)]
+
+
+def combine_month(frames):
+    """
+    One daily frame per month: files with the same variables (one month cut
+    into several time slices) are stacked, files with different variables
+    are joined on the cell-day.
+    """
+    keys = ["date"] + CELL_COLS
+    by_vars = defaultdict(list)
+    for df in frames:
+        by_vars[tuple(sorted(c for c in df.columns if c not in keys))].append(df)
+    month = None
+    for parts in by_vars.values():
+        stacked = pd.concat(parts, ignore_index=True).drop_duplicates(subset=keys, keep="last")
+        month = stacked if month is None else month.merge(stacked, on=keys, how="outer")
+    return month
+
+
+def aggregate_netcdf(nc_dir=NC_DIR, out_path=OUT, chunk_days=CHUNK_DAYS):
+    """Write era5_daily straight from the NetCDF files, one month in memory at a time."""
+    first = True
+    rows = 0
+    for files in find_month_groups(nc_dir):
+        frames = []
+        for path in files:
+            print("Reducing:", path)
+            with xr.open_dataset(path) as ds:
+                daily = reduce_cube(ds, chunk_days)
+            if not daily.empty:
+                frames.append(daily)
+        if not frames:
+            continue
+        month = combine_month(frames)
+
+        values = [c for c in month.columns if c not in ["date"] + CELL_COLS]
+        month = month.dropna(subset=values, how="all")
+        month = month.sort_values(["date"] + CELL_COLS).reset_index(drop=True)
+        write_daily(month, out_path, first)
+        first = False
+        rows += len(month)
+
+    print(f"DONE! {rows} daily rows saved to {out_path}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate hourly ERA5 to daily values.")
+    parser.add_argument("--source", choices=["netcdf", "table"], default="table",
+                        help="netcdf: reduce the extracted .nc files directly; table: read era5_combined")
+    parser.add_argument("--input", default=None,
+                        help="NetCDF folder, era5_combined.csv or a partitioned store directory")
+    parser.add_argument("--out", default=OUT, help="CSV file, or a directory for a partitioned store")
+    parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS)
+    args = parser.parse_args()
+
+    if args.source == "netcdf":
+        aggregate_netcdf(args.input or NC_DIR, args.out, args.chunk_days)
+    else:
+        aggregate(args.input or IN, args.out)
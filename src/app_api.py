@@ -1,20 +1,39 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import joblib
-import json
+import asyncio
 import os
-import subprocess
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 import numpy as np
-import requests
 from dotenv import load_dotenv
-import xgboost
-import sklearn
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from model_registry import ModelRegistry
+from weather_client import WeatherClient
+import grid_snapshot
+from grid_snapshot import GridSnapshots
+import risk_tiles
+from grid_stream import Broadcaster, GridFeed
+import inference
+from batching import MicroBatcher
+from grid_jobs import JobRunner
+import hourly_prediction_pipeline
+from prediction_history import PredictionHistory
 
 load_dotenv()
 
-app = FastAPI(title="Cyprus Flood Prediction API")
+@asynccontextmanager
+async def lifespan(app):
+    watcher = asyncio.create_task(watch_grid())
+    yield
+    watcher.cancel()
+    await weather_client.aclose()
+
+app = FastAPI(title="Cyprus Flood Prediction API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,36 +43,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# -------- Load models --------
+# -------- Models (loaded lazily on first use) --------
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MODELS_DIR = os.path.join(BASE_DIR, "models")
 
-MODEL_TYPES = ["rf", "xgb", "hybrid"]
-loaded_models = {}
+MODEL_TYPES = ["rf", "xgb", "hybrid", "hybrid-fast"]
+# "auto": serve RF/XGB through the flattened NumPy trees when an up-to-date
+# export exists (`python tree_engine.py export`), "native": always sklearn/xgboost
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "auto").lower()
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "1024"))
+MODEL_RELOAD_CHECK_SECONDS = float(os.getenv("MODEL_RELOAD_CHECK_SECONDS", "2"))
 
-print("[INFO] Loading prediction models...")
-for m_type in MODEL_TYPES:
-    reg_path = os.path.join(MODELS_DIR, f"{m_type}_regressor.joblib")
-    clf_path = os.path.join(MODELS_DIR, f"{m_type}_classifier.joblib")
-    
-    if os.path.exists(reg_path) and os.path.exists(clf_path):
-        try:
-            reg_data = joblib.load(reg_path)
-            clf_data = joblib.load(clf_path)
-            loaded_models[m_type] = {
-                "reg": reg_data["model"],
-                "clf": clf_data["model"],
-                "scaler": reg_data.get("scaler"),
-                "metadata": reg_data.get("metadata", {"name": m_type.upper()})
-            }
-            print(f"[OK] Loaded {m_type.upper()} model pair")
-        except Exception as e:
-            print(f"[ERROR] Error loading {m_type} models: {e}")
-    else:
-        print(f"[WARN] {m_type.upper()} models not found at {reg_path}")
+loaded_models = ModelRegistry(MODELS_DIR, MODEL_MEMORY_BUDGET_MB, MODEL_RELOAD_CHECK_SECONDS,
+                              backend=INFERENCE_BACKEND, model_types=MODEL_TYPES)
 
-if not loaded_models:
-    print("[CRITICAL] No models loaded.")
+if loaded_models.keys():
+    print(f"[INFO] Model pairs available (loaded on first use): {', '.join(loaded_models.keys())}")
+else:
+    print(f"[CRITICAL] No model pairs found in {MODELS_DIR}")
+
+def get_bundle(m_type):
+    try:
+        return loaded_models[m_type]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not load {m_type} models: {e}")
+
+# Concurrent /predict and /predict-location calls for the same model are
+# scored together: BATCH_WINDOW_MS=0 scores every request on its own
+dispatcher = MicroBatcher(lambda m_type: loaded_models[m_type],
+                          window_ms=float(os.getenv("BATCH_WINDOW_MS", "3")),
+                          max_rows=int(os.getenv("BATCH_MAX_ROWS", "256")))
 
 class PredictRequest(BaseModel):
     features: list[float]
@@ -75,30 +94,29 @@ def calculate_topo_features(lat, lon, temp, m_type):
 def index():
     return {"status": "ok", "message": "Cyprus Flood Prediction API is running", "models": list(loaded_models.keys())}
 
+@app.get("/models")
+def list_models():
+    # Load state, size and metadata only: bundles also carry the fitted scaler, which is not JSON
+    return {"status": "ok", **loaded_models.describe()}
+
+async def score_one(m_type, features):
+    """(rainfall, probability) for one feature vector, coalesced with concurrent requests."""
+    out = await dispatcher.score(m_type, np.array(features, dtype=float).reshape(1, -1), rows=1)
+    return float(out["predicted_rainfall_mm"][0]), float(out["flood_probability"][0])
+
 @app.post("/predict")
-def predict(req: PredictRequest):
+async def predict(req: PredictRequest):
     m_type = req.model_type.lower()
     if m_type not in loaded_models: m_type = "rf"
     if m_type not in loaded_models: raise HTTPException(status_code=500, detail="No models available")
 
-    bundle = loaded_models[m_type]
+    bundle = await run_in_threadpool(get_bundle, m_type)
     try:
-        X = np.array(req.features, dtype=float).reshape(1, -1)
-        if bundle["scaler"]: X = bundle["scaler"].transform(X)
-        
-        rainfall = float(bundle["reg"].predict(X)[0])
-        prob = float(bundle["clf"].predict_proba(X)[0][1])
-
-        # Updated thresholds: Low (<10%), Moderate (10-30%), High (>30%)
-        if prob < 0.10: 
-            risk = "Low"
-            action = "Monitor"
-        elif prob <= 0.30: 
-            risk = "Moderate"
-            action = "Prepare"
-        else: 
-            risk = "High"
-            action = "Evacuate / Alert"
+        rainfall, prob = await score_one(m_type, req.features)
+
+        # Low (<10%), Moderate (10-30%), High (>30%): see inference.RISK_EDGES
+        level = int(inference.risk_levels(prob))
+        risk, action = inference.RISK_LABELS[level], inference.ACTIONS[level]
 
         return {
             "predicted_rainfall_mm": rainfall,
@@ -107,67 +125,95 @@ def predict(req: PredictRequest):
             "recommended_action": action,
             "model_name": bundle["metadata"]["name"]
         }
+    except inference.PayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Simple in-memory cache for weather data: {(lat, lon): (timestamp, data)}
-weather_cache = {}
-import httpx
-import asyncio
+MAX_BATCH_ROWS = int(os.getenv("MAX_BATCH_ROWS", "100000"))
+
+@app.get("/metrics/inference")
+def inference_metrics():
+    return {"status": "ok", **dispatcher.metrics()}
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request, model_type: str = None):
+    """
+    Score an (N, 10) feature matrix in one call. The body is JSON
+    ({"features": [[...]], "model_type": "rf"}), .npy or Arrow IPC (see
+    inference.py); results come back as columns in the same format.
+    """
+    kind = inference.media_type(request.headers.get("content-type"))
+    try:
+        X, options = inference.decode_features(await request.body(), kind)
+    except inference.UnsupportedPayload as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except inference.PayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(X) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ROWS} rows per batch")
+
+    m_type = (model_type or options.get("model_type") or "rf").lower()
+    if m_type not in loaded_models: m_type = "rf"
+    if m_type not in loaded_models: raise HTTPException(status_code=500, detail="No models available")
+    bundle = await run_in_threadpool(get_bundle, m_type)
+
+    try:
+        columns = await run_in_threadpool(inference.score, bundle, X)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    body, out_type = inference.encode_results(columns, kind, bundle["metadata"]["name"])
+    if out_type == inference.JSON:
+        return body
+    return Response(content=body, media_type=out_type, headers={"X-Model-Name": bundle["metadata"]["name"],
+                                                                "X-Risk-Levels": ",".join(inference.RISK_LABELS)})
+
+# Bounded TTL/LRU weather cache with single-flight fetches over one pooled client
+weather_client = WeatherClient(ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+                               max_entries=int(os.getenv("WEATHER_CACHE_ENTRIES", "2048")))
+
+@app.get("/metrics/weather")
+def weather_metrics():
+    return {"status": "ok", **weather_client.metrics()}
 
 @app.get("/predict-location")
-async def predict_location(lat: float, lon: float, model: str = "rf"):
+async def predict_location(lat: float, lon: float, model: str = "rf", trajectory: bool = False):
+    """
+    Current conditions plus the 24h/48h/72h horizons, scored as one matrix.
+    `trajectory=true` adds the risk for every 3-hourly forecast step; those
+    rows go into the same single model call.
+    """
     m_type = model.lower()
     if m_type not in loaded_models: m_type = "rf"
     if m_type not in loaded_models: raise HTTPException(status_code=500, detail="No models loaded")
     
-    bundle = loaded_models[m_type]
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    
-    # Check cache (10 minute expiry)
-    cache_key = (round(lat, 3), round(lon, 3))
-    now_ts = datetime.now().timestamp()
-    if cache_key in weather_cache:
-        ts, cached_res = weather_cache[cache_key]
-        if now_ts - ts < 600: # 10 minutes
-            weather, forecast_data = cached_res
-        else:
-            del weather_cache[cache_key]
-    
+    bundle = await run_in_threadpool(get_bundle, m_type)
+
     try:
-        # If not cached, fetch concurrently
-        if cache_key not in weather_cache:
-            async with httpx.AsyncClient() as client:
-                # Parallel fetch
-                curr_task = client.get(f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric", timeout=10.0)
-                fore_task = client.get(f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={api_key}&units=metric", timeout=10.0)
-                
-                curr_res, fore_res = await asyncio.gather(curr_task, fore_task)
-                
-                curr_res.raise_for_status()
-                fore_res.raise_for_status()
-                
-                weather = curr_res.json()
-                forecast_data = fore_res.json()
-                
-                # Update cache
-                weather_cache[cache_key] = (now_ts, (weather, forecast_data))
-
-        # 2. Build features using unified logic
+        # 1. Weather: cached, at most one upstream fetch per point at a time
+        weather, forecast_data = await weather_client.get(lat, lon)
+
+        # 2. Build features using unified logic: only the temperature differs between rows
         features, topo_bias = calculate_topo_features(lat, lon, weather["main"]["temp"], m_type)
-        
-        X = np.array(features, dtype=float).reshape(1, -1)
-        if bundle["scaler"]: X = bundle["scaler"].transform(X)
-
-        rainfall = float(bundle["reg"].predict(X)[0])
-        prob = float(bundle["clf"].predict_proba(X)[0][1])
-        
-        if prob < 0.10: 
-            risk, action = "Low", "Monitor"
-        elif prob <= 0.30: 
-            risk, action = "Moderate", "Prepare"
-        else: 
-            risk, action = "High", "Evacuate / Alert"
+        forecast_list = forecast_data.get("list", [])
+
+        # Calculate specific future horizons: 24h, 48h, 72h
+        # Forecast list indices: 24h (index 8), 48h (index 16), 72h (index 24)
+        horizons = [(label, min(idx, len(forecast_list) - 1)) for label, idx in [("24h", 8), ("48h", 16), ("72h", 24)]]
+        horizons = [(label, idx) for label, idx in horizons if idx >= 0]
+        steps = list(range(len(forecast_list))) if trajectory else sorted({idx for _, idx in horizons})
+
+        # Row 0 is "now", row 1 + i is forecast_list[steps[i]]
+        X = np.tile(np.array(features, dtype=float), (1 + len(steps), 1))
+        X[1:, -1] = [forecast_list[i]["main"]["temp"] for i in steps]
+        scored = await dispatcher.score(m_type, X)
+        rain_col, prob_col = scored["predicted_rainfall_mm"], scored["flood_probability"]
+        row_of = {step: 1 + i for i, step in enumerate(steps)}
+
+        rainfall, prob = float(rain_col[0]), float(prob_col[0])
+        level = int(scored["risk_level"][0])
+        risk, action = inference.RISK_LABELS[level], inference.ACTIONS[level]
 
         # Format UI data
         hourly = [
@@ -178,39 +224,22 @@ async def predict_location(lat: float, lon: float, model: str = "rf"):
                 "wind": round(x["wind"]["speed"] * 3.6),
                 "description": x["weather"][0]["description"]
             } 
-            for x in forecast_data.get("list", [])[:24] # Show up to 72 hours (3h steps * 24 = 72h)
+            for x in forecast_list[:24] # Show up to 72 hours (3h steps * 24 = 72h)
         ]
 
-        # Calculate specific future horizons: 24h, 48h, 72h
-        # Forecast list indices: 24h (index 8), 48h (index 16), 72h (index 24)
-        future_horizons = {}
-        forecast_list = forecast_data.get("list", [])
-        
-        for label, idx in [("24h", 8), ("48h", 16), ("72h", 24)]:
-            target_idx = min(idx, len(forecast_list) - 1)
-            if target_idx >= 0:
-                f_item = forecast_list[target_idx]
-                f_temp = f_item["main"]["temp"]
-                # Reuse existing feature calculation logic
-                f_features, _ = calculate_topo_features(lat, lon, f_temp, m_type)
-                
-                f_X = np.array(f_features, dtype=float).reshape(1, -1)
-                if bundle["scaler"]: f_X = bundle["scaler"].transform(f_X)
-                
-                f_rainfall = float(bundle["reg"].predict(f_X)[0])
-                f_prob = float(bundle["clf"].predict_proba(f_X)[0][1])
-                
-                if f_prob < 0.10: f_risk = "Low"
-                elif f_prob <= 0.30: f_risk = "Moderate"
-                else: f_risk = "High"
-                
-                future_horizons[label] = {
-                    "time": datetime.fromtimestamp(f_item["dt"]).strftime("%a %H:%M"),
-                    "temp": round(f_temp),
-                    "rainfall_mm": round(f_rainfall, 2),
-                    "probability": round(f_prob, 3),
-                    "risk": f_risk
-                }
+        def step_result(step, time_format):
+            row, f_item = row_of[step], forecast_list[step]
+            return {
+                "time": datetime.fromtimestamp(f_item["dt"]).strftime(time_format),
+                "temp": round(f_item["main"]["temp"]),
+                "rainfall_mm": round(float(rain_col[row]), 2),
+                "probability": round(float(prob_col[row]), 3),
+                "risk": inference.RISK_LABELS[int(scored["risk_level"][row])]
+            }
+
+        future_horizons = {label: step_result(idx, "%a %H:%M") for label, idx in horizons}
+        prediction_trajectory = [{"dt": forecast_list[i]["dt"], **step_result(i, "%a %H:%M")} for i in steps] if trajectory else None
+
         daily = []
         seen = set()
         for x in forecast_data.get("list", []):
@@ -234,7 +263,8 @@ async def predict_location(lat: float, lon: float, model: str = "rf"):
                 "recommended_action": action,
                 "model_name": bundle["metadata"]["name"],
                 "topo_bias": topo_bias,
-                "future_horizons": future_horizons
+                "future_horizons": future_horizons,
+                **({"trajectory": prediction_trajectory} if trajectory else {})
             }
         }
     except Exception as e:
@@ -243,14 +273,9 @@ async def predict_location(lat: float, lon: float, model: str = "rf"):
         try:
             # Fallback prediction with default temp 25C
             features, topo_bias = calculate_topo_features(lat, lon, 25.0, m_type)
-            X = np.array(features, dtype=float).reshape(1, -1)
-            if bundle["scaler"]: X = bundle["scaler"].transform(X)
-            rainfall = float(bundle["reg"].predict(X)[0])
-            prob = float(bundle["clf"].predict_proba(X)[0][1])
-             
-            if prob < 0.10: r, a = "Low", "Monitor"
-            elif prob <= 0.30: r, a = "Moderate", "Prepare"
-            else: r, a = "High", "Evacuate"
+            rainfall, prob = await score_one(m_type, features)
+            level = int(inference.risk_levels(prob))
+            r, a = inference.RISK_LABELS[level], inference.ACTIONS[level]
             
             return {
                 "location": {"lat": lat, "lon": lon, "name": "Unknown (Offline)"},
@@ -268,112 +293,170 @@ async def predict_location(lat: float, lon: float, model: str = "rf"):
         except:
             raise HTTPException(status_code=500, detail=f"Prediction failed: {e}")
 
-@app.get("/grid/latest")
-def get_latest_grid(model: str = None):
-    file_path = os.path.join(BASE_DIR, "data", "latest_grid_predictions.json")
-    if not os.path.exists(file_path):
-        file_path = os.path.join(BASE_DIR, "data", "grid_predictions.json")
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Grid data not found.")
+GRID_FILES = [os.path.join(BASE_DIR, "data", "latest_grid_predictions.json"),
+              os.path.join(BASE_DIR, "data", "grid_predictions.json")]
+grid_snapshots = GridSnapshots(GRID_FILES, loaded_models)
+
+tile_cache = risk_tiles.TileCache(grid_snapshots, max_tiles=int(os.getenv("TILE_CACHE_TILES", "4096")))
+
+# New snapshots are pushed to /grid/stream clients (with per-model deltas)
+grid_broadcaster = Broadcaster(queue_size=int(os.getenv("GRID_STREAM_QUEUE", "8")))
+grid_feed = GridFeed(grid_snapshots, grid_broadcaster)
+GRID_WATCH_SECONDS = float(os.getenv("GRID_WATCH_SECONDS", "10"))
+
+async def watch_grid():
+    """Notice grid files written outside the API (e.g. a cron pipeline) while clients are connected."""
+    while True:
+        await asyncio.sleep(GRID_WATCH_SECONDS)
+        if grid_broadcaster.subscribers:
+            try:
+                await run_in_threadpool(grid_feed.check)
+            except Exception as e:
+                print(f"[WARN] Grid watch failed: {e}")
+
+@app.get("/metrics/grid")
+def grid_metrics():
+    return {"status": "ok", **grid_snapshots.metrics(), "tiles": tile_cache.metrics(),
+            "stream": grid_broadcaster.metrics()}
 
-    with open(file_path, "r") as f:
-        data = json.load(f)
+@app.get("/grid/stream")
+async def grid_stream(request: Request):
+    """Server-Sent Events: "hello" on connect, then "snapshot" (with deltas) for every new grid."""
+    await run_in_threadpool(grid_feed.check)
+    sub = grid_broadcaster.subscribe()
 
-    # If model is requested, re-predict on the fly for all points (Vectorized)
-    if model and model.lower() in loaded_models:
-        m_type = model.lower()
-        bundle = loaded_models[m_type]
-        
+    async def events():
         try:
-            # OPTIMIZATION: Vectorized Batch Prediction
-            # Instead of looping predict(), we build the matrix X first.
-            
-            # 1. Extract features for ALL points
-            X_list = []
-            valid_indices = []
-            
-            for i, p in enumerate(data):
-                try:
-                    lat, lon = p["lat"], p["lon"]
-                    temp = p.get("temp_c", 25.0)
-                    if temp == 0: temp = 25.0
-                    
-                    # Feature Calc
-                    topo_bias = (np.sin(lat * 60) * np.cos(lon * 40) * 3.0)
-                    moisture = max(0, 0.4 + topo_bias)
-                    features = [moisture] * 9 + [float(temp)]
-                    X_list.append(features)
-                    valid_indices.append(i)
-                except:
-                    continue
-            
-            if X_list:
-                X_batch = np.array(X_list, dtype=float)
-                
-                # 2. Scale Batch
-                if bundle["scaler"]:
-                    X_batch = bundle["scaler"].transform(X_batch)
-                
-                # 3. Predict Batch
-                rainfall_batch = bundle["reg"].predict(X_batch)
-                probs_batch = bundle["clf"].predict_proba(X_batch)[:, 1]
-                
-                # 4. Update Data Iteratively (Fast because no model calls)
-                for idx, r_val, p_val in zip(valid_indices, rainfall_batch, probs_batch):
-                    p = data[idx]
-                    prob = float(p_val)
-                    rainfall = float(r_val)
-                    
-                    if prob < 0.10: 
-                        rs, ac = "Low", "Monitor"
-                    elif prob <= 0.30: 
-                        rs, ac = "Moderate", "Prepare"
-                    else: 
-                        rs, ac = "High", "Evacuate / Alert"
-                        
-                    p["flood_risk"] = rs
-                    p["flood_probability"] = prob
-                    p["predicted_rainfall_mm"] = rainfall
-                    p["recommended_action"] = ac
-                    p["prediction"] = {
-                        "predicted_rainfall_mm": rainfall,
-                        "flood_probability": prob,
-                        "flood_risk": rs,
-                        "recommended_action": ac,
-                        "model_used": bundle["metadata"]["name"]
-                    }
-                    
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            print(f"[ERROR] Batch prediction failed: {e}. Falling back to cached values.")
-            pass
+            async for frame in grid_feed.events(sub, request.is_disconnected):
+                yield frame
+        finally:
+            grid_broadcaster.unsubscribe(sub)
 
-    return {
-        "status": "success",
-        "count": len(data),
-        "generated_at_utc": datetime.now(timezone.utc).isoformat(),
-        "data": data,
-        "model_applied": model if model else "cached"
-    }
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/tiles/{model}/{z}/{x}/{y}")
+def get_tile(request: Request, model: str, z: int, x: int, y: str):
+    """PNG risk tile (XYZ scheme) rendered from the current grid snapshot for `model`."""
+    y = y.removesuffix(".png")
+    if not y.isdigit() or not risk_tiles.valid_tile(z, x, int(y)):
+        raise HTTPException(status_code=404, detail="No such tile")
+    tile = tile_cache.get(model if model != grid_snapshot.CACHED else None, z, x, int(y))
+    if tile is None:
+        raise HTTPException(status_code=404, detail="Grid data not found.")
+
+    body, etag = tile
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="image/png", headers=headers)
+
+@app.get("/grid/latest")
+def get_latest_grid(request: Request, model: str = None, format: str = None):
+    """
+    The latest grid, scored with `model` if given. `format` (or Accept)
+    picks rows (json), columnar JSON, msgpack or Arrow; gzip / brotli
+    follow Accept-Encoding. See grid_snapshot.py.
+    """
+    # Parsed, scored and encoded once per (grid file, model); repeat requests reuse the bytes
+    snap = grid_snapshots.get(model)
+    if snap is None:
+        raise HTTPException(status_code=404, detail="Grid data not found.")
+    try:
+        fmt = grid_snapshot.negotiate_format(format, request.headers.get("accept"))
+    except grid_snapshot.UnsupportedFormat as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    encoding = grid_snapshot.negotiate_encoding(request.headers.get("accept-encoding"))
+
+    body, etag = snap.variant(fmt, encoding)
+    headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding"}
+    if snap.matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=grid_snapshot.FORMATS[fmt], headers=headers)
 
 @app.middleware("http")
 async def add_no_cache(request, call_next):
     response = await call_next(request)
     if request.url.path == "/grid/latest":
-        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+        # clients may keep the body but must revalidate it (ETag / If-None-Match)
+        response.headers["Cache-Control"] = "no-cache, must-revalidate"
     return response
 
-@app.post("/grid/refresh")
+def run_refresh(model, progress):
+    # The whole grid is scored in one call with the models this process has already loaded
+    def score(X, m):
+        return hourly_prediction_pipeline.score_local(X, m, registry=loaded_models)
+    return hourly_prediction_pipeline.run_pipeline(model=model, score=score, progress=progress)
+
+def refresh_done(job):
+    grid_snapshots.invalidate()
+    grid_feed.check()
+    tile_cache.warm_async([job.model, None])
+
+# One refresh at a time, in-process; repeated requests for a model join its running job
+refresh_jobs = JobRunner(run_refresh, on_success=refresh_done)
+
+@app.post("/grid/refresh", status_code=202)
 def refresh_grid(model: str = "rf"):
-    script = os.path.join("src", "hourly_prediction_pipeline.py")
-    # Set env var for the pipeline to pick up
-    new_env = os.environ.copy()
-    new_env["ML_MODEL"] = model.lower()
-    
+    """Start (or join) a grid refresh; poll GET /grid/jobs/{job_id} for progress."""
+    if model.lower() not in MODEL_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown model '{model}' (expected one of {', '.join(MODEL_TYPES)})")
+    job, joined = refresh_jobs.submit(model.lower())
+    return {
+        "status": "accepted",
+        "job_id": job.id,
+        "joined": joined,
+        "message": f"Grid refresh using {job.model} {'already running' if joined else 'started'}",
+        "job": job.to_dict()
+    }
+
+@app.get("/grid/jobs")
+def list_grid_jobs():
+    return {"status": "ok", "jobs": refresh_jobs.list()}
+
+@app.get("/grid/jobs/{job_id}")
+def get_grid_job(job_id: str):
+    job = refresh_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": "ok", **job.to_dict()}
+
+# -------- Prediction history (written by the pipeline, read here) --------
+HISTORY_DB = hourly_prediction_pipeline.HISTORY_DB
+prediction_history = None
+
+def get_history():
+    global prediction_history
+    if prediction_history is None:
+        if not os.path.exists(HISTORY_DB):
+            raise HTTPException(status_code=404, detail="No prediction history yet.")
+        prediction_history = PredictionHistory(HISTORY_DB)
+    return prediction_history
+
+def history_time(value):
     try:
-        result = subprocess.run(["python", script], capture_output=True, text=True, check=True, cwd=BASE_DIR, env=new_env)
-        return {"status": "success", "message": f"Grid refreshed using {model}", "stdout": result.stdout[-500:]}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp: {value}")
+
+@app.get("/history/point")
+def history_point(lat: float, lon: float, start: str = None, end: str = None, limit: int = None):
+    """One grid point's predictions over time (oldest first)."""
+    series = get_history().point_series(lat, lon, history_time(start), history_time(end), limit)
+    return {"status": "ok", "lat": lat, "lon": lon, "count": len(series), "data": series}
+
+@app.get("/history/grid")
+def history_grid(at: str = None):
+    """The full grid of the latest run at or before `at` (default: the latest run)."""
+    grid = get_history().grid_at(history_time(at))
+    if not grid:
+        raise HTTPException(status_code=404, detail="No run at or before that time.")
+    return {"status": "ok", "timestamp": grid[0]["timestamp"], "count": len(grid), "data": grid}
+
+@app.get("/history/runs")
+def history_runs(limit: int = 100):
+    history = get_history()
+    return {"status": "ok", **history.stats(), "recent": history.runs(limit)}
+
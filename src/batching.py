@@ -0,0 +1,157 @@
+# batching.py
+"""
+Micro-batching dispatcher for the online endpoints.
+
+Requests for the same model type that arrive within `window_ms` of the
+first one (or until `max_rows` rows are queued) are stacked into one matrix
+and scored with a single `inference.score` call on a dedicated worker
+thread. Each caller awaits a future that resolves to its own rows.
+
+One inference thread instead of one threadpool task per request means the
+models are not fighting over the GIL, and per-call overhead (validation,
+scaler, tree dispatch) is paid once per batch.
+
+Each request is checked (shape, finite values) before it is queued, so a
+malformed request is rejected on its own instead of failing the batch. If
+a batch still fails, its requests are scored one by one and only the
+failing ones get the error.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import inference
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+
+
+class MicroBatcher:
+    def __init__(self, resolve, window_ms=3.0, max_rows=256, workers=1):
+        """`resolve(m_type)` returns the bundle to score with (looked up when the batch runs)."""
+        self.resolve = resolve
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self.queues = defaultdict(list)   # m_type -> [(X, future, enqueued_at)]
+        self.timers = {}
+        self.stats = {
+            "requests": 0, "rows": 0, "batches": 0, "errors": 0, "split_batches": 0,
+            "max_queue_depth": 0, "max_batch_rows": 0,
+            "wait_seconds": 0.0, "inference_seconds": 0.0,
+            "batch_rows_histogram": {b: 0 for b in BATCH_SIZE_BUCKETS + ["more"]},
+        }
+
+    @property
+    def enabled(self):
+        return self.window > 0 and self.max_rows > 1
+
+    def queue_depth(self):
+        return sum(len(q) for q in self.queues.values())
+
+    @staticmethod
+    def check(X, rows=None):
+        """X as a float matrix of N_FEATURES columns (and `rows` rows); PayloadError otherwise."""
+        X = np.asarray(X, dtype=float)
+        if X.ndim != 2 or X.shape[1] != inference.N_FEATURES or (rows is not None and len(X) != rows):
+            shape = f"({rows if rows is not None else 'N'}, {inference.N_FEATURES})"
+            raise inference.PayloadError(f"Expected a {shape} feature matrix, got shape {X.shape}")
+        if not np.isfinite(X).all():
+            raise inference.PayloadError("Features must be finite numbers")
+        return X
+
+    async def score(self, m_type, X, rows=None):
+        """Columns for the rows of X (see inference.score), scored together with concurrent callers."""
+        X = self.check(X, rows)
+        loop = asyncio.get_running_loop()
+        self.stats["requests"] += 1
+        self.stats["rows"] += len(X)
+
+        if not self.enabled:
+            return await self.run(m_type, [X], [time.perf_counter()])
+
+        future = loop.create_future()
+        queue = self.queues[m_type]
+        queue.append((X, future, time.perf_counter()))
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue_depth())
+
+        if sum(len(x) for x, _, _ in queue) >= self.max_rows:
+            self.flush(m_type)
+        elif m_type not in self.timers:
+            self.timers[m_type] = loop.call_later(self.window, self.flush, m_type)
+        return await future
+
+    def flush(self, m_type):
+        timer = self.timers.pop(m_type, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.queues.pop(m_type, [])
+        if batch:
+            asyncio.ensure_future(self.dispatch(m_type, batch))
+
+    async def dispatch(self, m_type, batch):
+        mats, futures, enqueued = zip(*batch)
+        try:
+            columns = await self.run(m_type, mats, enqueued)
+        except Exception as e:
+            if len(batch) == 1:
+                self.stats["errors"] += 1
+                if not futures[0].done():
+                    futures[0].set_exception(e)
+                return
+            # score each request on its own so only the failing ones see the error
+            self.stats["split_batches"] += 1
+            for item in batch:
+                await self.dispatch(m_type, [item])
+            return
+
+        start = 0
+        for X, fut in zip(mats, futures):
+            end = start + len(X)
+            if not fut.done():
+                fut.set_result({k: v[start:end] for k, v in columns.items()})
+            start = end
+
+    async def run(self, m_type, mats, enqueued):
+        now = time.perf_counter()
+        self.stats["wait_seconds"] += sum(now - t for t in enqueued)
+        X = mats[0] if len(mats) == 1 else np.vstack(mats)
+
+        def work():
+            return inference.score(self.resolve(m_type), X)
+
+        t0 = time.perf_counter()
+        columns = await asyncio.get_running_loop().run_in_executor(self.executor, work)
+        self.stats["inference_seconds"] += time.perf_counter() - t0
+        self.record_batch(len(X))
+        return columns
+
+    def record_batch(self, n_rows):
+        self.stats["batches"] += 1
+        self.stats["max_batch_rows"] = max(self.stats["max_batch_rows"], n_rows)
+        bucket = next((b for b in BATCH_SIZE_BUCKETS if n_rows <= b), "more")
+        self.stats["batch_rows_histogram"][bucket] += 1
+
+    def metrics(self):
+        s = self.stats
+        batches = max(s["batches"], 1)
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window * 1000,
+            "max_rows": self.max_rows,
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": s["max_queue_depth"],
+            "requests": s["requests"],
+            "rows": s["rows"],
+            "batches": s["batches"],
+            "errors": s["errors"],
+            "split_batches": s["split_batches"],
+            "mean_batch_rows": round(s["rows"] / batches, 2),
+            "max_batch_rows": s["max_batch_rows"],
+            "mean_requests_per_batch": round(s["requests"] / batches, 2),
+            "mean_wait_ms": round(s["wait_seconds"] / max(s["requests"], 1) * 1000, 3),
+            "mean_inference_ms": round(s["inference_seconds"] / batches * 1000, 3),
+            "batch_rows_histogram": {str(k): v for k, v in s["batch_rows_histogram"].items()},
+        }
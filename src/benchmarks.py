@@ -0,0 +1,330 @@
+# benchmarks.py
+"""
+Micro-benchmarks for the offline and serving pipeline.
+
+Run one suite at a time from the src/ folder, e.g.
+
+    python benchmarks.py features --cells 100 400 1600 --days 365 730
+"""
+import os
+import argparse
+import tempfile
+import time
+import resource
+import numpy as np
+import pandas as pd
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def synthetic_daily(n_cells, n_days, seed=42):
+    """Labeled daily ERA5-like frame with `n_cells` grid cells and `n_days` days."""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n_cells)))
+    lats = np.round(35.0 + 0.1 * (np.arange(n_cells) // side), 4)
+    lons = np.round(32.2 + 0.1 * (np.arange(n_cells) % side), 4)
+    dates = pd.date_range("2020-01-01", periods=n_days, freq="D")
+
+    df = pd.DataFrame({
+        "date": np.tile(dates, n_cells),
+        "latitude": np.repeat(lats, n_days),
+        "longitude": np.repeat(lons, n_days),
+        "tp": rng.gamma(0.3, 0.003, n_cells * n_days),
+        "t2m": rng.normal(291.0, 6.0, n_cells * n_days),
+    })
+    df["next_tp"] = df.groupby(["latitude", "longitude"])["tp"].shift(-1)
+    df = df.dropna(subset=["next_tp"]).reset_index(drop=True)
+    df["flood_label"] = (df["next_tp"] >= df["tp"].quantile(0.95)).astype(int)
+    return df
+
+
+# ---------------------------
+# prepare_features
+# ---------------------------
+def bench_features(cells, days):
+    import prepare_features
+
+    print(f"{'cells':>7} {'days':>6} {'rows':>10} {'loop s':>9} {'vector s':>9} {'speedup':>8}")
+    for n_cells in cells:
+        for n_days in days:
+            df = synthetic_daily(n_cells, n_days)
+            fast, t_fast = timed(prepare_features.build_features, df)
+            slow, t_slow = timed(prepare_features.build_features_loop, df)
+            pd.testing.assert_frame_equal(fast, slow)
+            print(f"{n_cells:>7} {n_days:>6} {len(df):>10} {t_slow:>9.3f} {t_fast:>9.3f} {t_slow / t_fast:>7.1f}x")
+
+
+# ---------------------------
+# aggregate_era5
+# ---------------------------
+def synthetic_nc_month(path, year, month, n_lat, n_lon, seed=0):
+    import xarray as xr
+
+    times = pd.date_range(f"{year}-{month:02d}-01", periods=24 * pd.Period(f"{year}-{month:02d}").days_in_month, freq="h")
+    rng = np.random.default_rng(seed)
+    shape = (len(times), n_lat, n_lon)
+    ds = xr.Dataset(
+        {
+            "tp": (("valid_time", "latitude", "longitude"), rng.gamma(0.3, 0.0003, shape).astype("float32")),
+            "t2m": (("valid_time", "latitude", "longitude"), rng.normal(291.0, 6.0, shape).astype("float32")),
+        },
+        coords={
+            "valid_time": times,
+            "latitude": np.round(36.7 - 0.1 * np.arange(n_lat), 2),
+            "longitude": np.round(32.2 + 0.1 * np.arange(n_lon), 2),
+        },
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    ds.to_netcdf(path)
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_aggregate(n_months, n_lat, n_lon, mode):
+    """
+    Run one aggregation mode per process (peak RSS is process-wide), e.g.
+    `benchmarks.py aggregate --mode csv` then `--mode netcdf`.
+    """
+    import aggregate_era5
+    import preprocess_era5
+
+    work = tempfile.mkdtemp(prefix="era5_bench_")
+    nc_dir = os.path.join(work, "extracted")
+    for i in range(n_months):
+        year, month = 2020 + i // 12, i % 12 + 1
+        synthetic_nc_month(os.path.join(nc_dir, f"era5_{year}_{month:02d}", "data_0.nc"), year, month, n_lat, n_lon, seed=i)
+
+    rss_before = peak_rss_mb()
+    if mode == "csv":
+        csv_path = os.path.join(work, "era5_combined.csv")
+        _, t_pre = timed(preprocess_era5.preprocess_real_nc, nc_dir, csv_path)
+        _, t_agg = timed(aggregate_era5.aggregate, csv_path, os.path.join(work, "daily.csv"))
+        elapsed = t_pre + t_agg
+    else:
+        _, elapsed = timed(aggregate_era5.aggregate_netcdf, nc_dir, os.path.join(work, "daily.csv"))
+
+    print(f"mode={mode} months={n_months} grid={n_lat}x{n_lon} wall={elapsed:.2f}s "
+          f"peak_rss={peak_rss_mb():.0f}MB (baseline {rss_before:.0f}MB)")
+
+
+# ---------------------------
+# create_labels threshold
+# ---------------------------
+def bench_threshold(n_rows, n_parts, quantile=0.95):
+    from quantile_sketch import QuantileSketch
+
+    rng = np.random.default_rng(7)
+    values = rng.gamma(0.3, 0.003, n_rows)
+    values[rng.random(n_rows) < 0.4] = 0.0  # dry days
+
+    exact, t_exact = timed(pd.Series(values).quantile, quantile)
+
+    def sketch_all():
+        sketch = QuantileSketch()
+        for part in np.array_split(values, n_parts):
+            sketch.merge(QuantileSketch().add(part))
+        return sketch
+
+    sketch, t_sketch = timed(sketch_all)
+    approx = sketch.quantile(quantile)
+    print(f"rows={n_rows} partitions={n_parts}")
+    print(f"  exact  quantile={exact:.6f}  {t_exact:.3f}s  (needs all {values.nbytes / 1e6:.0f} MB in RAM)")
+    print(f"  sketch quantile={approx:.6f}  {t_sketch:.3f}s  rel.err={abs(approx - exact) / exact:.4%}  "
+          f"buckets={len(sketch.counts)}")
+
+
+# ---------------------------
+# tree inference engine
+# ---------------------------
+def best_of(fn, X, repeat):
+    return min(timed(fn, X)[1] for _ in range(repeat))
+
+
+def bench_trees(batches, n_train=20_000):
+    import prepare_features
+    import tree_engine
+    from prepare_features import FEATURE_COLS
+    from train_models import build_estimator
+
+    df = synthetic_daily(200, n_train // 200 + 10)
+    feat = prepare_features.build_features(df).dropna(subset=FEATURE_COLS)
+    X, y_reg, y_clf = feat[FEATURE_COLS].to_numpy(), feat["next_tp"].to_numpy(), feat["flood_label"].to_numpy()
+    rng = np.random.default_rng(0)
+
+    print(f"{'model':<18} {'batch':>6} {'native ms':>10} {'compiled ms':>12} {'speedup':>8}")
+    for name in ["rf", "xgb"]:
+        for task, y in [("regression", y_reg), ("classification", y_clf)]:
+            model = build_estimator(name, task).fit(X, y)
+            compiled = tree_engine.export_model(model, task)
+            native_fn = model.predict if task == "regression" else model.predict_proba
+            compiled_fn = compiled.predict if task == "regression" else compiled.predict_proba
+            for n in batches:
+                Xb = X[rng.integers(0, len(X), n)]
+                np.testing.assert_allclose(compiled_fn(Xb), native_fn(Xb), rtol=1e-4, atol=1e-5)
+                repeat = max(3, min(200, 20_000 // n))
+                t_native, t_compiled = best_of(native_fn, Xb, repeat), best_of(compiled_fn, Xb, repeat)
+                print(f"{name + ' ' + task:<18} {n:>6} {t_native * 1000:>10.3f} {t_compiled * 1000:>12.3f} "
+                      f"{t_native / t_compiled:>7.1f}x")
+
+
+# ---------------------------
+# serving: micro-batching load test
+# ---------------------------
+def bench_serving(model, clients, per_client, windows):
+    """
+    In-process load test of POST /predict: `clients` concurrent callers each
+    send `per_client` requests, once per batching window (0 = no batching).
+    """
+    import asyncio
+    import httpx
+    import app_api
+    from batching import MicroBatcher
+
+    rng = np.random.default_rng(0)
+    payloads = [{"features": [float(v) for v in rng.gamma(0.3, 0.003, 9)] + [float(rng.normal(20, 5))],
+                 "model_type": model} for _ in range(256)]
+
+    async def one_client(client, latencies):
+        for i in range(per_client):
+            t0 = time.perf_counter()
+            r = await client.post("/predict", json=payloads[i % len(payloads)])
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app_api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/predict", json=payloads[0])  # load the model outside the timing
+            latencies = []
+            t0 = time.perf_counter()
+            await asyncio.gather(*[one_client(client, latencies) for _ in range(clients)])
+            return time.perf_counter() - t0, np.array(latencies)
+
+    print(f"model={model} clients={clients} requests={clients * per_client}")
+    print(f"{'window ms':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'batches':>8} {'mean rows':>10}")
+    for window in windows:
+        app_api.dispatcher = MicroBatcher(lambda m: app_api.loaded_models[m], window_ms=window)
+        wall, lat = asyncio.run(run())
+        m = app_api.dispatcher.metrics()
+        print(f"{window:>9} {clients * per_client / wall:>8.0f} {np.percentile(lat, 50) * 1000:>8.2f} "
+              f"{np.percentile(lat, 99) * 1000:>8.2f} {m['batches']:>8} {m['mean_batch_rows']:>10}")
+
+
+# ---------------------------
+# Pipeline weather fetching
+# ---------------------------
+def fake_weather_server(delay):
+    """Local stand-in for OpenWeather /weather answering after `delay` seconds; returns (server, url)."""
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True   # headers and body go out in separate writes
+
+        def do_GET(self):
+            time.sleep(delay)
+            body = json.dumps({"name": "Fake", "main": {"temp": 20.0}, "weather": [{"description": "clear"}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def bench_weather(points, latency_ms, concurrency, rate, baseline_points):
+    """
+    Wall-clock per 1,000 grid points: the old loop (one blocking request per
+    point plus a 0.2 s sleep, timed on `baseline_points` and scaled) against
+    weather_fetch at each concurrency, with the limiter at `rate` calls/min.
+    """
+    import requests
+    import weather_fetch
+
+    server, url = fake_weather_server(latency_ms / 1000.0)
+    grid = [(35.0 + (i // 60) * 0.01, 32.2 + (i % 60) * 0.04) for i in range(points)]
+    try:
+        t0 = time.perf_counter()
+        for lat, lon in grid[:baseline_points]:
+            requests.get(f"{url}/weather?lat={lat}&lon={lon}&appid=k&units=metric", timeout=10).json()
+            time.sleep(0.2)
+        baseline = (time.perf_counter() - t0) / baseline_points * 1000
+
+        print(f"points={points} latency={latency_ms}ms limiter={rate:.0f}/min "
+              f"(quota floor {1000 / rate * 60:.1f} s per 1k)")
+        print(f"{'mode':>16} {'s per 1k':>10} {'speedup':>8} {'retries':>8}")
+        print(f"{'sequential+sleep':>16} {baseline:>10.2f} {1.0:>8.1f} {'-':>8}")
+        for c in concurrency:
+            stats = {}
+            t0 = time.perf_counter()
+            weather_fetch.fetch_grid(grid, base_url=url, api_key="k", concurrency=c, rate_per_minute=rate,
+                                     burst=c, stats=stats)
+            per_k = (time.perf_counter() - t0) / points * 1000
+            print(f"{'async c=' + str(c):>16} {per_k:>10.2f} {baseline / per_k:>8.1f} {stats['retries']:>8}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline benchmarks")
+    sub = parser.add_subparsers(dest="suite", required=True)
+
+    p = sub.add_parser("features", help="prepare_features: per-cell loop vs vectorized engine")
+    p.add_argument("--cells", type=int, nargs="+", default=[100, 400, 1600])
+    p.add_argument("--days", type=int, nargs="+", default=[365, 730])
+
+    p = sub.add_parser("aggregate", help="aggregate_era5: hourly CSV route vs direct NetCDF reduction")
+    p.add_argument("--mode", choices=["csv", "netcdf"], required=True)
+    p.add_argument("--months", type=int, default=12)
+    p.add_argument("--lat", type=int, default=23)
+    p.add_argument("--lon", type=int, default=37)
+
+    p = sub.add_parser("threshold", help="create_labels: exact quantile vs merged streaming sketch")
+    p.add_argument("--rows", type=int, default=20_000_000)
+    p.add_argument("--partitions", type=int, default=24)
+
+    p = sub.add_parser("trees", help="tree_engine: sklearn/xgboost predict vs flattened NumPy trees")
+    p.add_argument("--batches", type=int, nargs="+", default=[1, 100, 10_000])
+
+    p = sub.add_parser("serving", help="app_api /predict load test with and without micro-batching")
+    p.add_argument("--model", default="xgb")
+    p.add_argument("--clients", type=int, default=64)
+    p.add_argument("--requests", type=int, default=20, help="Requests per client")
+    p.add_argument("--windows", type=float, nargs="+", default=[0, 2, 5])
+
+    p = sub.add_parser("weather", help="hourly pipeline: sequential weather loop vs concurrent rate-limited fetch")
+    p.add_argument("--points", type=int, default=1000)
+    p.add_argument("--latency-ms", type=float, default=50)
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    p.add_argument("--rate", type=float, default=60_000, help="Limiter calls per minute")
+    p.add_argument("--baseline-points", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.suite == "features":
+        bench_features(args.cells, args.days)
+    elif args.suite == "aggregate":
+        bench_aggregate(args.months, args.lat, args.lon, args.mode)
+    elif args.suite == "threshold":
+        bench_threshold(args.rows, args.partitions)
+    elif args.suite == "trees":
+        bench_trees(args.batches)
+    elif args.suite == "serving":
+        bench_serving(args.model, args.clients, args.requests, args.windows)
+    elif args.suite == "weather":
+        bench_weather(args.points, args.latency_ms, args.concurrency, args.rate, args.baseline_points)
@@ -1,33 +1,179 @@
 # create_labels.py
+import os
+import sys
+import argparse
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import era5_store
+from quantile_sketch import QuantileSketch, ALL
 
 IN = "../data/era5_daily.csv"
 OUT = "../data/era5_labeled.csv"
+QUANTILE = 0.95
+CELL_COLS = ["latitude", "longitude"]
+CHUNK_ROWS = 1_000_000  # CSV rows per streaming chunk
+
+# global: one threshold; cell: per grid cell climatology; month: per calendar month
+THRESHOLD_MODES = ["global", "cell", "month"]
+
+
+def create_labels(in_path=IN, out_path=OUT, threshold=None):
+    print("Loading daily ERA5...")
+    df = pd.read_csv(in_path, parse_dates=["date"])
+
+    # Make sure columns exist
+    # columns: date, latitude, longitude, tp, t2m, ...
+    print("Columns:", df.columns.tolist())
+
+    # Use overall 95th percentile of daily rainfall as flood threshold (can be tuned)
+    if threshold is None:
+        threshold = df["tp"].quantile(QUANTILE)
+        print("Flood threshold (95th percentile) = {:.3f} mm".format(threshold))
+    else:
+        print("Flood threshold (fixed) = {:.3f} mm".format(threshold))
+
+    # Sort and compute next-day rainfall target and flood label
+    df = df.sort_values(["latitude", "longitude", "date"]).reset_index(drop=True)
+
+    # shift tp by -1 per location to get next-day rainfall
+    df["next_tp"] = df.groupby(["latitude", "longitude"])["tp"].shift(-1)
+
+    # drop rows where next_tp is NaN (end of series)
+    df = df.dropna(subset=["next_tp"]).reset_index(drop=True)
+
+    # binary flood label: next day rainfall above threshold
+    df["flood_label"] = (df["next_tp"] >= threshold).astype(int)
+
+    print("Saving labeled dataset:", out_path)
+    df.to_csv(out_path, index=False)
+    print("Done. Rows:", len(df))
+    return threshold
+
+
+def create_labels_from_cube(cube_dir, out_path=OUT):
+    import era5_cube
+
+    cube = era5_cube.Era5Cube(cube_dir)
+    threshold = era5_cube.flood_threshold(cube, QUANTILE)
+    print("Flood threshold (95th percentile) = {:.3f} mm".format(threshold))
+
+    rows = era5_cube.write_labels(cube, out_path, threshold)
+    print("Done. Rows:", rows)
+
+
+# ---------------------------
+# Streaming labels (bounded memory)
+# ---------------------------
+def threshold_groups(df, mode):
+    """Group key of every row's own day for the chosen threshold mode."""
+    if mode == "cell":
+        return (df["latitude"].astype(str) + "," + df["longitude"].astype(str)).to_numpy()
+    if mode == "month":
+        return pd.to_datetime(df["date"]).dt.month.to_numpy()
+    return None
+
+
+def sketch_chunk(df, mode="global"):
+    return QuantileSketch().add(df["tp"].to_numpy(), threshold_groups(df, mode))
+
+
+def sketch_partition_dir(part_dir, mode):
+    return sketch_chunk(era5_store.read_partition(part_dir, columns=["date", "latitude", "longitude", "tp"]), mode)
+
+
+def build_threshold_sketch(in_path, mode="global", workers=1, chunksize=CHUNK_ROWS):
+    """
+    One pass over the data: sketch each partition (or CSV chunk)
+    independently, then merge. With workers > 1 the partitions of a store
+    are sketched in parallel.
+    """
+    sketch = QuantileSketch()
+    columns = ["date", "latitude", "longitude", "tp"]
+    if workers > 1 and era5_store.is_store(in_path):
+        dirs = [d for _, _, d in era5_store.list_partitions(in_path)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(sketch_partition_dir, dirs, [mode] * len(dirs))
+            for part in parts:
+                sketch.merge(part)
+    else:
+        for chunk in era5_store.iter_chunks(in_path, columns=columns, chunksize=chunksize):
+            sketch.merge(sketch_chunk(chunk, mode))
+    return sketch
+
+
+def lookup_thresholds(df, thresholds, mode):
+    """Threshold that applies to each row's next day."""
+    if mode == "global":
+        return np.full(len(df), thresholds.loc[ALL])
+    if mode == "cell":
+        keys = threshold_groups(df, "cell")
+    else:
+        keys = (pd.to_datetime(df["date"]) + pd.Timedelta(days=1)).dt.month.to_numpy()
+    return pd.Series(keys).map(thresholds).to_numpy(dtype=float)
+
 
-print("Loading daily ERA5...")
-df = pd.read_csv(IN, parse_dates=["date"])
+def iter_labeled_chunks(in_path, thresholds, mode="global", chunksize=CHUNK_ROWS):
+    """
+    Label date-ordered chunks. The last row of every cell is carried into
+    the next chunk, because its next-day rainfall lives there. Raises
+    ValueError if a chunk starts before the dates already carried, since
+    the next-day targets would silently be wrong.
+    """
+    carry = None
+    for chunk in era5_store.iter_chunks(in_path, chunksize=chunksize):
+        chunk["date"] = pd.to_datetime(chunk["date"])
+        if carry is not None and len(chunk) and chunk["date"].min() < carry["date"].max():
+            raise ValueError(f"{in_path} is not ordered by date: a chunk starts at {chunk['date'].min().date()} "
+                             f"after rows up to {carry['date'].max().date()}")
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        chunk = chunk.sort_values(CELL_COLS + ["date"]).reset_index(drop=True)
+        chunk["next_tp"] = chunk.groupby(CELL_COLS)["tp"].shift(-1)
 
-# Make sure columns exist
-# columns: date, latitude, longitude, tp, t2m, ...
-print("Columns:", df.columns.tolist())
+        last = ~chunk.duplicated(CELL_COLS, keep="last")
+        carry = chunk.loc[last].drop(columns=["next_tp"])
+        done = chunk.loc[~last].dropna(subset=["next_tp"]).reset_index(drop=True)
+        done["flood_label"] = (done["next_tp"] >= lookup_thresholds(done, thresholds, mode)).astype(int)
+        yield done
 
-# Use overall 95th percentile of daily rainfall as flood threshold (can be tuned)
-threshold = df["tp"].quantile(0.95)
-print("Flood threshold (95th percentile) = {:.3f} mm".format(threshold))
 
-# Sort and compute next-day rainfall target and flood label
-df = df.sort_values(["latitude", "longitude", "date"]).reset_index(drop=True)
+def create_labels_streaming(in_path=IN, out_path=OUT, mode="global", quantile=QUANTILE, workers=1, chunksize=CHUNK_ROWS):
+    print(f"Sketching daily rainfall ({mode} thresholds)...")
+    sketch = build_threshold_sketch(in_path, mode, workers, chunksize)
+    thresholds = sketch.quantiles(quantile)
+    if mode == "global":
+        print("Flood threshold ({:.0f}th percentile) = {:.3f} mm".format(quantile * 100, thresholds.loc[ALL]))
+    else:
+        print(f"{len(thresholds)} {mode} thresholds, range {thresholds.min():.3f} .. {thresholds.max():.3f} mm")
 
-# shift tp by -1 per location to get next-day rainfall
-df["next_tp"] = df.groupby(["latitude", "longitude"])["tp"].shift(-1)
+    rows = 0
+    for n, df in enumerate(iter_labeled_chunks(in_path, thresholds, mode, chunksize)):
+        df.to_csv(out_path, index=False, mode="w" if n == 0 else "a", header=n == 0)
+        rows += len(df)
+    print("Done. Rows:", rows)
+    return thresholds
 
-# drop rows where next_tp is NaN (end of series)
-df = df.dropna(subset=["next_tp"]).reset_index(drop=True)
 
-# binary flood label: next day rainfall above threshold
-df["flood_label"] = (df["next_tp"] >= threshold).astype(int)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add next-day rainfall targets and flood labels.")
+    parser.add_argument("--input", default=IN)
+    parser.add_argument("--cube", default=None, help="Label from a memory-mapped cube built by era5_cube.py")
+    parser.add_argument("--out", default=OUT)
+    parser.add_argument("--streaming", action="store_true",
+                        help="One bounded-memory pass with a mergeable quantile sketch (CSV or partitioned store)")
+    parser.add_argument("--thresholds", choices=THRESHOLD_MODES, default="global",
+                        help="Threshold per dataset, per grid cell or per calendar month (streaming only)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Fixed flood threshold instead of the 95th percentile (e.g. the frozen one from feature_state.json)")
+    args = parser.parse_args()
 
-print("Saving labeled dataset:", OUT)
-df.to_csv(OUT, index=False)
-print("Done. Rows:", len(df))
+    if args.cube:
+        create_labels_from_cube(args.cube, args.out)
+    elif args.streaming:
+        create_labels_streaming(args.input, args.out, args.thresholds, QUANTILE, args.workers)
+    else:
+        create_labels(args.input, args.out, args.threshold)
@@ -0,0 +1,129 @@
+# distill_hybrid.py
+"""
+Distill the stacking `hybrid` pair into a single compact `hybrid-fast` pair
+(`train_models.py distill`).
+
+The teacher runs XGBoost + MLP + a linear head per task. The student is one
+shallow gradient-boosted model per task, fitted on the teacher's outputs:
+its rainfall prediction for the regressor and its flood probability (soft
+labels, binary:logistic) for the classifier. Both students reuse the
+teacher's scaler, so they are drop-in replacements behind the API.
+
+Fidelity (student vs teacher on held-out days) and single-row / batch
+latency of both are written to distillation_report.json and into the
+bundle metadata.
+"""
+import os
+import sys
+import time
+import numpy as np
+import xgboost as xgb
+from sklearn.compose import TransformedTargetRegressor
+from sklearn.metrics import roc_auc_score
+from sklearn.preprocessing import StandardScaler
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import inference
+from stream_training import to_sklearn
+
+STUDENT = "hybrid-fast"
+DISTILL_REPORT = "distillation_report.json"
+STUDENT_PARAMS = {"max_depth": 5, "learning_rate": 0.1, "subsample": 1.0, "random_state": 42}
+STUDENT_ROUNDS = 200
+# Jittered copies of the training rows (scaled space) widen the transfer set,
+# so the student also matches the teacher between and around observed rows.
+AUGMENT_COPIES = 3
+AUGMENT_NOISE = 0.3
+
+def teacher_outputs(reg, clf, X):
+    return reg.predict(X), clf.predict_proba(X)[:, 1]
+
+
+def transfer_set(X, copies=AUGMENT_COPIES, noise=AUGMENT_NOISE, seed=42):
+    X = np.asarray(X, dtype=float)
+    rng = np.random.default_rng(seed)
+    return np.vstack([X] + [X + rng.normal(0, noise, X.shape) for _ in range(copies)])
+
+
+def fit_students(X, t_reg, t_prob, params=None, rounds=STUDENT_ROUNDS):
+    """One booster per task, trained on the teacher's outputs instead of the true targets."""
+    params = {**STUDENT_PARAMS, **(params or {})}
+    # Rainfall is in metres (~1e-3): raw gradients are so small that no split
+    # clears XGBoost's minimum gain, so the student learns a standardised target.
+    reg = TransformedTargetRegressor(
+        regressor=xgb.XGBRegressor(n_estimators=rounds, n_jobs=1, **params), transformer=StandardScaler()
+    ).fit(X, t_reg)
+
+    # XGBClassifier.fit only takes hard labels; the native API accepts probabilities
+    native = {"objective": "binary:logistic", "max_depth": params["max_depth"], "eta": params["learning_rate"],
+              "subsample": params["subsample"], "seed": params["random_state"], "nthread": 1}
+    clf = xgb.train(native, xgb.DMatrix(X, label=t_prob), num_boost_round=rounds)
+    return reg, to_sklearn(clf, "classification")
+
+
+def fidelity(t_reg, t_prob, s_reg, s_prob, y_clf=None):
+    report = {
+        "rainfall_rmse_vs_teacher": float(np.sqrt(np.mean((s_reg - t_reg) ** 2))),
+        "rainfall_r2_vs_teacher": float(1 - np.sum((s_reg - t_reg) ** 2) / max(np.sum((t_reg - t_reg.mean()) ** 2), 1e-12)),
+        "probability_mae_vs_teacher": float(np.mean(np.abs(s_prob - t_prob))),
+        "risk_band_agreement": float(np.mean(inference.risk_levels(s_prob) == inference.risk_levels(t_prob))),
+        "rows": int(len(t_reg)),
+    }
+    if y_clf is not None and len(np.unique(y_clf)) == 2:
+        report["teacher_auc"] = float(roc_auc_score(y_clf, t_prob))
+        report["student_auc"] = float(roc_auc_score(y_clf, s_prob))
+    return report
+
+
+def latency(reg, clf, X, single_calls=200):
+    """Median ms for one single-row predict of both tasks, and ms per 1k rows in one batch."""
+    X = np.asarray(X, dtype=float)
+    times = []
+    for i in range(min(single_calls, len(X))):
+        row = X[i:i + 1]
+        t0 = time.perf_counter()
+        reg.predict(row)
+        clf.predict_proba(row)
+        times.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    reg.predict(X)
+    clf.predict_proba(X)
+    batch_s = time.perf_counter() - t0
+    return {
+        "single_row_ms": round(float(np.median(times)) * 1000, 4),
+        "batch_ms_per_1k_rows": round(batch_s * 1000 / len(X) * 1000, 4),
+        "batch_rows": int(len(X)),
+    }
+
+
+def distill(teacher_reg, teacher_clf, X_train, X_test, y_clf_test=None, params=None, rounds=STUDENT_ROUNDS):
+    """
+    Fit the student pair on the teacher's outputs for (augmented) X_train
+    and compare both on X_test. Returns (student_reg, student_clf, report).
+    """
+    X_transfer = transfer_set(X_train)
+    t_reg, t_prob = teacher_outputs(teacher_reg, teacher_clf, X_transfer)
+    t0 = time.perf_counter()
+    s_reg, s_clf = fit_students(X_transfer, t_reg, t_prob, params, rounds)
+    fit_s = time.perf_counter() - t0
+
+    t_reg_test, t_prob_test = teacher_outputs(teacher_reg, teacher_clf, X_test)
+    s_reg_test, s_prob_test = teacher_outputs(s_reg, s_clf, X_test)
+
+    teacher_lat = latency(teacher_reg, teacher_clf, X_test)
+    student_lat = latency(s_reg, s_clf, X_test)
+    report = {
+        "teacher": "hybrid",
+        "student": STUDENT,
+        "student_params": {**STUDENT_PARAMS, **(params or {}), "rounds": rounds},
+        "transfer_rows": int(len(X_transfer)),
+        "fit_seconds": round(fit_s, 3),
+        "fidelity": fidelity(t_reg_test, t_prob_test, s_reg_test, s_prob_test, y_clf_test),
+        "latency": {
+            "teacher": teacher_lat,
+            "student": student_lat,
+            "single_row_speedup": round(teacher_lat["single_row_ms"] / max(student_lat["single_row_ms"], 1e-9), 2),
+        },
+    }
+    return s_reg, s_clf, report
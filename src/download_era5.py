@@ -1,12 +1,15 @@
-import cdsapi
 import os
+import json
 import time
+import hashlib
+import zipfile
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 
-# Create output directory
-os.makedirs("../data", exist_ok=True)
-
-# CDS API client
-c = cdsapi.Client()
+OUT_DIR = "../data"
+MANIFEST_FILE = "era5_manifest.json"
 
 # TRNC / North Cyprus bounding box
 area = [36.7, 32.2, 34.5, 35.8]  # North/West/South/East
@@ -15,46 +18,190 @@ area = [36.7, 32.2, 34.5, 35.8]  # North/West/South/East
 years = ["2023", "2024"]     # You may edit this
 months = [f"{m:02d}" for m in range(1, 13)]  # 01–12
 
-def download_month(year, month):
-    filename = f"../data/era5_{year}_{month}.nc"
+WORKERS = 3          # CDS queues requests per user, a few in flight is enough
+MAX_RETRIES = 5
+BASE_DELAY = 15      # seconds, doubled after every failed attempt
+MAX_DELAY = 600
+
+# classic / 64-bit offset / CDF-5 NetCDF, and NetCDF-4 (HDF5)
+NETCDF_MAGIC = (b"CDF\x01", b"CDF\x02", b"CDF\x05", b"\x89HDF\r\n\x1a\n")
+ZIP_MAGIC = b"PK\x03\x04"   # CDS sometimes packs the NetCDF in a zip (see extract_real_nc.py)
+
 
-    # Skip already downloaded files
-    if os.path.exists(filename):
-        print(f"Already exists: {filename}")
-        return
+def build_request(year, month):
+    return {
+        "format": "netcdf",
+        "variable": [
+            "total_precipitation",
+            "soil_moisture_level_1",
+            "2m_temperature",
+        ],
+        "year": year,
+        "month": month,
+        "day": [f"{d:02d}" for d in range(1, 32)],
+        "time": [f"{h:02d}:00" for h in range(24)],
+        "area": area,
+    }
 
-    print(f"\n=== Downloading {year}-{month} ===")
 
+def file_sha256(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def is_readable_download(path):
+    """True if `path` is a whole NetCDF file (or zip of them) rather than a truncated or foreign one."""
+    with open(path, "rb") as f:
+        head = f.read(8)
+    if head.startswith(ZIP_MAGIC):
+        try:
+            with zipfile.ZipFile(path) as z:
+                return z.testzip() is None
+        except (zipfile.BadZipFile, OSError):
+            return False
+    if not head.startswith(NETCDF_MAGIC):
+        return False
+    import xarray as xr
     try:
-        c.retrieve(
-            "reanalysis-era5-land",
-            {
-                "format": "netcdf",
-                "variable": [
-                    "total_precipitation",
-                    "soil_moisture_level_1",
-                    "2m_temperature",
-                ],
-                "year": year,
-                "month": month,
-                "day": [f"{d:02d}" for d in range(1, 32)],
-                "time": [f"{h:02d}:00" for h in range(24)],
-                "area": area,
-            },
-            filename
-        )
-        print(f"Completed: {filename}")
-
-    except Exception as e:
-        print(f"Error downloading {year}-{month}: {e}")
-        print("Retrying in 15 seconds...")
-        time.sleep(15)
-        download_month(year, month)  # retry automatically
-
-
-# Main download loop
-for year in years:
-    for month in months:
-        download_month(year, month)
-
-print("\n All downloads finished!")
+        with xr.open_dataset(path) as ds:
+            ds.load()
+        return True
+    except Exception:
+        return False
+
+
+class Manifest:
+    """
+    JSON record of completed months: {"2023-01": {"file", "size", "sha256", ...}}.
+    A month only counts as done when its file still matches the recorded
+    size and checksum, so truncated or edited files are fetched again.
+    Files downloaded before there was a manifest are adopted if they still
+    open as NetCDF (entries marked "adopted").
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+
+    def is_complete(self, key, filename):
+        entry = self.entries.get(key)
+        if not entry or not os.path.exists(filename):
+            return False
+        if os.path.getsize(filename) != entry["size"]:
+            return False
+        return file_sha256(filename) == entry["sha256"]
+
+    def should_adopt(self, key, filename):
+        """True for a finished, readable file (not .part) the manifest has no entry for."""
+        if key in self.entries or not os.path.exists(filename):
+            return False
+        if not is_readable_download(filename):
+            print(f"[WARN] {filename} is not a readable NetCDF file, fetching it again")
+            return False
+        return True
+
+    def record(self, key, filename, adopted=False):
+        # an adopted file was downloaded when it was last written
+        when = datetime.fromtimestamp(os.path.getmtime(filename), timezone.utc) if adopted else datetime.now(timezone.utc)
+        entry = {
+            "file": os.path.basename(filename),
+            "size": os.path.getsize(filename),
+            "sha256": file_sha256(filename),
+            "downloaded_at": when.isoformat(),
+        }
+        if adopted:
+            entry["adopted"] = True
+        with self.lock:
+            self.entries[key] = entry
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+        return entry
+
+
+def download_month(client, year, month, out_dir=OUT_DIR, manifest=None,
+                   max_retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY, sleep=time.sleep):
+    filename = os.path.join(out_dir, f"era5_{year}_{month}.nc")
+    key = f"{year}-{month}"
+
+    # Skip months that are already downloaded and verified
+    if manifest is not None and manifest.is_complete(key, filename):
+        print(f"Already complete: {filename}")
+        return "skipped"
+    # Months downloaded before the manifest existed: record them instead of fetching them again
+    if manifest is not None and manifest.should_adopt(key, filename):
+        manifest.record(key, filename, adopted=True)
+        print(f"Adopted existing file: {filename}")
+        return "adopted"
+
+    part = filename + ".part"
+    for attempt in range(max_retries + 1):
+        print(f"\n=== Downloading {year}-{month} (attempt {attempt + 1}) ===")
+        try:
+            client.retrieve("reanalysis-era5-land", build_request(year, month), part)
+            # Only a finished transfer replaces the real file
+            os.replace(part, filename)
+            if manifest is not None:
+                manifest.record(key, filename)
+            print(f"Completed: {filename}")
+            return "downloaded"
+        except Exception as e:
+            if os.path.exists(part):
+                os.remove(part)
+            if attempt == max_retries:
+                print(f"Error downloading {year}-{month}: {e}. Giving up after {max_retries + 1} attempts.")
+                return "failed"
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            print(f"Error downloading {year}-{month}: {e}")
+            print(f"Retrying in {delay} seconds...")
+            sleep(delay)
+
+
+def download_all(client=None, years=years, months=months, out_dir=OUT_DIR, workers=WORKERS, **retry_kwargs):
+    """
+    Download every (year, month) with at most `workers` requests in flight.
+    Re-running resumes: months in the manifest with a matching file are skipped,
+    and files from before the manifest existed are adopted into it.
+    Returns {"YYYY-MM": "downloaded" | "skipped" | "adopted" | "failed"}.
+    """
+    if client is None:
+        import cdsapi
+        client = cdsapi.Client()
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(out_dir, MANIFEST_FILE))
+    jobs = [(y, m) for y in years for m in months]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            f"{y}-{m}": pool.submit(download_month, client, y, m, out_dir, manifest, **retry_kwargs)
+            for y, m in jobs
+        }
+        results = {key: fut.result() for key, fut in futures.items()}
+
+    failed = [k for k, v in results.items() if v == "failed"]
+    print(f"\n Downloads finished: {len(results) - len(failed)}/{len(results)} months complete")
+    if failed:
+        print(f"[WARN] Failed months (re-run to resume): {', '.join(failed)}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download ERA5-Land months for North Cyprus from the CDS.")
+    parser.add_argument("--years", nargs="+", default=years)
+    parser.add_argument("--months", nargs="+", default=months)
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES)
+    args = parser.parse_args()
+
+    download_all(years=args.years, months=[f"{int(m):02d}" for m in args.months],
+                 out_dir=args.out_dir, workers=args.workers, max_retries=args.retries)
@@ -0,0 +1,242 @@
+# era5_cube.py
+"""
+Dense, memory-mapped (day, lat, lon) cube of daily ERA5 values.
+
+    <cube>/meta.json        shape, dtype, variables, first day
+    <cube>/coords.npz       lats (ascending), lons (ascending)
+    <cube>/<var>.dat        raw np.memmap, C order, shape (n_days, n_lat, n_lon)
+
+The day axis is a continuous calendar, so "k days ago" is always index t-k:
+lags, rolling windows and next-day targets are strided slices instead of
+sort + groupby over a long-format table. Missing cell-days are NaN.
+"""
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import era5_store
+from quantile_sketch import ALL, QuantileSketch
+from prepare_features import SEQ_DAYS, FEATURE_COLS, OUT_COLS, WINDOWS, RollingWindow
+
+CUBE_DIR = "../data/era5_cube"
+VARIABLES = ["tp", "t2m"]
+BAND_ROWS = 8  # latitude rows processed together when streaming out of the cube
+
+
+class Era5Cube:
+    def __init__(self, path, mode="r"):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        coords = np.load(os.path.join(path, "coords.npz"))
+        self.lats = coords["lats"]
+        self.lons = coords["lons"]
+        self.start = np.datetime64(self.meta["start"], "D")
+        self.shape = tuple(self.meta["shape"])
+        self.dates = self.start + np.arange(self.shape[0])
+        self.variables = {
+            v: np.memmap(os.path.join(path, f"{v}.dat"), dtype=self.meta["dtype"], mode=mode, shape=self.shape)
+            for v in self.meta["variables"]
+        }
+
+    def __getitem__(self, var):
+        return self.variables[var]
+
+    def day_index(self, date):
+        return int((np.datetime64(date, "D") - self.start).astype(int))
+
+    def flush(self):
+        for arr in self.variables.values():
+            arr.flush()
+
+
+def build_cube(daily_path, cube_dir=CUBE_DIR, variables=VARIABLES, dtype="float32"):
+    """
+    Build the cube from a daily long-format table (era5_daily.csv or store).
+    Two chunked passes: the first collects the coordinate vectors, the
+    second scatters values into the memmaps. Neither holds the full table.
+    """
+    columns = ["date", "latitude", "longitude"] + list(variables)
+
+    dates, lats, lons = set(), set(), set()
+    for chunk in era5_store.iter_chunks(daily_path, columns=columns):
+        dates.update(pd.to_datetime(chunk["date"]).values.astype("datetime64[D]").tolist())
+        lats.update(chunk["latitude"].unique().tolist())
+        lons.update(chunk["longitude"].unique().tolist())
+    if not dates:
+        raise ValueError(f"No daily rows found in {daily_path}")
+
+    start, end = min(dates), max(dates)
+    lat_vec = np.array(sorted(lats))
+    lon_vec = np.array(sorted(lons))
+    n_days = (end - start).days + 1
+    shape = (n_days, len(lat_vec), len(lon_vec))
+
+    os.makedirs(cube_dir, exist_ok=True)
+    np.savez(os.path.join(cube_dir, "coords.npz"), lats=lat_vec, lons=lon_vec)
+    with open(os.path.join(cube_dir, "meta.json"), "w") as f:
+        json.dump({"start": str(start), "shape": shape, "dtype": dtype, "variables": list(variables)}, f, indent=2)
+    for v in variables:
+        arr = np.memmap(os.path.join(cube_dir, f"{v}.dat"), dtype=dtype, mode="w+", shape=shape)
+        arr[:] = np.nan
+        arr.flush()
+        del arr
+
+    cube = Era5Cube(cube_dir, mode="r+")
+    start64 = np.datetime64(start, "D")
+    for chunk in era5_store.iter_chunks(daily_path, columns=columns):
+        t = (pd.to_datetime(chunk["date"]).values.astype("datetime64[D]") - start64).astype(np.int64)
+        i = np.searchsorted(lat_vec, chunk["latitude"].to_numpy())
+        j = np.searchsorted(lon_vec, chunk["longitude"].to_numpy())
+        for v in variables:
+            cube[v][t, i, j] = chunk[v].to_numpy()
+    cube.flush()
+
+    print(f"Cube saved to {cube_dir}: {n_days} days x {len(lat_vec)} lats x {len(lon_vec)} lons")
+    return Era5Cube(cube_dir)
+
+
+def observed_bands(cube, var="tp", band_rows=BAND_ROWS):
+    """Non-NaN values of `var`, one latitude band at a time."""
+    arr = cube[var]
+    for r in range(0, arr.shape[1], band_rows):
+        band = np.asarray(arr[:, r:r + band_rows], dtype=float)
+        yield band[~np.isnan(band)]
+
+
+def flood_threshold(cube, quantile=0.95):
+    """
+    Exact quantile (numpy/pandas linear rule) of daily rainfall over every
+    observed cell-day, in two streaming passes over the bands: a
+    QuantileSketch finds the buckets holding the two ranks to interpolate
+    between, then only the distinct values inside those buckets are
+    counted. The column is never loaded as a whole.
+    """
+    sketch = QuantileSketch()
+    for values in observed_bands(cube):
+        sketch.add(values)
+    n = sketch.count()
+    if n == 0:
+        raise ValueError("No observed tp values in the cube")
+
+    h = quantile * (n - 1)
+    lo, hi = int(np.floor(h)), int(np.ceil(h))
+    counts = sketch.counts.loc[ALL].sort_index()
+    cum = counts.to_numpy().cumsum()
+    first, last = np.searchsorted(cum, [lo, hi], side="right")
+    k_lo, k_hi = counts.index[first], counts.index[last]
+    below = int(cum[first] - counts.iloc[first])
+
+    selected = {}
+    for values in observed_bands(cube):
+        keys = sketch.buckets(values)
+        inside = values[(keys >= k_lo) & (keys <= k_hi)]
+        for value, count in zip(*np.unique(inside, return_counts=True)):
+            selected[value] = selected.get(value, 0) + int(count)
+
+    distinct = np.array(sorted(selected))
+    ends = np.cumsum([selected[v] for v in distinct])
+    v_lo = distinct[np.searchsorted(ends, lo - below, side="right")]
+    v_hi = distinct[np.searchsorted(ends, hi - below, side="right")]
+    return float(v_lo + (h - lo) * (v_hi - v_lo))
+
+
+def band_frame(dates, lats, lons, columns):
+    """Flatten {col: (days, band_lats, lons)} arrays to long format in (lat, lon, date) order."""
+    n_days, n_lat, n_lon = next(iter(columns.values())).shape
+    lat_idx, lon_idx, day_idx = np.meshgrid(np.arange(n_lat), np.arange(n_lon), np.arange(n_days), indexing="ij")
+    df = pd.DataFrame({
+        "date": pd.to_datetime(dates[day_idx.ravel()]),
+        "latitude": lats[lat_idx.ravel()],
+        "longitude": lons[lon_idx.ravel()],
+    })
+    for name, arr in columns.items():
+        df[name] = np.transpose(arr, (1, 2, 0)).ravel()
+    return df
+
+
+def iter_labeled_bands(cube, threshold, band_rows=BAND_ROWS):
+    """Yield era5_labeled-style frames (date, lat, lon, tp, t2m, next_tp, flood_label) per latitude band."""
+    for r in range(0, cube.shape[1], band_rows):
+        rows = slice(r, r + band_rows)
+        tp = np.asarray(cube["tp"][:, rows], dtype=float)
+        t2m = np.asarray(cube["t2m"][:, rows], dtype=float)
+        next_tp = np.full_like(tp, np.nan)
+        next_tp[:-1] = tp[1:]
+
+        df = band_frame(cube.dates, cube.lats[rows], cube.lons, {"tp": tp, "t2m": t2m, "next_tp": next_tp})
+        df = df.dropna(subset=["tp", "next_tp"]).reset_index(drop=True)
+        df["flood_label"] = (df["next_tp"] >= threshold).astype(int)
+        yield df
+
+
+def band_windows(columns, n_days):
+    """
+    Rolling window columns over days 0..n_days-1 of a band, run through
+    prepare_features.RollingWindow so they match the table path bit for bit.
+    """
+    out = {}
+    for name, (col, window, how) in WINDOWS.items():
+        values = columns[col][:n_days]
+        cells = np.arange(values[0].size)
+        roller = RollingWindow(cells.size, window, how)
+        res = np.empty(values.shape)
+        empty = np.full(cells.size, np.nan)
+        for day in range(n_days):
+            dropped = values[day - window].ravel() if day >= window else empty
+            res[day] = roller.push(values[day].ravel(), dropped, cells).reshape(values.shape[1:])
+        out[name] = res
+    return out
+
+
+def iter_feature_bands(cube, threshold, band_rows=BAND_ROWS):
+    """Yield features_for_ml rows per latitude band, computed with strided day-axis slices."""
+    for r in range(0, cube.shape[1], band_rows):
+        rows = slice(r, r + band_rows)
+        tp = np.asarray(cube["tp"][:, rows], dtype=float)
+        t2m = np.asarray(cube["t2m"][:, rows], dtype=float)
+        n_days = tp.shape[0]
+        if n_days <= SEQ_DAYS + 1:
+            continue
+
+        # output days t = SEQ_DAYS .. n_days-2 (need 7 lags behind and a next day ahead)
+        t = slice(SEQ_DAYS, n_days - 1)
+        lags = [tp[SEQ_DAYS - lag:n_days - 1 - lag] for lag in range(1, SEQ_DAYS + 1)]
+        cols = {f"tp_lag{lag}": arr for lag, arr in enumerate(lags, start=1)}
+        for name, arr in band_windows({"tp": tp, "t2m": t2m}, n_days - 1).items():
+            cols[name] = arr[t]
+        cols["next_tp"] = tp[SEQ_DAYS + 1:]
+
+        df = band_frame(cube.dates[t], cube.lats[rows], cube.lons, cols)
+        df = df.dropna(subset=FEATURE_COLS + ["next_tp"]).reset_index(drop=True)
+        df["flood_label"] = (df["next_tp"] >= threshold).astype(int)
+        yield df[OUT_COLS]
+
+
+def write_bands(bands, out_path):
+    rows = 0
+    for n, df in enumerate(bands):
+        df.to_csv(out_path, index=False, mode="w" if n == 0 else "a", header=n == 0)
+        rows += len(df)
+    return rows
+
+
+def write_labels(cube, out_path, threshold):
+    return write_bands(iter_labeled_bands(cube, threshold), out_path)
+
+
+def write_features(cube, out_path, threshold):
+    return write_bands(iter_feature_bands(cube, threshold), out_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mapped ERA5 daily cube.")
+    parser.add_argument("--input", default="../data/era5_daily.csv", help="era5_daily.csv or a partitioned store")
+    parser.add_argument("--out", default=CUBE_DIR)
+    parser.add_argument("--dtype", default="float32")
+    args = parser.parse_args()
+    build_cube(args.input, args.out, dtype=args.dtype)
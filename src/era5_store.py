@@ -0,0 +1,82 @@
+# era5_store.py
+"""
+Partitioned Parquet store for ERA5 long-format tables.
+
+Layout (Hive style, one folder per calendar month):
+
+    <root>/year=2023/month=01/part-<source>-<n>.parquet
+
+Every offline stage that used to read a single CSV can read the same
+table from a store instead via `read_table()` / `iter_partitions()`.
+"""
+import os
+import glob
+import pandas as pd
+
+TIME_COL = "time"
+
+
+def is_store(path):
+    return os.path.isdir(path)
+
+
+def partition_dir(root, year, month):
+    return os.path.join(root, f"year={int(year):04d}", f"month={int(month):02d}")
+
+
+def write_partitioned(df, root, name, time_col=TIME_COL):
+    """
+    Write `df` into the store, split by the year/month of `time_col`.
+    Files are named after `name` so re-running a conversion overwrites
+    its own parts instead of duplicating rows.
+    """
+    times = pd.to_datetime(df[time_col])
+    written = []
+    for (year, month), part in df.groupby([times.dt.year, times.dt.month], sort=True):
+        out_dir = partition_dir(root, year, month)
+        os.makedirs(out_dir, exist_ok=True)
+        out_path = os.path.join(out_dir, f"part-{name}.parquet")
+        part.to_parquet(out_path, index=False)
+        written.append(out_path)
+    return written
+
+
+def list_partitions(root):
+    """Return [(year, month, dir)] for every month in the store, oldest first."""
+    parts = []
+    for d in glob.glob(os.path.join(root, "year=*", "month=*")):
+        year = int(os.path.basename(os.path.dirname(d)).split("=")[1])
+        month = int(os.path.basename(d).split("=")[1])
+        parts.append((year, month, d))
+    return sorted(parts)
+
+
+def read_partition(part_dir, columns=None):
+    files = sorted(glob.glob(os.path.join(part_dir, "*.parquet")))
+    if not files:
+        return pd.DataFrame(columns=columns)
+    return pd.concat([pd.read_parquet(f, columns=columns) for f in files], ignore_index=True)
+
+
+def iter_partitions(root, columns=None):
+    """Yield one DataFrame per month so callers only hold one month in RAM."""
+    for _, _, part_dir in list_partitions(root):
+        yield read_partition(part_dir, columns=columns)
+
+
+def iter_chunks(path, columns=None, chunksize=1_000_000):
+    """Iterate a CSV in row chunks, or a store one month at a time."""
+    if is_store(path):
+        yield from iter_partitions(path, columns=columns)
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+
+def read_table(path, columns=None, parse_dates=None):
+    """Read a long-format table from either a CSV file or a partitioned store."""
+    if is_store(path):
+        frames = list(iter_partitions(path, columns=columns))
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+    return pd.read_csv(path, usecols=columns, parse_dates=parse_dates)
@@ -0,0 +1,134 @@
+# grid_jobs.py
+"""
+In-process runner for grid refresh jobs behind POST /grid/refresh.
+
+A refresh used to run the hourly pipeline in a subprocess inside the
+request. Now `submit(model)` returns a Job at once and the run happens on a
+single background thread:
+
+* a refresh for a model that is already queued or running joins that job
+  instead of starting another one;
+* jobs for different models run one after another, because every run
+  writes the same latest-grid file;
+* `run(model, progress)` is called in-process (the API passes the pipeline
+  with its already loaded models), and `progress(done, total)` feeds the
+  points done / total and the ETA reported by GET /grid/jobs/{id}.
+
+Finished jobs are kept for `history` entries.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+def utc(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else None
+
+
+class Job:
+    def __init__(self, model):
+        self.id = uuid.uuid4().hex[:12]
+        self.model = model
+        self.state = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = 0
+        self.total = None
+        self.joined = 0
+        self.result = None
+        self.error = None
+        self.finished = threading.Event()
+
+    @property
+    def active(self):
+        return self.state in (QUEUED, RUNNING)
+
+    def progress(self, done, total):
+        self.done, self.total = done, total
+
+    def eta_seconds(self):
+        if self.state != RUNNING or not self.done or not self.total:
+            return None
+        elapsed = time.time() - self.started_at
+        return round(elapsed / self.done * (self.total - self.done), 1)
+
+    def to_dict(self):
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "model": self.model,
+            "state": self.state,
+            "points_done": self.done,
+            "points_total": self.total,
+            "percent": round(100.0 * self.done / self.total, 1) if self.total else None,
+            "eta_seconds": self.eta_seconds(),
+            "elapsed_seconds": round(end - self.started_at, 1) if self.started_at else None,
+            "joined_requests": self.joined,
+            "created_at": utc(self.created_at),
+            "started_at": utc(self.started_at),
+            "finished_at": utc(self.finished_at),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobRunner:
+    def __init__(self, run, on_success=None, history=50):
+        """`run(model, progress)` does the work; `on_success(job)` runs after a successful job."""
+        self.run = run
+        self.on_success = on_success
+        self.history = history
+        self.jobs = OrderedDict()   # id -> Job, oldest first
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grid-refresh")
+
+    def submit(self, model):
+        """(job, joined): the active job for `model`, or a new queued one."""
+        with self.lock:
+            for job in self.jobs.values():
+                if job.model == model and job.active:
+                    job.joined += 1
+                    return job, True
+            job = Job(model)
+            self.jobs[job.id] = job
+            self.trim()
+        self.executor.submit(self.execute, job)
+        return job, False
+
+    def execute(self, job):
+        job.state, job.started_at = RUNNING, time.time()
+        print(f"[INFO] Grid refresh {job.id} started ({job.model})")
+        try:
+            job.result = self.run(job.model, job.progress)
+            job.state = SUCCEEDED
+            print(f"[OK] Grid refresh {job.id} finished ({job.done}/{job.total} points)")
+        except Exception as e:
+            job.state, job.error = FAILED, str(e) or type(e).__name__
+            print(f"[ERROR] Grid refresh {job.id} failed: {job.error}")
+        else:
+            # the refresh itself succeeded; a failing hook must not turn it into a failed job
+            if self.on_success:
+                try:
+                    self.on_success(job)
+                except Exception as e:
+                    print(f"[WARN] Grid refresh {job.id} on_success hook failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            job.finished.set()
+
+    def trim(self):
+        finished = [j.id for j in self.jobs.values() if not j.active]
+        for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        return [job.to_dict() for job in reversed(list(self.jobs.values()))]
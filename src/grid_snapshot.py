@@ -0,0 +1,354 @@
+# grid_snapshot.py
+"""
+In-memory snapshots behind GET /grid/latest.
+
+The grid file written by the pipeline is parsed once; for every requested
+model the whole grid is scored once and the finished response is encoded
+once. Repeat requests get the cached bytes and a strong ETag, and
+conditional requests with a matching If-None-Match get a 304.
+
+A snapshot is rebuilt when
+  * the grid file changes on disk (path, mtime, size),
+  * the model pair behind it was reloaded by the registry, or
+  * `invalidate()` is called (e.g. after a grid refresh).
+
+If scoring with the model fails, the request gets the file as written
+(model_applied "cached") and nothing is cached under the model. The ETag
+is a digest of the points and the model name, so a rebuild that produces
+the same data keeps its ETag.
+
+Besides the row-per-point JSON the dashboard started with, a snapshot can be
+sent as (`format=` or the Accept header)
+
+    json       application/json                           rows, as written
+    columnar   application/vnd.flood-grid.columnar+json   parallel arrays
+    msgpack    application/msgpack                        the columnar document
+    arrow      application/vnd.apache.arrow.stream        one record batch
+
+and compressed with gzip or brotli (Accept-Encoding). The columnar forms
+drop the per-point `prediction` copy and carry the risk level as a code
+into `risk_labels` / `actions`. Every variant is encoded at most once per
+snapshot and has its own ETag. msgpack and brotli are optional.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import inference
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CACHED = "cached"
+
+COLUMNAR = "application/vnd.flood-grid.columnar+json"
+MSGPACK = "application/msgpack"
+FORMATS = {"json": inference.JSON, "columnar": COLUMNAR, "msgpack": MSGPACK, "arrow": inference.ARROW_STREAM}
+MEDIA_TYPES = {**{v: k for k, v in FORMATS.items()}, "application/x-msgpack": "msgpack"}
+ENCODINGS = ["br", "gzip"]   # preferred first
+
+# restated by risk_code + the legends in the columnar forms
+DERIVED = {"prediction", "flood_risk", "recommended_action"}
+
+
+class UnsupportedFormat(ValueError):
+    """The requested grid format is unknown or its encoder is not installed."""
+
+
+# ---------------------------
+# Encodings
+# ---------------------------
+def available(fmt):
+    return fmt in FORMATS and (fmt != "msgpack" or msgpack is not None)
+
+
+def parse_accept(header):
+    """[(value, q)] from an Accept / Accept-Encoding header, highest q first."""
+    items = []
+    for part in (header or "").split(","):
+        fields = part.split(";")
+        value = fields[0].strip().lower()
+        if not value:
+            continue
+        q = 1.0
+        for field in fields[1:]:
+            name, _, v = field.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        items.append((value, q))
+    return sorted(items, key=lambda item: -item[1])
+
+
+def negotiate_format(fmt, accept):
+    """Format name from the `format` param, else the first acceptable media type, else "json"."""
+    if fmt:
+        fmt = fmt.lower()
+        if not available(fmt):
+            names = ", ".join(f for f in FORMATS if available(f))
+            raise UnsupportedFormat(f"Grid format {fmt!r} is not available; use one of {names}")
+        return fmt
+    for value, q in parse_accept(accept):
+        name = MEDIA_TYPES.get(value)
+        if q > 0 and name and available(name):
+            return name
+    return "json"
+
+
+def negotiate_encoding(accept_encoding):
+    """"br", "gzip" or None (identity), honouring q-values and our preference on ties."""
+    accepted = dict(parse_accept(accept_encoding))
+    candidates = [e for e in ENCODINGS if (e != "br" or brotli is not None)
+                  and accepted.get(e, accepted.get("*", 0)) > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda e: accepted.get(e, accepted.get("*", 0)))
+
+
+def compress(body, encoding):
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    if encoding == "br":
+        return brotli.compress(body, quality=9)
+    return body
+
+
+def risk_code(point):
+    label = point.get("flood_risk")
+    if label in inference.RISK_LABELS:
+        return inference.RISK_LABELS.index(label)
+    prob = point.get("flood_probability")
+    if isinstance(prob, (int, float)):
+        return int(inference.risk_levels(prob))
+    return None
+
+
+def columnar(payload, model_name=None):
+    """The response document with the points as parallel arrays."""
+    points = payload["data"]
+    columns = {
+        "lat": [p.get("lat") for p in points],
+        "lon": [p.get("lon") for p in points],
+        "flood_probability": [p.get("flood_probability") for p in points],
+        "predicted_rainfall_mm": [p.get("predicted_rainfall_mm") for p in points],
+        "risk_code": [risk_code(p) for p in points],
+    }
+    extra = {}
+    for p in points:
+        for k in p:
+            if k not in columns and k not in DERIVED:
+                extra[k] = None
+    for k in extra:
+        columns[k] = [p.get(k) for p in points]
+
+    doc = {k: v for k, v in payload.items() if k != "data"}
+    if model_name:
+        doc["model_name"] = model_name
+    doc["risk_labels"] = inference.RISK_LABELS
+    doc["actions"] = inference.ACTIONS
+    doc["columns"] = columns
+    return doc
+
+
+def to_arrow(doc):
+    import pyarrow as pa
+
+    arrays = {}
+    for name, values in doc["columns"].items():
+        if name == "risk_code":
+            codes = pa.array(values, pa.int8())
+            arrays["flood_risk"] = pa.DictionaryArray.from_arrays(codes, pa.array(inference.RISK_LABELS))
+            continue
+        try:
+            arrays[name] = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # mixed / nested values travel as JSON text
+            arrays[name] = pa.array([None if v is None else json.dumps(v) for v in values], pa.string())
+    meta = {k: v if isinstance(v, str) else json.dumps(v) for k, v in doc.items() if k != "columns"}
+    table = pa.table(arrays).replace_schema_metadata(meta)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class Snapshot:
+    def __init__(self, payload, source, bundle):
+        self.payload = payload
+        self.source = source
+        self.bundle = bundle
+        self.body = json.dumps(payload, separators=(",", ":")).encode()
+        # content digest: the points and the model only, so a rebuild with the same data keeps its ETag
+        content = json.dumps([payload["model_applied"], payload["data"]], separators=(",", ":")).encode()
+        self.digest = hashlib.blake2b(content, digest_size=12).hexdigest()
+        self.etag = f'"{self.digest}"'
+        self.doc = None
+        self.bodies = {}     # (format, encoding) -> (bytes, etag)
+
+    def encode(self, fmt):
+        if fmt == "json":
+            return self.body
+        if self.doc is None:
+            self.doc = columnar(self.payload, self.bundle["metadata"]["name"] if self.bundle else None)
+        if fmt == "columnar":
+            return json.dumps(self.doc, separators=(",", ":")).encode()
+        if fmt == "msgpack":
+            return msgpack.packb(self.doc)
+        return to_arrow(self.doc)
+
+    def variant(self, fmt="json", encoding=None):
+        """(body, etag) of the snapshot in a format / content coding, encoded on first use."""
+        key = (fmt, encoding)
+        cached = self.bodies.get(key)
+        if cached is None:
+            tag = "-".join([self.digest] + [p for p in (fmt if fmt != "json" else None, encoding) if p])
+            cached = self.bodies[key] = (compress(self.encode(fmt), encoding), f'"{tag}"')
+        return cached
+
+    def matches(self, if_none_match, etag=None):
+        """True if an If-None-Match header value names this snapshot (or the given variant tag)."""
+        if not if_none_match:
+            return False
+        etag = etag or self.etag
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+def apply_predictions(data, columns, model_name, indices):
+    rain, prob, levels = columns["predicted_rainfall_mm"], columns["flood_probability"], columns["risk_level"]
+    for j, idx in enumerate(indices):
+        p = data[idx]
+        level = int(levels[j])
+        prediction = {
+            "predicted_rainfall_mm": float(rain[j]),
+            "flood_probability": float(prob[j]),
+            "flood_risk": inference.RISK_LABELS[level],
+            "recommended_action": inference.ACTIONS[level],
+        }
+        p.update(prediction)
+        p["prediction"] = {**prediction, "model_used": model_name}
+
+
+def score_grid(data, bundle):
+    """Re-predict every point with `bundle` in one batch (temperature 0 / missing -> 25C)."""
+    indices, lats, lons, temps = [], [], [], []
+    for i, p in enumerate(data):
+        try:
+            temp = float(p.get("temp_c", 25.0))
+            lats.append(float(p["lat"]))
+            lons.append(float(p["lon"]))
+            temps.append(25.0 if temp == 0 else temp)
+            indices.append(i)
+        except (KeyError, TypeError, ValueError):
+            continue
+    if indices:
+        X, _ = inference.topo_features(lats, lons, temps)
+        apply_predictions(data, inference.score(bundle, X), bundle["metadata"]["name"], indices)
+
+
+class GridSnapshots:
+    def __init__(self, candidates, registry):
+        """`candidates`: grid files in order of preference; `registry`: model type -> bundle."""
+        self.candidates = candidates
+        self.registry = registry
+        self.snapshots = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+        self.parsed = None          # (source signature, data)
+        self.generation = 0
+        self.builds = 0
+        self.failures = 0
+
+    def source(self):
+        """(path, mtime_ns, size, generation) of the grid file in use, or None."""
+        for path in self.candidates:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            return (path, st.st_mtime_ns, st.st_size, self.generation)
+        return None
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.snapshots.clear()
+            self.parsed = None
+
+    def read(self, source):
+        parsed = self.parsed
+        if parsed is None or parsed[0] != source:
+            with open(source[0], "r") as f:
+                parsed = (source, json.load(f))
+            self.parsed = parsed
+        # every snapshot mutates its own copy of the points
+        return json.loads(json.dumps(parsed[1]))
+
+    def get(self, model=None):
+        """The current Snapshot for `model` (None: the file as written), or None without a grid file."""
+        source = self.source()
+        if source is None:
+            return None
+        # unknown model names get the file as written, like no model at all
+        m_type = model.lower() if model and model.lower() in self.registry else None
+        bundle = self.registry[m_type] if m_type else None
+        key = m_type or CACHED
+
+        snap = self.snapshots.get(key)
+        if snap is not None and snap.source == source and snap.bundle is bundle:
+            return snap
+
+        with self.lock:
+            key_lock = self.locks.setdefault(key, threading.Lock())
+        with key_lock:
+            snap = self.snapshots.get(key)
+            if snap is not None and snap.source == source and snap.bundle is bundle:
+                return snap
+            try:
+                snap = self.build(source, key, bundle)
+            except Exception as e:
+                if bundle is None:
+                    raise
+                # nothing is cached under the model, so the next request tries again
+                self.failures += 1
+                print(f"[ERROR] Batch prediction failed: {e}. Falling back to cached values.")
+                return self.get(None)
+            self.snapshots[key] = snap
+            return snap
+
+    def build(self, source, key, bundle):
+        data = self.read(source)
+        if bundle is not None:
+            score_grid(data, bundle)
+        self.builds += 1
+        payload = {
+            "status": "success",
+            "count": len(data),
+            "generated_at_utc": datetime.now(timezone.utc).isoformat(),
+            "data": data,
+            "model_applied": key,
+        }
+        return Snapshot(payload, source, bundle)
+
+    def metrics(self):
+        return {
+            "snapshots": len(self.snapshots),
+            "variants": sum(len(s.bodies) for s in list(self.snapshots.values())),
+            "builds": self.builds,
+            "failed_builds": self.failures,
+            "generation": self.generation,
+            "formats": [f for f in FORMATS if available(f)],
+            "encodings": [e for e in ENCODINGS if e != "br" or brotli is not None],
+        }
@@ -0,0 +1,214 @@
+# grid_stream.py
+"""
+Server-Sent Events for new grid snapshots (GET /grid/stream).
+
+`GridFeed.check()` runs when a refresh job finishes (and on a timer while
+clients are connected, for pipelines run outside the API). If the grid
+changed, it rebuilds the snapshots clients are looking at and publishes
+one "snapshot" event:
+
+    {"digests": {model: digest}, "generated_at_utc": ...,
+     "deltas": {model: {"base": old digest, "digest": new digest,
+                        "changed": [[lat, lon, prob, rainfall, risk_code]],
+                        "removed": [[lat, lon]]}},
+     "risk_labels": [...], "actions": [...]}
+
+A client whose grid has the `base` digest applies the delta; any other
+client (or a model without a delta, e.g. when most points changed)
+re-fetches /grid/latest, which is a 304 if nothing changed for it.
+
+`Broadcaster` fans each event out to every connected client. The frame is
+encoded once, and each client has a bounded queue. A client that falls
+`queue_size` events behind loses its backlog and gets a single "resync"
+event instead, so slow readers never hold memory or slow down the others.
+"""
+import asyncio
+import json
+import threading
+from datetime import datetime, timezone
+
+import grid_snapshot
+import inference
+
+KEEPALIVE = b": keepalive\n\n"
+RESYNC = b"event: resync\ndata: {}\n\n"
+
+
+def sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+# ---------------------------
+# Fan-out
+# ---------------------------
+class Subscriber:
+    def __init__(self, loop, queue_size):
+        self.loop = loop
+        self.queue = asyncio.Queue(queue_size)
+        self.resyncs = 0
+
+    def offer(self, frame):
+        """Queue a frame (on the subscriber's loop); a full queue is replaced by one resync."""
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.resyncs += 1
+            return
+        self.queue.put_nowait(frame)
+
+
+class Broadcaster:
+    def __init__(self, queue_size=8):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.last_id = 0
+        self.counters = {"connections": 0, "published": 0, "delivered": 0, "resyncs": 0}
+
+    def subscribe(self):
+        sub = Subscriber(asyncio.get_running_loop(), self.queue_size)
+        with self.lock:
+            self.subscribers.add(sub)
+        self.counters["connections"] += 1
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers.discard(sub)
+        self.counters["resyncs"] += sub.resyncs
+
+    def publish(self, event, data):
+        """Encode the event once and hand it to every subscriber; safe to call from any thread."""
+        with self.lock:
+            self.last_id += 1
+            frame = sse(event, data, self.last_id)
+            subscribers = list(self.subscribers)
+        self.counters["published"] += 1
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, frame)
+                self.counters["delivered"] += 1
+            except RuntimeError:
+                # the client's loop is gone
+                self.unsubscribe(sub)
+        return frame
+
+    def metrics(self):
+        return {**self.counters, "subscribers": len(self.subscribers), "queue_size": self.queue_size,
+                "queued": sum(s.queue.qsize() for s in list(self.subscribers))}
+
+
+# ---------------------------
+# Deltas
+# ---------------------------
+def point_key(p):
+    return (round(float(p["lat"]), 5), round(float(p["lon"]), 5))
+
+
+def compact(p):
+    return [p.get("lat"), p.get("lon"), p.get("flood_probability"), p.get("predicted_rainfall_mm"),
+            grid_snapshot.risk_code(p)]
+
+
+def differs(a, b, tol=1e-6):
+    if grid_snapshot.risk_code(a) != grid_snapshot.risk_code(b):
+        return True
+    for name in ("flood_probability", "predicted_rainfall_mm"):
+        x, y = a.get(name), b.get(name)
+        if (x is None) != (y is None) or (x is not None and abs(float(x) - float(y)) > tol):
+            return True
+    return False
+
+
+def grid_delta(old, new, max_fraction=0.5):
+    """Points of `new` that are new or changed, and keys gone from `old`; None if that is most of the grid."""
+    before = {}
+    for p in old:
+        try:
+            before[point_key(p)] = p
+        except (KeyError, TypeError, ValueError):
+            continue
+    changed = []
+    for p in new:
+        try:
+            key = point_key(p)
+        except (KeyError, TypeError, ValueError):
+            continue
+        q = before.pop(key, None)
+        if q is None or differs(q, p):
+            changed.append(compact(p))
+    removed = [list(k) for k in before]
+    if len(changed) + len(removed) > max_fraction * max(len(new), 1):
+        return None
+    return {"changed": changed, "removed": removed}
+
+
+# ---------------------------
+# Feed
+# ---------------------------
+class GridFeed:
+    def __init__(self, snapshots, broadcaster, max_fraction=0.5):
+        self.snapshots = snapshots
+        self.broadcaster = broadcaster
+        self.max_fraction = max_fraction
+        self.source = None
+        self.last = {}     # snapshot key -> Snapshot last announced
+        self.lock = threading.Lock()
+
+    def current(self):
+        """Snapshots for the keys clients have asked for, rebuilt if the grid changed."""
+        keys = set(self.last) | set(self.snapshots.snapshots) | {grid_snapshot.CACHED}
+        snaps = {}
+        for key in sorted(keys):
+            snap = self.snapshots.get(None if key == grid_snapshot.CACHED else key)
+            if snap is not None:
+                snaps[key] = snap
+        return snaps
+
+    def check(self):
+        """Publish a "snapshot" event if the grid changed since the last check; returns the event."""
+        with self.lock:
+            source = self.snapshots.source()
+            if source is None or source == self.source:
+                return None
+            snaps = self.current()
+            deltas = {}
+            for key, snap in snaps.items():
+                old = self.last.get(key)
+                if old is None or old.digest == snap.digest:
+                    continue
+                delta = grid_delta(old.payload["data"], snap.payload["data"], self.max_fraction)
+                if delta is not None:
+                    deltas[key] = {"base": old.digest, "digest": snap.digest, **delta}
+            self.source, self.last = source, snaps
+            event = self.describe(snaps)
+            event["deltas"] = deltas
+            self.broadcaster.publish("snapshot", event)
+            return event
+
+    def describe(self, snaps):
+        return {
+            "digests": {key: snap.digest for key, snap in snaps.items()},
+            "generated_at_utc": datetime.now(timezone.utc).isoformat(),
+            "risk_labels": inference.RISK_LABELS,
+            "actions": inference.ACTIONS,
+        }
+
+    def hello(self):
+        """First event of a connection: the digests clients can compare with what they hold."""
+        return sse("hello", self.describe(dict(self.last)), self.broadcaster.last_id)
+
+    async def events(self, sub, is_disconnected, keepalive=15.0):
+        """SSE frames for one client until it disconnects."""
+        yield b"retry: 3000\n\n" + self.hello()
+        while not await is_disconnected():
+            try:
+                frame = await asyncio.wait_for(sub.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                frame = KEEPALIVE
+            yield frame
@@ -177,11 +177,11 @@ def save_predictions(predictions: list[dict]) -> tuple[str, str]:
 
     # Save timestamped (history)
     with open(timestamped_file, "w", encoding="utf-8") as f:
-        json.dump(predictions, f, indent=2)
+        json.dump(predictions, f, separators=(",", ":"))
 
     # Save latest (frontend should read this)
     with open(LATEST_OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(predictions, f, indent=2)
+        json.dump(predictions, f, separators=(",", ":"))
 
     return timestamped_file, LATEST_OUTPUT_FILE
 
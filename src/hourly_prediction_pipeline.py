@@ -1,20 +1,33 @@
 import requests
+import argparse
 import json
-import csv
 import os
-import time
+import sys
 from datetime import datetime
+import numpy as np
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import inference
+import weather_fetch
+from prediction_history import PredictionHistory
+
 load_dotenv()
 
-API_URL = "http://127.0.0.1:8000/predict"
+# Scoring: "local" loads the model bundles from models/ (as the API does) and
+# scores the whole grid in one call; "remote" sends it to the API in one
+# POST /predict/batch (e.g. when the API runs on another host)
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "local")
+API_URL = os.getenv("PREDICT_API_URL", "http://127.0.0.1:8000/predict/batch")
 DEFAULT_MODEL = os.getenv("ML_MODEL", "rf") # Default to RF if not specified
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 
-GRID_FILE = "data/cyprus_grid_points.json"
-OUTPUT_FILE_CSV = "data/hourly_predictions.csv"
-OUTPUT_FILE_JSON = "data/latest_grid_predictions.json"
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+GRID_FILE = os.path.join(BASE_DIR, "data", "cyprus_grid_points.json")
+HISTORY_DB = os.path.join(BASE_DIR, "data", "prediction_history.sqlite")
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "90"))
+OUTPUT_FILE_JSON = os.path.join(BASE_DIR, "data", "latest_grid_predictions.json")
 
 
 # Polygon defining the approximate border of North Cyprus (High Fidelity v4)
@@ -90,16 +103,6 @@ def is_point_in_polygon(lat, lon, polygon):
     return inside
 
 
-def fetch_weather(lat, lon):
-    url = (
-        f"https://api.openweathermap.org/data/2.5/weather"
-        f"?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric"
-    )
-    r = requests.get(url, timeout=10)
-    r.raise_for_status()
-    return r.json()
-
-
 def build_features(weather):
     # Match the 10 features expected by the model
     # [tp_lag1..7, tp_3d_sum, tp_7d_sum, t2m_7d_mean]
@@ -108,107 +111,160 @@ def build_features(weather):
     return [0, 0, 0, 0, 0, 0, 0, 0, 0, temp]
 
 
-def ensure_csv():
-    if not os.path.exists(OUTPUT_FILE_CSV):
-        with open(OUTPUT_FILE_CSV, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "timestamp", "lat", "lon",
-                "predicted_rainfall_mm",
-                "flood_probability",
-                "flood_risk"
-            ])
+# ---------------------------
+# Scoring
+# ---------------------------
+_registry = None
+
+
+def local_registry():
+    global _registry
+    if _registry is None:
+        from model_registry import ModelRegistry
+        _registry = ModelRegistry(MODELS_DIR, backend=os.getenv("INFERENCE_BACKEND", "auto"))
+    return _registry
+
+
+def score_local(X, model, registry=None):
+    """/predict-style results for every row of X, scored in-process in one call."""
+    registry = registry if registry is not None else local_registry()
+    m_type = model.lower()
+    # no fallback: the run summary and the history record the model that was asked for
+    if m_type not in registry:
+        raise RuntimeError(f"No {model} models in {MODELS_DIR}")
+    bundle = registry[m_type]
+    return inference.result_rows(inference.score(bundle, X), bundle["metadata"]["name"])
+
+
+def score_remote(X, model):
+    """/predict-style results for every row of X from one POST /predict/batch to the API."""
+    response = requests.post(
+        API_URL,
+        json={"features": np.asarray(X).tolist(), "model_type": model},
+        timeout=120
+    )
+    response.raise_for_status()
+    body = response.json()
+    columns = {
+        "predicted_rainfall_mm": body["predicted_rainfall_mm"],
+        "flood_probability": body["flood_probability"],
+        "risk_level": [inference.RISK_LABELS.index(r) for r in body["flood_risk"]],
+    }
+    return inference.result_rows(columns, body["model_name"])
 
 
-def run_pipeline():
+def run_pipeline(model=None, score=None, progress=None):
+    """
+    Fetch the weather for every land point of the grid, score all points
+    together, add the run to the prediction history and write the
+    latest-grid JSON.
+
+    `score(X, model)` returns one /predict-style dict per row of the (N, 10)
+    matrix (default: score_local, or score_remote with PIPELINE_MODE=remote);
+    `progress(done, total)` is called as the weather for the land points
+    comes in. Returns a summary of the run; raises RuntimeError (and keeps
+    the previous grid file) if no point could be processed.
+    """
+    model = model or DEFAULT_MODEL
+    score = score or (score_remote if PIPELINE_MODE == "remote" else score_local)
+
     if not os.path.exists(GRID_FILE):
         print(f"❌ Grid file not found: {GRID_FILE}")
-        return
+        raise FileNotFoundError(GRID_FILE)
 
     with open(GRID_FILE, "r") as f:
         grid = json.load(f)
 
-    ensure_csv()
     timestamp = datetime.utcnow().isoformat()
-    
-    predictions = []
 
     print(f"Starting pipeline. Total grid points: {len(grid)}")
-    
-    processed_count = 0
-    skipped_count = 0
 
-    for point in grid:
-        lat, lon = point["lat"], point["lon"]
+    # Filter Ocean/River Points by Polygon
+    land = [p for p in grid if is_point_in_polygon(p["lat"], p["lon"], NORTH_CYPRUS_POLYGON)]
+    total = len(land)
+    skipped_count = len(grid) - total
+    failed_count = 0
+
+    # Weather for all land points: concurrent, within the OpenWeather quota (see weather_fetch.py)
+    fetch_stats = {}
+    weathers = weather_fetch.fetch_grid([(p["lat"], p["lon"]) for p in land], api_key=OPENWEATHER_API_KEY,
+                                        progress=progress, stats=fetch_stats)
+    print(f"[INFO] Weather fetched: {fetch_stats}")
+
+    points, features = [], []
+    for point, weather in zip(land, weathers):
+        if isinstance(weather, Exception):
+            failed_count += 1
+            print(f"[WARN] Failed at {point['lat']},{point['lon']}: {weather}")
+            continue
+        loc_name = weather.get("name", "").lower()
 
-        # Filter Ocean/River Points by Polygon
-        if not is_point_in_polygon(lat, lon, NORTH_CYPRUS_POLYGON):
+        # Simple keyword filter for water bodies
+        if any(w in loc_name for w in ["sea", "ocean", "mediterranean", "bay", "gulf"]):
             skipped_count += 1
             continue
+        points.append((point, weather))
+        features.append(build_features(weather))
+
+    # One model call for the whole grid
+    results = score(np.array(features, dtype=float).reshape(-1, inference.N_FEATURES), model) if features else []
+    print(f"[INFO] Scored {len(results)} points with {model}")
 
-        try:
-            weather = fetch_weather(lat, lon)
-            time.sleep(0.2) # Avoid rate limit
-            loc_name = weather.get("name", "").lower()
-            
-            # Simple keyword filter for water bodies
-            if any(w in loc_name for w in ["sea", "ocean", "mediterranean", "bay", "gulf"]):
-                skipped_count += 1
-                continue
-            features = build_features(weather)
-
-            response = requests.post(
-                API_URL,
-                json={"features": features, "model_type": DEFAULT_MODEL},
-                timeout=10
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            # Add to CSV list
-            with open(OUTPUT_FILE_CSV, "a", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    timestamp,
-                    lat,
-                    lon,
-                    result["predicted_rainfall_mm"],
-                    result["flood_probability"],
-                    result["flood_risk"]
-                ])
-            
-            # Add to JSON list
-            predictions.append({
-                "lat": lat,
-                "lon": lon,
-                "location_name": weather.get("name", f"Loc ({lat:.2f}, {lon:.2f})"), 
-                "weather_summary": weather["weather"][0]["description"] if "weather" in weather else "N/A",
-                "temp_c": weather["main"]["temp"] if "main" in weather else 0,
-                "prediction": result, 
-                "flood_risk": result["flood_risk"], 
-                "flood_probability": result["flood_probability"],
-                "predicted_rainfall_mm": result["predicted_rainfall_mm"],
-                "timestamp": timestamp
-            })
-            processed_count += 1
-            # Rate limiting or print progress every 10
-            if processed_count % 10 == 0:
-                print(f"Processed {processed_count} points...")
-
-        except Exception as e:
-            import traceback
-            print(f"[WARN] Failed at {lat},{lon}: {e}")
-            traceback.print_exc()
-
-    # Save JSON for Frontend
-    with open(OUTPUT_FILE_JSON, "w", newline="") as f:
-        json.dump(predictions, f, indent=2)
+    predictions = []
+    history_rows = []
+    for (point, weather), result in zip(points, results):
+        lat, lon = point["lat"], point["lon"]
+        history_rows.append((lat, lon, result["predicted_rainfall_mm"], result["flood_probability"],
+                             result["flood_risk"]))
+        predictions.append({
+            "lat": lat,
+            "lon": lon,
+            "location_name": weather.get("name", f"Loc ({lat:.2f}, {lon:.2f})"), 
+            "weather_summary": weather["weather"][0]["description"] if "weather" in weather else "N/A",
+            "temp_c": weather["main"]["temp"] if "main" in weather else 0,
+            "prediction": result, 
+            "flood_risk": result["flood_risk"], 
+            "flood_probability": result["flood_probability"],
+            "predicted_rainfall_mm": result["predicted_rainfall_mm"],
+            "timestamp": timestamp
+        })
+    processed_count = len(predictions)
+    if not processed_count:
+        # e.g. a missing or invalid OPENWEATHER_API_KEY: keep the previous grid instead of publishing []
+        raise RuntimeError(f"No grid point could be processed ({failed_count} of {total} weather fetches "
+                           f"failed, {skipped_count} skipped); {OUTPUT_FILE_JSON} left unchanged")
+
+    # One transaction per run in the indexed history; old runs age out
+    history = PredictionHistory(HISTORY_DB)
+    try:
+        history.write_run(timestamp, history_rows, model=model)
+        pruned = history.prune(HISTORY_RETENTION_DAYS)
+    finally:
+        history.close()
+    if pruned:
+        print(f"[INFO] Pruned {pruned} history rows older than {HISTORY_RETENTION_DAYS} days")
+
+    # Save JSON for Frontend; replaced in one step so readers never see a partial file
+    tmp_file = OUTPUT_FILE_JSON + ".tmp"
+    with open(tmp_file, "w", newline="") as f:
+        json.dump(predictions, f, separators=(",", ":"))
+    os.replace(tmp_file, OUTPUT_FILE_JSON)
 
     print(f"[OK] Hourly prediction completed at {timestamp}")
     print(f"   Processed (Land): {processed_count}")
     print(f"   Skipped (Ocean): {skipped_count}")
-    print(f"[OK] Saved to {OUTPUT_FILE_CSV} and {OUTPUT_FILE_JSON}")
+    print(f"[OK] Saved to {HISTORY_DB} and {OUTPUT_FILE_JSON}")
+    return {"timestamp": timestamp, "model": model, "total": total, "processed": processed_count,
+            "skipped": skipped_count, "failed": failed_count, "output": OUTPUT_FILE_JSON}
 
 
 if __name__ == "__main__":
-    run_pipeline()
+    parser = argparse.ArgumentParser(description="Hourly grid prediction pipeline")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Model type (rf, xgb, hybrid, ...)")
+    parser.add_argument("--mode", choices=["local", "remote"], default=PIPELINE_MODE,
+                        help="Score with the local model files or through the API's /predict/batch")
+    parser.add_argument("--api-url", default=API_URL, help="Batch endpoint for --mode remote")
+    args = parser.parse_args()
+
+    API_URL = args.api_url
+    run_pipeline(model=args.model, score=score_remote if args.mode == "remote" else score_local)
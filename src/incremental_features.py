@@ -0,0 +1,194 @@
+# incremental_features.py
+"""
+Append feature rows for newly arrived ERA5 days without rebuilding history.
+
+Per grid cell we keep the last SEQ_DAYS+1 daily rows (date, tp, t2m). The
+newest of them is "pending": its next-day rainfall is unknown until the
+next day arrives. An update only touches the state rows plus the new days,
+so its cost is proportional to the new data, not the archive.
+
+The rolling window columns are not recomputed from the tail: pandas' running
+sums depend on a cell's whole history, so the per-cell RollingWindow sums
+are saved with the tail and continued from there.
+
+The flood threshold is frozen when the state is initialised. A full
+rebuild that uses the same threshold (`create_labels.py --threshold`)
+produces exactly the same rows.
+
+    python incremental_features.py init --daily ../data/era5_daily.csv
+    python incremental_features.py update --daily ../data/era5_daily_2025_01.csv
+    python incremental_features.py update --nc-dir ../data/extracted/era5_2025_01
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import era5_store
+from prepare_features import SEQ_DAYS, CELL_COLS, WINDOWS, RollingWindow, build_features, cell_positions, roll_cells
+
+DAILY = "../data/era5_daily.csv"
+FEATURES = "../data/features_for_ml.csv"
+STATE_DIR = "../data/feature_state"
+QUANTILE = 0.95
+
+STATE_COLS = ["date"] + CELL_COLS + ["tp", "t2m"]
+
+
+def load_state(state_dir=STATE_DIR):
+    with open(os.path.join(state_dir, "meta.json"), "r") as f:
+        meta = json.load(f)
+    tail = pd.read_parquet(os.path.join(state_dir, "tail.parquet"))
+    windows = pd.read_parquet(os.path.join(state_dir, "windows.parquet"))
+    return meta, tail, windows
+
+
+def save_state(state_dir, meta, tail, windows):
+    os.makedirs(state_dir, exist_ok=True)
+    tail.to_parquet(os.path.join(state_dir, "tail.parquet"), index=False)
+    windows.to_parquet(os.path.join(state_dir, "windows.parquet"), index=False)
+    with open(os.path.join(state_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def read_daily(daily):
+    df = daily if isinstance(daily, pd.DataFrame) else era5_store.read_table(daily)
+    df = df[STATE_COLS].copy()
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+def label(rows, threshold):
+    """next_tp / flood_label per cell; the last row of each cell stays unlabeled."""
+    rows = rows.sort_values(CELL_COLS + ["date"]).reset_index(drop=True)
+    rows["next_tp"] = rows.groupby(CELL_COLS)["tp"].shift(-1)
+    rows["flood_label"] = (rows["next_tp"] >= threshold).astype(int)
+    return rows
+
+
+def state_tail(rows):
+    """Keep the newest SEQ_DAYS+1 rows of every cell: enough history for all lags of the pending row."""
+    rows = rows.sort_values(CELL_COLS + ["date"])
+    return rows.groupby(CELL_COLS).tail(SEQ_DAYS + 1)[STATE_COLS].reset_index(drop=True)
+
+
+def roll_windows(rows, carried=None, saved=None):
+    """
+    Window columns for `rows` (sorted by cell and date), continuing the
+    `saved` per-cell sums past the first carried[k] rows of each cell.
+    Returns ({column: values}, per-cell sums to save).
+    """
+    cell_start, _ = cell_positions(rows)
+    starts = np.unique(cell_start)
+    lengths = np.diff(np.append(starts, len(rows)))
+    cells = rows.loc[starts, CELL_COLS].reset_index(drop=True)
+    begin = np.zeros(len(starts), dtype=np.int64)
+    if carried is not None:
+        begin = np.add.reduceat(np.asarray(carried, dtype=np.int64), starts) if len(rows) else begin
+    if saved is not None:
+        # cells first seen in this batch start from empty sums
+        saved = cells.merge(saved, on=CELL_COLS, how="left")
+        empty = [c for c in saved.columns if c not in CELL_COLS and not c.endswith(".prev")]
+        saved[empty] = saved[empty].fillna(0.0)
+
+    windows, state = {}, cells.copy()
+    for name, (col, window, how) in WINDOWS.items():
+        carry = None
+        if saved is not None:
+            carry = {f: saved[f"{name}.{f}"].to_numpy(dtype=float) for f in RollingWindow.FIELDS}
+        windows[name], roller = roll_cells(rows[col].to_numpy(dtype=float), starts, lengths, window, how, begin, carry)
+        for f, arr in roller.state.items():
+            state[f"{name}.{f}"] = arr
+    return windows, state
+
+
+def write_features(feat, features_path, first, batch_name):
+    if features_path.endswith(".csv"):
+        feat.to_csv(features_path, index=False, mode="w" if first else "a", header=first)
+    else:
+        era5_store.write_partitioned(feat, features_path, batch_name, time_col="date")
+
+
+def init_state(daily=DAILY, features_path=FEATURES, state_dir=STATE_DIR, threshold=None, quantile=QUANTILE):
+    """Full build that also leaves the rolling state behind for later updates."""
+    df = read_daily(daily)
+    if threshold is None:
+        threshold = float(df["tp"].quantile(quantile))
+
+    rows = label(df, threshold)
+    windows, sums = roll_windows(rows)
+    feat = build_features(rows, windows)
+    write_features(feat, features_path, True, "init")
+
+    meta = {"threshold": threshold, "last_date": str(df["date"].max().date()), "rows": len(feat)}
+    save_state(state_dir, meta, state_tail(df), sums)
+    print(f"Initialised feature state: {len(feat)} rows, threshold {threshold:.6f}, last day {meta['last_date']}")
+    return feat
+
+
+def update(new_daily, features_path=FEATURES, state_dir=STATE_DIR):
+    """Append feature rows made possible by `new_daily` (days after the state) and advance the state."""
+    meta, tail, saved = load_state(state_dir)
+    new = read_daily(new_daily)
+    if new.empty:
+        return new
+
+    last_seen = tail.groupby(CELL_COLS)["date"].max().rename("last_seen").reset_index()
+    check = new.merge(last_seen, on=CELL_COLS, how="left")
+    if (check["date"] <= check["last_seen"]).any():
+        raise ValueError("New daily rows overlap days already in the feature state")
+
+    rows = label(pd.concat([tail.assign(carried=True), new.assign(carried=False)], ignore_index=True), meta["threshold"])
+    windows, sums = roll_windows(rows, rows.pop("carried"), saved)
+    feat = build_features(rows, windows)
+
+    # rows the state already emitted come back out of build_features; keep only the pending day onwards
+    feat = feat.merge(last_seen, on=CELL_COLS, how="left")
+    feat = feat[feat["last_seen"].isna() | (feat["date"] >= feat["last_seen"])].drop(columns=["last_seen"])
+    feat = feat.reset_index(drop=True)
+
+    write_features(feat, features_path, False, pd.Timestamp(new["date"].min()).strftime("%Y%m%d"))
+
+    meta["last_date"] = str(max(pd.Timestamp(meta["last_date"]), new["date"].max()).date())
+    meta["rows"] += len(feat)
+    save_state(state_dir, meta, state_tail(rows), sums)
+    print(f"Appended {len(feat)} feature rows from {len(new)} new daily rows (last day {meta['last_date']})")
+    return feat
+
+
+def daily_from_netcdf(nc_dir):
+    import aggregate_era5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "daily.csv")
+        aggregate_era5.aggregate_netcdf(nc_dir, out)
+        return pd.read_csv(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental feature updates for new ERA5 months.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("init", help="Full build from era5_daily and save the rolling state")
+    p.add_argument("--daily", default=DAILY)
+    p.add_argument("--threshold", type=float, default=None)
+
+    p = sub.add_parser("update", help="Append features for new days")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--daily", help="Daily rows of the new period (CSV or store)")
+    src.add_argument("--nc-dir", help="Extracted NetCDF folder of the new month")
+
+    for p in sub.choices.values():
+        p.add_argument("--features", default=FEATURES)
+        p.add_argument("--state", default=STATE_DIR)
+
+    args = parser.parse_args()
+    if args.command == "init":
+        init_state(args.daily, args.features, args.state, args.threshold)
+    else:
+        new = args.daily if args.daily else daily_from_netcdf(args.nc_dir)
+        update(new, args.features, args.state)
@@ -0,0 +1,172 @@
+# inference.py
+"""
+Batch scoring shared by the API endpoints.
+
+`score(bundle, X)` runs the scaler and both models once over an (N, 10)
+matrix and returns the result as columns. The codecs below read feature
+matrices from, and write results to, the payload formats accepted by
+`POST /predict/batch`:
+
+    application/json                      {"features": [[...], ...]}
+    application/x-npy                     one (N, 10) float array (np.save)
+    application/vnd.apache.arrow.stream   Arrow IPC stream, 10 numeric columns
+    application/vnd.apache.arrow.file     Arrow IPC file, 10 numeric columns
+
+pyarrow is only imported for Arrow payloads.
+"""
+import io
+import json
+import numpy as np
+
+N_FEATURES = 10
+
+# Low (<10%), Moderate (10-30%), High (>30%)
+RISK_EDGES = [0.10, 0.30]
+RISK_LABELS = ["Low", "Moderate", "High"]
+ACTIONS = ["Monitor", "Prepare", "Evacuate / Alert"]
+
+JSON = "application/json"
+NPY = "application/x-npy"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+ARROW_FILE = "application/vnd.apache.arrow.file"
+FORMATS = [JSON, NPY, ARROW_STREAM, ARROW_FILE]
+
+RESULT_DTYPE = np.dtype([("predicted_rainfall_mm", "<f8"), ("flood_probability", "<f8"), ("risk_level", "i1")])
+
+
+class PayloadError(ValueError):
+    """The request body cannot be read as an (N, 10) feature matrix."""
+
+
+class UnsupportedPayload(PayloadError):
+    """The content type is not one of FORMATS."""
+
+
+def risk_levels(prob):
+    """0 / 1 / 2 (Low / Moderate / High) per probability."""
+    prob = np.asarray(prob)
+    return np.where(prob < RISK_EDGES[0], 0, np.where(prob <= RISK_EDGES[1], 1, 2)).astype(np.int8)
+
+
+def score(bundle, X):
+    """Scaler + regressor + classifier over the whole matrix, as result columns."""
+    X = np.asarray(X, dtype=float)
+    if bundle["scaler"]:
+        X = bundle["scaler"].transform(X)
+    rainfall = np.asarray(bundle["reg"].predict(X), dtype=float)
+    prob = np.asarray(bundle["clf"].predict_proba(X)[:, 1], dtype=float)
+    return {"predicted_rainfall_mm": rainfall, "flood_probability": prob, "risk_level": risk_levels(prob)}
+
+
+def result_rows(columns, model_name):
+    """One /predict-style response dict per row of `columns`."""
+    return [{
+        "predicted_rainfall_mm": float(rain),
+        "flood_probability": float(prob),
+        "flood_risk": RISK_LABELS[level],
+        "recommended_action": ACTIONS[level],
+        "model_name": model_name,
+    } for rain, prob, level in zip(columns["predicted_rainfall_mm"], columns["flood_probability"],
+                                   columns["risk_level"])]
+
+
+def topo_features(lat, lon, temp):
+    """
+    Vectorised feature rows used for live points: lags 1-9 carry a "local
+    moisture context" derived from the terrain term, the last column is the
+    temperature. Returns (X, topo_bias).
+    """
+    lat, lon, temp = (np.atleast_1d(np.asarray(v, dtype=float)) for v in (lat, lon, temp))
+    topo_bias = np.sin(lat * 60) * np.cos(lon * 40) * 3.0
+    moisture = np.maximum(0, 0.4 + topo_bias)
+    X = np.repeat(moisture[:, None], N_FEATURES, axis=1)
+    X[:, -1] = temp
+    return X, topo_bias
+
+
+def check_matrix(X):
+    X = np.asarray(X, dtype=float)
+    if X.ndim == 1 and X.size == N_FEATURES:
+        X = X.reshape(1, -1)
+    if X.ndim != 2 or X.shape[1] != N_FEATURES:
+        raise PayloadError(f"Expected an (N, {N_FEATURES}) feature matrix, got shape {X.shape}")
+    if not np.isfinite(X).all():
+        raise PayloadError("Features must be finite numbers")
+    return X
+
+
+# ---------------------------
+# Decoding
+# ---------------------------
+def media_type(content_type):
+    return (content_type or JSON).split(";")[0].strip().lower()
+
+
+def decode_features(body, content_type):
+    """Returns (X, options); options are extra JSON fields such as model_type."""
+    kind = media_type(content_type)
+    try:
+        if kind == JSON:
+            payload = json.loads(body)
+            if isinstance(payload, list):
+                payload = {"features": payload}
+            options = {k: v for k, v in payload.items() if k != "features"}
+            return check_matrix(payload["features"]), options
+        if kind in (NPY, "application/octet-stream"):
+            return check_matrix(np.load(io.BytesIO(body), allow_pickle=False)), {}
+        if kind in (ARROW_STREAM, ARROW_FILE):
+            return check_matrix(arrow_to_matrix(body, kind)), {}
+    except PayloadError:
+        raise
+    except Exception as e:
+        raise PayloadError(f"Could not read {kind} body: {e}")
+    raise UnsupportedPayload(f"Unsupported content type {kind}; use one of {', '.join(FORMATS)}")
+
+
+def arrow_to_matrix(body, kind):
+    import pyarrow as pa
+
+    reader = pa.ipc.open_stream(body) if kind == ARROW_STREAM else pa.ipc.open_file(body)
+    table = reader.read_all()
+    return np.column_stack([table.column(i).to_numpy(zero_copy_only=False).astype(float)
+                            for i in range(table.num_columns)]) if table.num_columns else np.empty((0, 0))
+
+
+# ---------------------------
+# Encoding
+# ---------------------------
+def encode_results(columns, kind, model_name):
+    """Results in the request's format. Returns (body bytes or JSON-able dict, media type)."""
+    levels = columns["risk_level"]
+    if kind == JSON:
+        return {
+            "model_name": model_name,
+            "count": int(len(levels)),
+            "predicted_rainfall_mm": columns["predicted_rainfall_mm"].tolist(),
+            "flood_probability": columns["flood_probability"].tolist(),
+            "flood_risk": [RISK_LABELS[i] for i in levels],
+            "recommended_action": [ACTIONS[i] for i in levels],
+        }, JSON
+
+    if kind in (NPY, "application/octet-stream"):
+        out = np.empty(len(levels), dtype=RESULT_DTYPE)
+        for name in RESULT_DTYPE.names:
+            out[name] = columns[name]
+        buf = io.BytesIO()
+        np.save(buf, out, allow_pickle=False)
+        return buf.getvalue(), NPY
+
+    import pyarrow as pa
+
+    labels = pa.array(RISK_LABELS)
+    table = pa.table({
+        "predicted_rainfall_mm": columns["predicted_rainfall_mm"],
+        "flood_probability": columns["flood_probability"],
+        "flood_risk": pa.DictionaryArray.from_arrays(pa.array(levels, pa.int8()), labels),
+        "recommended_action": pa.DictionaryArray.from_arrays(pa.array(levels, pa.int8()), pa.array(ACTIONS)),
+    }).replace_schema_metadata({"model_name": model_name})
+    sink = pa.BufferOutputStream()
+    writer = pa.ipc.new_stream(sink, table.schema) if kind == ARROW_STREAM else pa.ipc.new_file(sink, table.schema)
+    with writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes(), kind
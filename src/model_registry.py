@@ -0,0 +1,231 @@
+# model_registry.py
+"""
+Lazy, size-bounded registry of the served model pairs.
+
+`models/` is scanned for `<type>_regressor.joblib` + `<type>_classifier.joblib`
+pairs, but nothing is loaded until a request needs that type. Loaded pairs
+are kept in LRU order and the least recently used ones are dropped once
+their total size exceeds the memory budget.
+
+Every pair carries the signature (mtime, size) of the files it was loaded
+from. At most every `check_interval` seconds a lookup re-stats them, and a
+retrained or re-exported pair is reloaded on that request; in-flight
+requests keep the bundle they already hold.
+
+The registry behaves like the old `loaded_models` dict: `m_type in registry`,
+`registry[m_type]` (loads on demand) and `registry.keys()`.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import tree_engine
+
+TASK_FILES = {"reg": "regressor", "clf": "classifier"}
+
+
+def bundle_paths(model_dir, m_type):
+    return {key: os.path.join(model_dir, f"{m_type}_{kind}.joblib") for key, kind in TASK_FILES.items()}
+
+
+def file_signature(paths):
+    """(mtime_ns, size) of every file a pair can be served from, None for missing ones."""
+    sig = []
+    for path in paths:
+        for p in (path, tree_engine.compiled_path(path)):
+            try:
+                st = os.stat(p)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                sig.append(None)
+    return tuple(sig)
+
+
+def load_pair(model_dir, m_type, backend="auto"):
+    """Load one pair into the bundle dict the endpoints use. Returns (bundle, size_bytes)."""
+    paths = bundle_paths(model_dir, m_type)
+    if backend != "native":
+        reg_fast, clf_fast = tree_engine.load_compiled(paths["reg"]), tree_engine.load_compiled(paths["clf"])
+    else:
+        reg_fast = clf_fast = None
+
+    import joblib  # keeps joblib (and sklearn/xgboost via unpickling) off the import path of the API
+
+    if reg_fast is not None and clf_fast is not None:
+        # the scaler and metadata still come from the bundle, but the arrays are the model
+        reg_data = joblib.load(paths["reg"])
+        bundle = {"reg": reg_fast, "clf": clf_fast, "backend": "compiled"}
+        size = sum(os.path.getsize(tree_engine.compiled_path(p)) for p in paths.values())
+    else:
+        reg_data, clf_data = joblib.load(paths["reg"]), joblib.load(paths["clf"])
+        bundle = {"reg": reg_data["model"], "clf": clf_data["model"], "backend": "native"}
+        size = sum(os.path.getsize(p) for p in paths.values())
+
+    bundle["scaler"] = reg_data.get("scaler")
+    bundle["metadata"] = reg_data.get("metadata", {"name": m_type.upper()})
+    return bundle, size
+
+
+class ModelRegistry:
+    def __init__(self, model_dir, memory_budget_mb=1024, check_interval=2.0, backend="auto", model_types=None):
+        self.model_dir = model_dir
+        self.budget_bytes = int(memory_budget_mb * 1e6)
+        self.check_interval = check_interval
+        self.backend = backend
+        self.model_types = model_types  # None: whatever pairs exist in model_dir
+        self.entries = OrderedDict()    # m_type -> entry, least recently used first
+        self.errors = {}
+        self.lock = threading.Lock()
+        self.load_locks = {}
+        self.available = []
+        self.last_scan = float("-inf")
+        self.scan()
+
+    # ---------------------------
+    # discovery
+    # ---------------------------
+    def scan(self):
+        """Model types with both bundle files on disk."""
+        found = set()
+        if os.path.isdir(self.model_dir):
+            for fname in os.listdir(self.model_dir):
+                if fname.endswith("_regressor.joblib"):
+                    m_type = fname[:-len("_regressor.joblib")]
+                    if os.path.exists(bundle_paths(self.model_dir, m_type)["clf"]):
+                        found.add(m_type)
+        if self.model_types is not None:
+            found &= set(self.model_types)
+        order = self.model_types or sorted(found)
+        self.available = [m for m in order if m in found]
+        self.last_scan = time.monotonic()
+        return self.available
+
+    def refresh(self):
+        if time.monotonic() - self.last_scan >= self.check_interval:
+            self.scan()
+
+    # ---------------------------
+    # dict-like access
+    # ---------------------------
+    def keys(self):
+        self.refresh()
+        return list(self.available)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, m_type):
+        return m_type in self.keys()
+
+    def __getitem__(self, m_type):
+        return self.get(m_type)
+
+    def get(self, m_type):
+        """The bundle for `m_type`, loading or reloading it if needed."""
+        with self.lock:
+            entry = self.entries.get(m_type)
+            if entry is not None:
+                self.entries.move_to_end(m_type)
+                entry["last_used"] = time.time()
+                if time.monotonic() - entry["checked"] < self.check_interval:
+                    return entry["bundle"]
+            load_lock = self.load_locks.setdefault(m_type, threading.Lock())
+
+        # one loader per type; other types keep being served meanwhile
+        with load_lock:
+            paths = bundle_paths(self.model_dir, m_type)
+            if not all(os.path.exists(p) for p in paths.values()):
+                raise KeyError(m_type)
+            signature = file_signature(paths.values())
+            with self.lock:
+                entry = self.entries.get(m_type)
+                if entry is not None and entry["signature"] == signature:
+                    entry["checked"] = time.monotonic()
+                    return entry["bundle"]
+                reloading = entry is not None
+                loads = entry["loads"] + 1 if reloading else 1
+
+            t0 = time.perf_counter()
+            try:
+                bundle, size = load_pair(self.model_dir, m_type, self.backend)
+            except Exception as e:
+                self.errors[m_type] = str(e)
+                raise
+            load_s = time.perf_counter() - t0
+            self.errors.pop(m_type, None)
+            print(f"[OK] {'Reloaded' if reloading else 'Loaded'} {m_type.upper()} model pair "
+                  f"({bundle['backend']}, {size / 1e6:.1f} MB, {load_s:.2f}s)")
+
+            with self.lock:
+                self.entries[m_type] = {
+                    "bundle": bundle,
+                    "size_bytes": size,
+                    "load_seconds": load_s,
+                    "loaded_at": datetime.now(timezone.utc).isoformat(),
+                    "last_used": time.time(),
+                    "checked": time.monotonic(),
+                    "signature": signature,
+                    "loads": loads,
+                }
+                self.entries.move_to_end(m_type)
+                self.evict(keep=m_type)
+            return bundle
+
+    def evict(self, keep=None):
+        """Drop least recently used pairs until the loaded total fits the budget (caller holds the lock)."""
+        while self.loaded_bytes() > self.budget_bytes:
+            victim = next((m for m in self.entries if m != keep), None)
+            if victim is None:
+                break
+            dropped = self.entries.pop(victim)
+            print(f"[INFO] Evicted {victim.upper()} model pair ({dropped['size_bytes'] / 1e6:.1f} MB)")
+
+    def loaded_bytes(self):
+        return sum(e["size_bytes"] for e in self.entries.values())
+
+    def unload(self, m_type):
+        with self.lock:
+            return self.entries.pop(m_type, None) is not None
+
+    # ---------------------------
+    # reporting
+    # ---------------------------
+    def describe(self):
+        """Load state, size and load time of every known model type (never triggers a load)."""
+        out = {}
+        with self.lock:
+            for m_type in self.keys():
+                entry = self.entries.get(m_type)
+                if entry is None:
+                    paths = bundle_paths(self.model_dir, m_type).values()
+                    out[m_type] = {
+                        "state": "error" if m_type in self.errors else "available",
+                        "error": self.errors.get(m_type),
+                        "size_mb": round(sum(os.path.getsize(p) for p in paths if os.path.exists(p)) / 1e6, 3),
+                    }
+                    continue
+                meta = entry["bundle"]["metadata"]
+                out[m_type] = {
+                    "state": "loaded",
+                    "backend": entry["bundle"]["backend"],
+                    "size_mb": round(entry["size_bytes"] / 1e6, 3),
+                    "load_seconds": round(entry["load_seconds"], 4),
+                    "loaded_at": entry["loaded_at"],
+                    "loads": entry["loads"],
+                    "name": meta.get("name"),
+                    "type": meta.get("type"),
+                    "version": meta.get("version"),
+                    "params": meta.get("params", {}),
+                    "tuning": meta.get("tuning", {}),
+                    "distillation": meta.get("distillation"),
+                }
+        return {
+            "budget_mb": round(self.budget_bytes / 1e6, 1),
+            "loaded_mb": round(self.loaded_bytes() / 1e6, 3),
+            "models": out,
+        }
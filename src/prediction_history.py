@@ -0,0 +1,267 @@
+# prediction_history.py
+"""
+Indexed history of the hourly grid predictions (SQLite).
+
+Each pipeline run is written as one transaction into
+
+    runs         (ts, model, points, written_at)            one row per run
+    predictions  (ts, lat, lon, rainfall_mm, probability, risk)
+                 PRIMARY KEY (ts, lat, lon)  -> one run's grid is a range scan
+                 INDEX (lat, lon, ts)        -> one point's series is a range scan
+
+`ts` is the run timestamp in epoch microseconds (UTC), so runs in the same
+second (or the microsecond timestamps of an imported CSV log) stay apart,
+and `risk` the code into inference.RISK_LABELS. `prune(keep_days)` drops runs past the retention
+window and `compact()` gives the space back to the file system.
+
+This replaces the append-only data/hourly_predictions.csv; `import-csv`
+loads an existing log and `export-csv` writes one back out for audits.
+
+Usage (from src/):
+    python prediction_history.py import-csv ../data/hourly_predictions.csv
+    python prediction_history.py series --lat 35.2 --lon 33.36
+    python prediction_history.py grid [--at 2026-10-16T10:00:00]
+    python prediction_history.py prune --days 90
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import inference
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_DB = os.path.join(BASE_DIR, "data", "prediction_history.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    ts INTEGER PRIMARY KEY,
+    model TEXT,
+    points INTEGER NOT NULL,
+    written_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    ts INTEGER NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    rainfall_mm REAL,
+    probability REAL,
+    risk INTEGER,
+    PRIMARY KEY (ts, lat, lon)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS predictions_point ON predictions (lat, lon, ts);
+"""
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+SCHEMA_VERSION = 1   # 0: ts in epoch seconds, 1: ts in epoch microseconds
+
+
+def to_epoch(timestamp):
+    """Epoch microseconds for a datetime, an ISO string (naive = UTC) or a number of epoch seconds."""
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, (int, float)):
+        return int(round(timestamp * 1_000_000))
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+def to_iso(ts):
+    return (EPOCH + timedelta(microseconds=ts)).isoformat()
+
+
+def coord(value):
+    return round(float(value), 5)
+
+
+class PredictionHistory:
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            self.migrate()
+
+    def migrate(self):
+        """Bring a file written with whole-second timestamps to microseconds."""
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            self.conn.execute("UPDATE predictions SET ts = ts * 1000000")
+            self.conn.execute("UPDATE runs SET ts = ts * 1000000")
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.conn.close()
+
+    # ---------------------------
+    # Writing
+    # ---------------------------
+    def write_run(self, timestamp, rows, model=None):
+        """
+        Store one run in a single transaction. `rows` are (lat, lon,
+        rainfall_mm, probability, risk label or code); a run already stored
+        under the same timestamp is replaced. Returns the number of rows.
+        """
+        ts = to_epoch(timestamp)
+        records = []
+        for lat, lon, rainfall, prob, risk in rows:
+            code = inference.RISK_LABELS.index(risk) if isinstance(risk, str) else risk
+            records.append((ts, coord(lat), coord(lon), rainfall, prob, code))
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM predictions WHERE ts = ?", (ts,))
+            self.conn.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?)", records)
+            self.conn.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)",
+                              (ts, model, len(records), datetime.now(timezone.utc).isoformat()))
+        return len(records)
+
+    def prune(self, keep_days, now=None):
+        """Delete runs older than `keep_days`; returns the number of prediction rows removed."""
+        now = now or datetime.now(timezone.utc)
+        cutoff = to_epoch(now - timedelta(days=keep_days))
+        with self.lock, self.conn:
+            removed = self.conn.execute("DELETE FROM predictions WHERE ts < ?", (cutoff,)).rowcount
+            self.conn.execute("DELETE FROM runs WHERE ts < ?", (cutoff,))
+        return removed
+
+    def compact(self):
+        """Return free pages to the file system and refresh the planner statistics."""
+        with self.lock:
+            self.conn.execute("VACUUM")
+            self.conn.execute("ANALYZE")
+
+    # ---------------------------
+    # Reading
+    # ---------------------------
+    @staticmethod
+    def record(row):
+        return {
+            "timestamp": to_iso(row["ts"]),
+            "lat": row["lat"],
+            "lon": row["lon"],
+            "predicted_rainfall_mm": row["rainfall_mm"],
+            "flood_probability": row["probability"],
+            "flood_risk": inference.RISK_LABELS[row["risk"]] if row["risk"] is not None else None,
+        }
+
+    def query(self, sql, params):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def runs(self, limit=100):
+        rows = self.query("SELECT * FROM runs ORDER BY ts DESC LIMIT ?", (limit,))
+        return [{"timestamp": to_iso(r["ts"]), "model": r["model"], "points": r["points"],
+                 "written_at": r["written_at"]} for r in rows]
+
+    def point_series(self, lat, lon, start=None, end=None, limit=None):
+        """One point's predictions over time, oldest first (served by the (lat, lon, ts) index)."""
+        sql = "SELECT * FROM predictions WHERE lat = ? AND lon = ? AND ts >= ? AND ts <= ? ORDER BY ts"
+        params = [coord(lat), coord(lon), to_epoch(start) or 0, to_epoch(end) or 2 ** 62]
+        if limit:
+            sql = f"SELECT * FROM ({sql} DESC LIMIT ?) ORDER BY ts"
+            params.append(limit)
+        return [self.record(r) for r in self.query(sql, params)]
+
+    def run_at(self, timestamp=None):
+        """Epoch of the latest run at or before `timestamp` (None: the latest run)."""
+        if timestamp is None:
+            row = self.query("SELECT MAX(ts) AS ts FROM runs", ())[0]
+        else:
+            row = self.query("SELECT MAX(ts) AS ts FROM runs WHERE ts <= ?", (to_epoch(timestamp),))[0]
+        return row["ts"]
+
+    def grid_at(self, timestamp=None):
+        """The full grid of the latest run at or before `timestamp` (served by the primary key)."""
+        ts = self.run_at(timestamp)
+        if ts is None:
+            return []
+        return [self.record(r) for r in self.query("SELECT * FROM predictions WHERE ts = ? ORDER BY lat, lon",
+                                                   (ts,))]
+
+    def stats(self):
+        rows = self.query("SELECT COUNT(*) AS runs, MIN(ts) AS first, MAX(ts) AS last, SUM(points) AS rows "
+                          "FROM runs", ())[0]
+        size = os.path.getsize(self.path) if self.path != ":memory:" and os.path.exists(self.path) else 0
+        return {"runs": rows["runs"], "rows": rows["rows"] or 0,
+                "first": to_iso(rows["first"]) if rows["first"] else None,
+                "last": to_iso(rows["last"]) if rows["last"] else None,
+                "size_mb": round(size / 1e6, 2)}
+
+    # ---------------------------
+    # CSV
+    # ---------------------------
+    def import_csv(self, path):
+        """Load an hourly_predictions.csv log, one run per timestamp. Returns the number of rows."""
+        runs = {}
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                runs.setdefault(row["timestamp"], []).append((
+                    float(row["lat"]), float(row["lon"]), float(row["predicted_rainfall_mm"]),
+                    float(row["flood_probability"]), row["flood_risk"]))
+        return sum(self.write_run(ts, rows) for ts, rows in runs.items())
+
+    def export_csv(self, path, start=None, end=None):
+        rows = self.query("SELECT * FROM predictions WHERE ts >= ? AND ts <= ? ORDER BY ts, lat, lon",
+                          (to_epoch(start) or 0, to_epoch(end) or 2 ** 62))
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["timestamp", "lat", "lon", "predicted_rainfall_mm", "flood_probability", "flood_risk"])
+            for r in rows:
+                rec = self.record(r)
+                writer.writerow([rec["timestamp"], rec["lat"], rec["lon"], rec["predicted_rainfall_mm"],
+                                 rec["flood_probability"], rec["flood_risk"]])
+        return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prediction history store")
+    parser.add_argument("--db", default=HISTORY_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import-csv", help="Load an existing hourly_predictions.csv")
+    p.add_argument("csv_path")
+    p = sub.add_parser("export-csv", help="Write the history (or a time range) as CSV")
+    p.add_argument("csv_path")
+    p.add_argument("--start")
+    p.add_argument("--end")
+    p = sub.add_parser("series", help="One point's predictions over time")
+    p.add_argument("--lat", type=float, required=True)
+    p.add_argument("--lon", type=float, required=True)
+    p.add_argument("--start")
+    p.add_argument("--end")
+    p = sub.add_parser("grid", help="The full grid of one run")
+    p.add_argument("--at", help="ISO timestamp (default: latest run)")
+    p = sub.add_parser("prune", help="Drop runs past the retention window and compact the file")
+    p.add_argument("--days", type=int, required=True)
+    sub.add_parser("stats", help="Runs, rows and file size")
+
+    args = parser.parse_args()
+    history = PredictionHistory(args.db)
+    if args.command == "import-csv":
+        print(f"[OK] Imported {history.import_csv(args.csv_path)} rows")
+    elif args.command == "export-csv":
+        print(f"[OK] Exported {history.export_csv(args.csv_path, args.start, args.end)} rows")
+    elif args.command == "series":
+        for rec in history.point_series(args.lat, args.lon, args.start, args.end):
+            print(f"{rec['timestamp']}  {rec['flood_probability']:.4f}  {rec['flood_risk']}")
+    elif args.command == "grid":
+        grid = history.grid_at(args.at)
+        print(f"[INFO] {len(grid)} points" + (f" at {grid[0]['timestamp']}" if grid else ""))
+    elif args.command == "prune":
+        removed = history.prune(args.days)
+        history.compact()
+        print(f"[OK] Removed {removed} rows older than {args.days} days")
+    elif args.command == "stats":
+        print(history.stats())
@@ -1,42 +1,217 @@
 # prepare_features.py
+import argparse
 import pandas as pd
 import numpy as np
+from pandas.api.indexers import BaseIndexer
 
 IN = "../data/era5_labeled.csv"
 OUT = "../data/features_for_ml.csv"
 SEQ_DAYS = 7  # how many days of history to use
 
-print("Loading labeled data...")
-df = pd.read_csv(IN, parse_dates=["date"])
+CELL_COLS = ["latitude", "longitude"]
+LAG_COLS = [f"tp_lag{l}" for l in range(1, SEQ_DAYS+1)]
+FEATURE_COLS = LAG_COLS + ["tp_3d_sum", "tp_7d_sum", "t2m_7d_mean"]
+OUT_COLS = ["date"] + CELL_COLS + FEATURE_COLS + ["next_tp", "flood_label"]
 
-# Sort for grouping
-df = df.sort_values(["latitude", "longitude", "date"]).reset_index(drop=True)
 
-rows = []
-for (lat, lon), g in df.groupby(["latitude", "longitude"]):
-    g = g.reset_index(drop=True)
-    # compute rolling sums / means
-    g["tp_3d_sum"] = g["tp"].rolling(3, min_periods=1).sum()
-    g["tp_7d_sum"] = g["tp"].rolling(7, min_periods=1).sum()
-    g["t2m_7d_mean"] = g["t2m"].rolling(7, min_periods=1).mean()
+def cell_positions(df):
+    """Return (first row of each row's cell, position of the row inside its cell)."""
+    n = len(df)
+    lat = df["latitude"].to_numpy()
+    lon = df["longitude"].to_numpy()
+    new_cell = np.ones(n, dtype=bool)
+    new_cell[1:] = (lat[1:] != lat[:-1]) | (lon[1:] != lon[:-1])
+    starts = np.flatnonzero(new_cell)
+    cell_start = np.repeat(starts, np.diff(np.append(starts, n))).astype(np.int64)
+    return cell_start, np.arange(n, dtype=np.int64) - cell_start
 
-    # create lag features: tp_{1..SEQ_DAYS}
+
+class CellWindowIndexer(BaseIndexer):
+    """
+    Trailing window of `window_size` rows that never reaches back past the
+    first row of its grid cell. Lets one rolling() call over the whole
+    (cell, date) sorted frame reproduce per-cell rolling(min_periods=1).
+    """
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype=np.int64)
+        start = np.maximum(end - self.window_size, self.cell_start)
+        return start, end
+
+
+class RollingWindow:
+    """
+    pandas' per-cell rolling(window, min_periods=1).sum() / .mean(),
+    advanced one row at a time for many cells at once.
+
+    pandas does not re-add every window: it keeps a running,
+    Kahan-compensated sum per cell (roll_sum / roll_mean in
+    pandas/_libs/window/aggregations.pyx), so a window's last bits depend
+    on the whole history of its cell. This repeats the same arithmetic, so
+    a cell's sums can be carried in `state` and continued later (cube,
+    incremental updates) with results bit-identical to a full rebuild.
+    """
+
+    FIELDS = ("total", "comp_add", "comp_remove", "nobs", "neg_ct", "same", "prev")
+
+    def __init__(self, n_cells, window, how="sum", state=None):
+        self.window = window
+        self.how = how
+        if state is None:
+            state = {f: np.zeros(n_cells) for f in self.FIELDS}
+            state["prev"] = np.full(n_cells, np.nan)
+        self.state = {f: np.array(state[f], dtype=float) for f in self.FIELDS}
+
+    def push(self, value, dropped, cells):
+        """Drop `dropped` (NaN: nothing leaves) and add `value` for `cells`; returns their new results."""
+        s = {f: a[cells] for f, a in self.state.items()}
+
+        out = ~np.isnan(dropped)
+        y = -dropped - s["comp_remove"]
+        t = s["total"] + y
+        s["comp_remove"] = np.where(out, t - s["total"] - y, s["comp_remove"])
+        s["total"] = np.where(out, t, s["total"])
+        s["nobs"] = s["nobs"] - out
+        s["neg_ct"] = s["neg_ct"] - (out & np.signbit(dropped))
+
+        add = ~np.isnan(value)
+        y = value - s["comp_add"]
+        t = s["total"] + y
+        s["comp_add"] = np.where(add, t - s["total"] - y, s["comp_add"])
+        s["total"] = np.where(add, t, s["total"])
+        s["nobs"] = s["nobs"] + add
+        s["neg_ct"] = s["neg_ct"] + (add & np.signbit(value))
+        s["same"] = np.where(add, np.where(value == s["prev"], s["same"] + 1, 1), s["same"])
+        s["prev"] = np.where(add, value, s["prev"])
+
+        for f, a in s.items():
+            self.state[f][cells] = a
+        return self.result(cells)
+
+    def result(self, cells):
+        s = {f: a[cells] for f, a in self.state.items()}
+        nobs, same, prev = s["nobs"], s["same"], s["prev"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if self.how == "sum":
+                res = np.where(same >= nobs, prev * nobs, s["total"])
+            else:
+                res = s["total"] / nobs
+                res = np.where((s["neg_ct"] == 0) & (res < 0), 0.0, res)
+                res = np.where((s["neg_ct"] == nobs) & (res > 0), 0.0, res)
+                res = np.where(same >= nobs, prev, res)
+        return np.where(nobs > 0, res, np.nan)
+
+
+# output column -> (input column, window, reduction)
+WINDOWS = {"tp_3d_sum": ("tp", 3, "sum"), "tp_7d_sum": ("tp", 7, "sum"), "t2m_7d_mean": ("t2m", 7, "mean")}
+
+
+def roll_cells(values, starts, lengths, window, how, begin=None, state=None):
+    """
+    Run a RollingWindow over cells laid out as values[starts[k] : starts[k] + lengths[k]].
+
+    `state` carries each cell's sums up to row begin[k] - 1 (default: no
+    rows, begin 0); that row gets the carried result and pushing resumes at
+    begin[k]. Returns (results, NaN for rows before that; the RollingWindow).
+    """
+    begin = np.zeros(len(starts), dtype=np.int64) if begin is None else np.asarray(begin, dtype=np.int64)
+    roller = RollingWindow(len(starts), window, how, state)
+    out = np.full(len(values), np.nan)
+    carried = np.flatnonzero(begin > 0)
+    out[starts[carried] + begin[carried] - 1] = roller.result(carried)
+    for p in range(int(begin.min(initial=0)), int(lengths.max(initial=0))):
+        cells = np.flatnonzero((begin <= p) & (lengths > p))
+        rows = starts[cells] + p
+        dropped = values[rows - window] if p >= window else np.full(len(rows), np.nan)
+        out[rows] = roller.push(values[rows], dropped, cells)
+    return out, roller
+
+
+def build_features(df, windows=None):
+    """
+    Vectorized feature engine: all lags and rolling windows are computed in
+    one pass over the (cell, date) sorted frame instead of per cell.
+    `windows` ({column: array aligned with the sorted frame}) replaces the
+    rolling() calls when the caller carried the sums itself.
+    """
+    df = df.sort_values(CELL_COLS + ["date"]).reset_index(drop=True)
+    cell_start, pos = cell_positions(df)
+
+    tp = df["tp"].to_numpy(dtype=float)
     for lag in range(1, SEQ_DAYS+1):
-        g[f"tp_lag{lag}"] = g["tp"].shift(lag)
+        shifted = np.full(len(tp), np.nan)
+        shifted[lag:] = tp[:-lag]
+        shifted[pos < lag] = np.nan
+        df[f"tp_lag{lag}"] = shifted
+
+    for name, (col, window, how) in WINDOWS.items():
+        if windows is not None:
+            df[name] = windows[name]
+        else:
+            rolling = df[col].rolling(CellWindowIndexer(window_size=window, cell_start=cell_start), min_periods=1)
+            df[name] = getattr(rolling, how)()
+
+    # need SEQ_DAYS of history, a known next day, and no missing value in any feature
+    keep = (pos >= SEQ_DAYS) & df["next_tp"].notna().to_numpy() & np.isfinite(df[FEATURE_COLS].to_numpy()).all(axis=1)
+    return df.loc[keep, OUT_COLS].reset_index(drop=True)
+
+
+def build_features_loop(df):
+    """Original per-cell implementation, kept as the reference for tests and benchmarks."""
+    df = df.sort_values(CELL_COLS + ["date"]).reset_index(drop=True)
+
+    rows = []
+    for (lat, lon), g in df.groupby(CELL_COLS):
+        g = g.reset_index(drop=True)
+        # compute rolling sums / means
+        g["tp_3d_sum"] = g["tp"].rolling(3, min_periods=1).sum()
+        g["tp_7d_sum"] = g["tp"].rolling(7, min_periods=1).sum()
+        g["t2m_7d_mean"] = g["t2m"].rolling(7, min_periods=1).mean()
+
+        # create lag features: tp_{1..SEQ_DAYS}
+        for lag in range(1, SEQ_DAYS+1):
+            g[f"tp_lag{lag}"] = g["tp"].shift(lag)
+
+        # drop rows with insufficient history
+        g = g.dropna(subset=[f"tp_lag{SEQ_DAYS}", "next_tp"])
+
+        rows.append(g)
+
+    feat = pd.concat(rows, ignore_index=True)
+    return feat[OUT_COLS]
+
+
+def prepare_features(in_path=IN, out_path=OUT):
+    print("Loading labeled data...")
+    df = pd.read_csv(in_path, parse_dates=["date"])
+
+    out_df = build_features(df)
+
+    # Save feature dataset
+    out_df.to_csv(out_path, index=False)
+    print("Saved features to", out_path)
+    print("Rows:", len(out_df))
+
 
-    # drop rows with insufficient history
-    g = g.dropna(subset=[f"tp_lag{SEQ_DAYS}", "next_tp"])
+def prepare_features_from_cube(cube_dir, out_path=OUT, quantile=0.95):
+    """Label and build features in one pass over a memory-mapped cube (see era5_cube.py)."""
+    import era5_cube
 
-    rows.append(g)
+    cube = era5_cube.Era5Cube(cube_dir)
+    threshold = era5_cube.flood_threshold(cube, quantile)
+    rows = era5_cube.write_features(cube, out_path, threshold)
+    print("Saved features to", out_path)
+    print("Rows:", rows)
 
-feat = pd.concat(rows, ignore_index=True)
 
-# Define feature columns
-lag_cols = [f"tp_lag{l}" for l in range(1, SEQ_DAYS+1)]
-feat_cols = lag_cols + ["tp_3d_sum", "tp_7d_sum", "t2m_7d_mean"]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build lag / rolling features for model training.")
+    parser.add_argument("--input", default=IN)
+    parser.add_argument("--cube", default=None, help="Build from a memory-mapped cube instead of era5_labeled.csv")
+    parser.add_argument("--out", default=OUT)
+    args = parser.parse_args()
 
-# Save feature dataset
-out_df = feat[["date","latitude","longitude"] + feat_cols + ["next_tp","flood_label"]]
-out_df.to_csv(OUT, index=False)
-print("Saved features to", OUT)
-print("Rows:", len(out_df))
+    if args.cube:
+        prepare_features_from_cube(args.cube, args.out)
+    else:
+        prepare_features(args.input, args.out)
@@ -1,27 +1,94 @@
 import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import xarray as xr
 import pandas as pd
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import era5_store
+
 DATA_DIR = "../data/extracted"
+OUTPUT_CSV = "../data/era5_combined.csv"
+OUTPUT_STORE = "../data/era5_combined"
+
+VARIABLES = ["tp", "t2m"]
+CHUNK_HOURS = 24 * 7  # time steps converted per slice in streaming mode
 
-def preprocess_real_nc():
-    dfs = []
 
-    for root, dirs, files in os.walk(DATA_DIR):
+def find_nc_files(data_dir=DATA_DIR):
+    paths = []
+    for root, dirs, files in os.walk(data_dir):
         for f in files:
             if f.endswith(".nc"):
-                file_path = os.path.join(root, f)
-                print("Reading:", file_path)
+                paths.append(os.path.join(root, f))
+    return sorted(paths)
+
+
+def time_dim(ds):
+    # Newer CDS exports name the time axis "valid_time"
+    return "valid_time" if "valid_time" in ds.dims else "time"
+
+
+def slice_to_frame(ds_slice, t_dim):
+    df = ds_slice[VARIABLES].to_dataframe().reset_index()
+    df = df.rename(columns={t_dim: "time"})
+    return df[["time", "latitude", "longitude"] + VARIABLES]
+
+
+def convert_file(file_path, out_dir=OUTPUT_STORE, chunk_hours=CHUNK_HOURS):
+    """
+    Stream one NetCDF file into the Parquet store, `chunk_hours` time steps
+    at a time. Only one slice is ever materialised as a DataFrame.
+    """
+    rel = os.path.relpath(file_path, os.path.dirname(os.path.dirname(file_path)))
+    name = os.path.splitext(rel)[0].replace(os.sep, "_")
+
+    rows = 0
+    with xr.open_dataset(file_path) as ds:
+        t_dim = time_dim(ds)
+        n_steps = ds.sizes[t_dim]
+        for n, start in enumerate(range(0, n_steps, chunk_hours)):
+            df = slice_to_frame(ds.isel({t_dim: slice(start, start + chunk_hours)}), t_dim)
+            era5_store.write_partitioned(df, out_dir, f"{name}-{n:04d}")
+            rows += len(df)
+
+    print(f"Converted: {file_path} ({rows} rows)")
+    return rows
 
-                ds = xr.open_dataset(file_path)
 
-                # Convert to DataFrame
-                df = ds[["tp", "t2m"]].to_dataframe().reset_index()
+def preprocess_to_store(data_dir=DATA_DIR, out_dir=OUTPUT_STORE, workers=1, chunk_hours=CHUNK_HOURS):
+    files = find_nc_files(data_dir)
+    print(f"Found {len(files)} monthly datasets")
+    os.makedirs(out_dir, exist_ok=True)
 
-                # Rename valid_time → time
-                df = df.rename(columns={"valid_time": "time"})
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            counts = list(pool.map(convert_file, files, [out_dir] * len(files), [chunk_hours] * len(files)))
+    else:
+        counts = [convert_file(f, out_dir, chunk_hours) for f in files]
 
-                dfs.append(df)
+    print("\nFINAL DATASET SAVED:")
+    print(out_dir)
+    print("Rows:", sum(counts))
+    return sum(counts)
+
+
+def preprocess_real_nc(data_dir=DATA_DIR, output_path=OUTPUT_CSV):
+    dfs = []
+
+    for file_path in find_nc_files(data_dir):
+        print("Reading:", file_path)
+
+        ds = xr.open_dataset(file_path)
+
+        # Convert to DataFrame
+        df = ds[VARIABLES].to_dataframe().reset_index()
+
+        # Rename valid_time → time
+        df = df.rename(columns={"valid_time": "time"})
+
+        dfs.append(df)
 
     print(f"Loaded {len(dfs)} monthly datasets")
 
@@ -30,12 +97,24 @@ def preprocess_real_nc():
     combined = combined.sort_values("time")
 
     # Save final CSV
-    output_path = "../data/era5_combined.csv"
     combined.to_csv(output_path, index=False)
 
     print("\nFINAL DATASET SAVED:")
     print(output_path)
     print("Rows:", len(combined))
 
+
 if __name__ == "__main__":
-    preprocess_real_nc()
+    parser = argparse.ArgumentParser(description="Convert monthly ERA5 NetCDF files into one long-format table.")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="csv: legacy single era5_combined.csv; parquet: streaming, partitioned store")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--out", default=None, help="Output CSV path or store directory")
+    parser.add_argument("--workers", type=int, default=1, help="Files converted in parallel (parquet only)")
+    parser.add_argument("--chunk-hours", type=int, default=CHUNK_HOURS)
+    args = parser.parse_args()
+
+    if args.format == "parquet":
+        preprocess_to_store(args.data_dir, args.out or OUTPUT_STORE, args.workers, args.chunk_hours)
+    else:
+        preprocess_real_nc(args.data_dir, args.out or OUTPUT_CSV)
@@ -0,0 +1,95 @@
+# quantile_sketch.py
+"""
+Mergeable streaming quantile sketch for non-negative values (rainfall).
+
+Values are counted in logarithmic buckets (DDSketch style): bucket k holds
+values in (gamma^(k-1), gamma^k], so any quantile is returned within
+`relative_accuracy` of the exact order statistic. Zeros and values below
+`min_value` share one bucket. Sketches built on separate partitions merge
+by adding counts, and memory depends on the value range, not the row count.
+
+Counts can be kept per group (grid cell, calendar month, ...) in the same
+structure, so global and per-group thresholds come out of one pass.
+"""
+import numpy as np
+import pandas as pd
+
+ALL = "__all__"
+ZERO_BUCKET = np.iinfo(np.int32).min
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.005, min_value=1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.min_value = min_value
+        # index: (group, bucket) -> count
+        self.counts = pd.Series(dtype="int64", index=pd.MultiIndex.from_arrays([[], []], names=["group", "bucket"]))
+
+    def buckets(self, values):
+        values = np.asarray(values, dtype=float)
+        keys = np.full(values.shape, ZERO_BUCKET, dtype=np.int64)
+        pos = values > self.min_value
+        keys[pos] = np.ceil(np.log(values[pos]) / self.log_gamma).astype(np.int64)
+        return keys
+
+    def bucket_values(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        out = np.zeros(keys.shape, dtype=float)
+        pos = keys != ZERO_BUCKET
+        # midpoint of (gamma^(k-1), gamma^k] in relative terms
+        out[pos] = 2 * self.gamma ** keys[pos] / (self.gamma + 1)
+        return out
+
+    def add(self, values, groups=None):
+        """Count `values` (NaNs ignored), optionally split by a parallel array of group keys."""
+        values = np.asarray(values, dtype=float)
+        keep = ~np.isnan(values)
+        if not keep.any():
+            return self
+        keys = self.buckets(values[keep])
+        if groups is None:
+            codes, uniques = np.zeros(len(keys), dtype=np.int64), np.array([ALL], dtype=object)
+        else:
+            codes, uniques = pd.factorize(np.asarray(groups, dtype=object)[keep])
+
+        # count (group, bucket) pairs with one bincount over a dense code space
+        zero = keys == ZERO_BUCKET
+        k_min = keys[~zero].min() - 1 if (~zero).any() else 0
+        offset = np.where(zero, 0, keys - k_min)
+        span = int(offset.max()) + 1
+        counts = np.bincount(codes * span + offset, minlength=len(uniques) * span)
+        nz = np.flatnonzero(counts)
+        g, o = np.divmod(nz, span)
+        buckets = np.where(o == 0, ZERO_BUCKET, o + k_min)
+
+        batch = pd.Series(counts[nz], index=pd.MultiIndex.from_arrays(
+            [uniques[g], buckets], names=["group", "bucket"]
+        ))
+        self.counts = batch if self.counts.empty else self.counts.add(batch, fill_value=0).astype("int64")
+        return self
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        self.counts = other.counts.copy() if self.counts.empty else self.counts.add(other.counts, fill_value=0).astype("int64")
+        return self
+
+    def count(self, group=ALL):
+        if group not in self.counts.index.get_level_values("group"):
+            return 0
+        return int(self.counts.loc[group].sum())
+
+    def quantiles(self, q):
+        """Return a Series {group: q-quantile}: the bucket of rank floor(q * (n - 1)), i.e. pandas' "lower" method."""
+        counts = self.counts.sort_index()
+        cum = counts.groupby(level="group").cumsum()
+        total = counts.groupby(level="group").transform("sum")
+        rank = np.floor(q * (total - 1))
+        hit = cum[cum > rank]
+        first = hit.reset_index().groupby("group")["bucket"].first()
+        return pd.Series(self.bucket_values(first.to_numpy()), index=first.index, name=q)
+
+    def quantile(self, q, group=ALL):
+        return float(self.quantiles(q).loc[group])
@@ -0,0 +1,245 @@
+# risk_tiles.py
+"""
+PNG raster tiles of the flood-risk surface for GET /tiles/{model}/{z}/{x}/{y}.
+
+The points of a grid snapshot sit on a regular lat/lon mesh (0.04 deg from
+generate_cyprus_grid.py). `RiskField` puts their risk codes into a 2-D
+lattice once per snapshot; a tile is then one nearest-cell lookup per pixel
+(Web Mercator, XYZ scheme, 256 px) and a PNG encode. Cells without a point
+(sea) stay transparent. The cost of a tile does not depend on how many
+points the grid has, and the browser draws one image instead of a marker
+per point.
+
+Tiles are cached per snapshot (its content digest is part of the key and
+the ETag), so a new grid or a reloaded model produces new tiles and old
+ones age out of the LRU. `warm()` renders the tiles over the grid for a
+few zoom levels ahead of the first request, e.g. after a grid refresh.
+
+PNGs are written with zlib directly; no imaging library is needed.
+"""
+import math
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+import grid_snapshot
+
+TILE_SIZE = 256
+MAX_ZOOM = 18
+WARM_ZOOMS = range(7, 12)
+
+# Low / Moderate / High, as on the map markers
+RISK_RGBA = np.array([[0x19, 0x87, 0x54, 150], [0xff, 0xc1, 0x07, 170], [0xff, 0x00, 0x00, 190]], dtype=np.uint8)
+
+
+# ---------------------------
+# Tile geometry
+# ---------------------------
+def tile_bounds(z, x, y):
+    """(west, south, east, north) of an XYZ tile in degrees."""
+    n = 2 ** z
+    west, east = x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+def pixel_centres(z, x, y, size=TILE_SIZE):
+    """Latitudes (top to bottom) and longitudes (left to right) of the pixel centres."""
+    n = 2 ** z
+    offsets = (np.arange(size) + 0.5) / size
+    lon = (x + offsets) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    return lat, lon
+
+
+def tiles_covering(bbox, z):
+    """(x, y) of every tile at zoom z that intersects (west, south, east, north)."""
+    west, south, east, north = bbox
+    n = 2 ** z
+
+    def tx(lon):
+        return min(n - 1, max(0, int((lon + 180.0) / 360.0 * n)))
+
+    def ty(lat):
+        lat = max(-85.0511, min(85.0511, lat))
+        r = math.radians(lat)
+        return min(n - 1, max(0, int((1 - math.asinh(math.tan(r)) / math.pi) / 2 * n)))
+
+    return [(x, y) for x in range(tx(west), tx(east) + 1) for y in range(ty(north), ty(south) + 1)]
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+# ---------------------------
+# PNG
+# ---------------------------
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def encode_png(rgba):
+    """An (H, W, 4) uint8 array as an RGBA PNG."""
+    h, w, _ = rgba.shape
+    rows = np.zeros((h, 1 + 4 * w), dtype=np.uint8)   # filter byte 0 ("none") per row
+    rows[:, 1:] = rgba.reshape(h, -1)
+    header = struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", header)
+            + png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)) + png_chunk(b"IEND", b""))
+
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+# ---------------------------
+# Risk lattice
+# ---------------------------
+def mesh_step(values):
+    """The spacing of a regular mesh from its distinct coordinates."""
+    diffs = np.diff(np.unique(np.round(values, 6)))
+    diffs = diffs[diffs > 1e-6]
+    return float(np.median(diffs)) if len(diffs) else 1.0
+
+
+class RiskField:
+    def __init__(self, lat, lon, codes):
+        lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+        codes = np.asarray(codes, dtype=np.int8)
+        self.count = len(codes)
+        if not self.count:
+            self.bbox = None
+            return
+        self.dlat, self.dlon = mesh_step(lat), mesh_step(lon)
+        self.lat0, self.lon0 = lat.min(), lon.min()
+        i = np.rint((lat - self.lat0) / self.dlat).astype(np.intp)
+        j = np.rint((lon - self.lon0) / self.dlon).astype(np.intp)
+        self.codes = np.full((i.max() + 1, j.max() + 1), -1, dtype=np.int8)
+        self.codes[i, j] = codes
+        # every point colours the cell around it
+        self.bbox = (self.lon0 - self.dlon / 2, self.lat0 - self.dlat / 2,
+                     self.lon0 + (j.max() + 0.5) * self.dlon, self.lat0 + (i.max() + 0.5) * self.dlat)
+
+    @classmethod
+    def from_payload(cls, payload):
+        lat, lon, codes = [], [], []
+        for p in payload["data"]:
+            code = grid_snapshot.risk_code(p)
+            if code is None or not isinstance(p.get("lat"), (int, float)) or not isinstance(p.get("lon"), (int, float)):
+                continue
+            lat.append(p["lat"])
+            lon.append(p["lon"])
+            codes.append(code)
+        return cls(lat, lon, codes)
+
+    def intersects(self, z, x, y):
+        if self.bbox is None:
+            return False
+        west, south, east, north = tile_bounds(z, x, y)
+        return west < self.bbox[2] and east > self.bbox[0] and south < self.bbox[3] and north > self.bbox[1]
+
+    def render(self, z, x, y, size=TILE_SIZE):
+        """(size, size, 4) RGBA array of the tile, or None if it holds no cells."""
+        if not self.intersects(z, x, y):
+            return None
+        lat, lon = pixel_centres(z, x, y, size)
+        i = np.rint((lat - self.lat0) / self.dlat).astype(np.intp)
+        j = np.rint((lon - self.lon0) / self.dlon).astype(np.intp)
+        ok_i = (i >= 0) & (i < self.codes.shape[0])
+        ok_j = (j >= 0) & (j < self.codes.shape[1])
+        codes = self.codes[np.where(ok_i, i, 0)[:, None], np.where(ok_j, j, 0)[None, :]]
+        codes = np.where(ok_i[:, None] & ok_j[None, :], codes, -1)
+        rgba = np.zeros((size, size, 4), dtype=np.uint8)
+        filled = codes >= 0
+        rgba[filled] = RISK_RGBA[codes[filled]]
+        return rgba
+
+
+# ---------------------------
+# Cache
+# ---------------------------
+class TileCache:
+    def __init__(self, snapshots, max_tiles=4096, max_fields=8):
+        """`snapshots`: the GridSnapshots the tiles are drawn from."""
+        self.snapshots = snapshots
+        self.max_tiles = max_tiles
+        self.max_fields = max_fields
+        self.tiles = OrderedDict()    # (digest, z, x, y) -> png bytes, least recently used first
+        self.fields = OrderedDict()   # digest -> RiskField
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "empty": 0, "renders": 0, "evictions": 0, "warmed": 0}
+
+    def field(self, snap):
+        with self.lock:
+            field = self.fields.get(snap.digest)
+            if field is not None:
+                self.fields.move_to_end(snap.digest)
+                return field
+        field = RiskField.from_payload(snap.payload)
+        with self.lock:
+            self.fields[snap.digest] = field
+            while len(self.fields) > self.max_fields:
+                self.fields.popitem(last=False)
+        return field
+
+    def get(self, model, z, x, y):
+        """(png bytes, etag) for a tile of `model`'s grid snapshot, or None without a grid file."""
+        snap = self.snapshots.get(model)
+        if snap is None:
+            return None
+        return self.tile(snap, z, x, y), f'"{snap.digest}-{z}-{x}-{y}"'
+
+    def tile(self, snap, z, x, y):
+        key = (snap.digest, z, x, y)
+        with self.lock:
+            png = self.tiles.get(key)
+            if png is not None:
+                self.tiles.move_to_end(key)
+                self.counters["hits"] += 1
+                return png
+            self.counters["misses"] += 1
+
+        rgba = self.field(snap).render(z, x, y)
+        if rgba is None:
+            png = EMPTY_TILE
+            self.counters["empty"] += 1
+        else:
+            png = encode_png(rgba)
+            self.counters["renders"] += 1
+
+        with self.lock:
+            self.tiles[key] = png
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+                self.counters["evictions"] += 1
+        return png
+
+    def warm(self, models, zooms=WARM_ZOOMS):
+        """Render every tile over the grid for `models` at `zooms`; returns the number of tiles."""
+        count = 0
+        for model in models:
+            snap = self.snapshots.get(model)
+            if snap is None:
+                continue
+            field = self.field(snap)
+            if field.bbox is None:
+                continue
+            for z in zooms:
+                for x, y in tiles_covering(field.bbox, z):
+                    self.tile(snap, z, x, y)
+                    count += 1
+        self.counters["warmed"] += count
+        return count
+
+    def warm_async(self, models, zooms=WARM_ZOOMS):
+        thread = threading.Thread(target=self.warm, args=(list(models), zooms), name="tile-warm", daemon=True)
+        thread.start()
+        return thread
+
+    def metrics(self):
+        return {**self.counters, "tiles": len(self.tiles), "max_tiles": self.max_tiles,
+                "cached_bytes": sum(len(t) for t in list(self.tiles.values()))}
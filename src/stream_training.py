@@ -0,0 +1,167 @@
+# stream_training.py
+"""
+Out-of-core training for the XGB model pair (`train_models.py train-ooc`).
+
+The feature table (features_for_ml.csv or a partitioned store) is read in
+batches and never held in memory as a whole:
+
+1. pass: collect the distinct dates for the time-aware 80/20 split
+2. pass: StandardScaler.partial_fit on the training rows
+3. XGBoost external memory: an xgb.DataIter feeds scaled batches into an
+   ExtMemQuantileDMatrix, whose pages are cached on disk
+4. batched evaluation on the test rows (streaming RMSE, histogram AUC)
+
+Peak memory is governed by `batch_rows`, not by the dataset size.
+RF and the stacking hybrid have no out-of-core fit and keep using
+`train_models.py train`.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.preprocessing import StandardScaler
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import era5_store
+from prepare_features import FEATURE_COLS
+
+BATCH_ROWS = 200_000
+AUC_BINS = 10_000
+
+# Same defaults as the in-memory XGB pair in train_models.build_estimator
+REG_PARAMS = {"objective": "reg:squarederror", "max_depth": 6, "eta": 0.1, "seed": 42, "tree_method": "hist"}
+CLF_PARAMS = {"objective": "binary:logistic", "max_depth": 6, "eta": 0.1, "scale_pos_weight": 5, "seed": 42,
+              "tree_method": "hist"}
+NUM_ROUNDS = 100
+
+
+def iter_batches(path, batch_rows=BATCH_ROWS):
+    columns = ["date"] + FEATURE_COLS + ["next_tp", "flood_label"]
+    for chunk in era5_store.iter_chunks(path, columns=columns, chunksize=batch_rows):
+        chunk = chunk.dropna(subset=["next_tp", "flood_label"])
+        chunk["date"] = pd.to_datetime(chunk["date"])
+        # store partitions can be far larger than a batch; re-slice them
+        for start in range(0, len(chunk), batch_rows):
+            yield chunk.iloc[start:start + batch_rows]
+
+
+def split_date(path, batch_rows=BATCH_ROWS, train_frac=0.8):
+    """First day of the test period: the same 80/20 split over distinct dates as train_models."""
+    dates = set()
+    for batch in iter_batches(path, batch_rows):
+        dates.update(batch["date"].unique())
+    dates = sorted(dates)
+    return dates[int(len(dates) * train_frac)]
+
+
+def fit_scaler(path, cutoff, batch_rows=BATCH_ROWS):
+    scaler = StandardScaler()
+    for batch in iter_batches(path, batch_rows):
+        train = batch[batch["date"] < cutoff]
+        if len(train):
+            scaler.partial_fit(train[FEATURE_COLS])
+    return scaler
+
+
+class FeatureBatches(xgb.DataIter):
+    """Scaled training batches for XGBoost's external-memory DMatrix."""
+
+    def __init__(self, path, scaler, cutoff, target, batch_rows, cache_prefix):
+        self.path = path
+        self.scaler = scaler
+        self.cutoff = cutoff
+        self.target = target
+        self.batch_rows = batch_rows
+        self.batches = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self.batches is None:
+            self.reset()
+        for batch in self.batches:
+            train = batch[batch["date"] < self.cutoff]
+            if len(train) == 0:
+                continue
+            input_data(data=self.scaler.transform(train[FEATURE_COLS]), label=train[self.target].to_numpy())
+            return True
+        return False
+
+    def reset(self):
+        self.batches = iter_batches(self.path, self.batch_rows)
+
+
+def train_booster(path, scaler, cutoff, target, params, num_rounds, batch_rows, cache_dir):
+    it = FeatureBatches(path, scaler, cutoff, target, batch_rows, os.path.join(cache_dir, target))
+    dtrain = xgb.ExtMemQuantileDMatrix(it)
+    return xgb.train(params, dtrain, num_boost_round=num_rounds)
+
+
+def to_sklearn(booster, task):
+    """Wrap a Booster in the sklearn estimator the API expects (predict / predict_proba)."""
+    model = xgb.XGBRegressor() if task == "regression" else xgb.XGBClassifier()
+    model.load_model(bytearray(booster.save_raw("json")))
+    return model
+
+
+def evaluate(path, scaler, cutoff, reg, clf, batch_rows=BATCH_ROWS):
+    """Streaming RMSE / accuracy and a histogram AUC over the test rows."""
+    sq_err, n, correct = 0.0, 0, 0
+    pos_hist = np.zeros(AUC_BINS, dtype=np.int64)
+    neg_hist = np.zeros(AUC_BINS, dtype=np.int64)
+
+    for batch in iter_batches(path, batch_rows):
+        test = batch[batch["date"] >= cutoff]
+        if len(test) == 0:
+            continue
+        X = scaler.transform(test[FEATURE_COLS])
+        y_reg = test["next_tp"].to_numpy()
+        y_clf = test["flood_label"].to_numpy().astype(int)
+
+        p_reg = reg.predict(X)
+        p_proba = clf.predict_proba(X)[:, 1]
+        sq_err += float(((p_reg - y_reg) ** 2).sum())
+        n += len(test)
+        correct += int(((p_proba >= 0.5).astype(int) == y_clf).sum())
+
+        bins = np.minimum((p_proba * AUC_BINS).astype(int), AUC_BINS - 1)
+        pos_hist += np.bincount(bins[y_clf == 1], minlength=AUC_BINS)
+        neg_hist += np.bincount(bins[y_clf == 0], minlength=AUC_BINS)
+
+    # AUC = P(score_pos > score_neg) + 0.5 * P(tie), ties being the same bin
+    neg_below = np.cumsum(neg_hist) - neg_hist
+    pairs = pos_hist.sum() * neg_hist.sum()
+    auc = float((pos_hist * (neg_below + 0.5 * neg_hist)).sum() / pairs) if pairs else float("nan")
+    return {"rmse": (sq_err / n) ** 0.5 if n else float("nan"), "auc": auc,
+            "accuracy": correct / n if n else float("nan"), "rows": n}
+
+
+def train_out_of_core(path, batch_rows=BATCH_ROWS, tuned=None, num_rounds=NUM_ROUNDS):
+    """
+    Returns (reg, clf, scaler, metrics). `tuned` is the xgb entry of
+    tuning_report.json, if any: its best_params override the defaults.
+    """
+    tuned = tuned or {}
+    cutoff = split_date(path, batch_rows)
+    print(f"Test period starts {pd.Timestamp(cutoff).date()}")
+    scaler = fit_scaler(path, cutoff, batch_rows)
+
+    models = {}
+    cache_dir = tempfile.mkdtemp(prefix="xgb_extmem_")
+    try:
+        for task, target, base in [("regression", "next_tp", REG_PARAMS), ("classification", "flood_label", CLF_PARAMS)]:
+            params, rounds = dict(base), num_rounds
+            best = dict(tuned.get(task, {}).get("best_params", {}))
+            if best:
+                rounds = best.pop("n_estimators", rounds)
+                params.update({"eta" if k == "learning_rate" else k: v for k, v in best.items()})
+            print(f"--- Training XGB {task} out of core ({rounds} rounds) ---")
+            booster = train_booster(path, scaler, cutoff, target, params, rounds, batch_rows, cache_dir)
+            models[task] = to_sklearn(booster, task)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    metrics = evaluate(path, scaler, cutoff, models["regression"], models["classification"], batch_rows)
+    return models["regression"], models["classification"], scaler, metrics
@@ -8,111 +8,249 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, roc_auc_score, accuracy_score
 import xgboost as xgb
 import joblib
+import argparse
+import json
+import multiprocessing
 import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-def train():
-    # Use absolute paths relative to this script
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    IN = os.path.join(BASE_DIR, "data", "features_for_ml.csv")
-    MODEL_DIR = os.path.join(BASE_DIR, "models")
-    os.makedirs(MODEL_DIR, exist_ok=True)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import tune_models
+
+# Use absolute paths relative to this script
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEATURES_FILE = os.path.join(BASE_DIR, "data", "features_for_ml.csv")
+MODEL_DIR = os.path.join(BASE_DIR, "models")
+TIMING_REPORT = "training_timing.json"
+
+MODEL_NAMES = ["rf", "xgb", "hybrid"]
+TASKS = ["regression", "classification"]
+
+
+def build_estimator(name, task, n_jobs=1, params=None):
+    """
+    Fresh, unfitted estimator for one (model, task); `n_jobs` is its inner
+    thread budget and `params` (RF/XGB only) override the defaults, e.g.
+    the best configuration from `train_models.py tune`.
+    """
+    if name in ("rf", "xgb"):
+        if name == "rf" and task == "regression":
+            model = RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42, n_jobs=n_jobs)
+        elif name == "rf":
+            model = RandomForestClassifier(n_estimators=100, max_depth=10, class_weight="balanced", random_state=42, n_jobs=n_jobs)
+        elif task == "regression":
+            model = xgb.XGBRegressor(n_estimators=100, max_depth=6, learning_rate=0.1, random_state=42, n_jobs=n_jobs)
+        else:
+            model = xgb.XGBClassifier(n_estimators=100, max_depth=6, learning_rate=0.1, scale_pos_weight=5, random_state=42, n_jobs=n_jobs)
+        return model.set_params(**params) if params else model
+
+    # Hybrid Stacking (XGBoost + MLP): the budget goes to the stacking CV
+    # folds, so the base learners themselves stay single-threaded.
+    if task == "regression":
+        reg_estimators = [
+            ('xgb', xgb.XGBRegressor(n_estimators=50, max_depth=5, random_state=42, n_jobs=1)),
+            ('mlp', MLPRegressor(hidden_layer_sizes=(64, 32), max_iter=500, random_state=42))
+        ]
+        return StackingRegressor(estimators=reg_estimators, final_estimator=Ridge(), n_jobs=n_jobs)
+    clf_estimators = [
+        ('xgb', xgb.XGBClassifier(n_estimators=50, max_depth=5, random_state=42, n_jobs=1)),
+        ('mlp', MLPClassifier(hidden_layer_sizes=(64, 32), max_iter=500, random_state=42))
+    ]
+    return StackingClassifier(estimators=clf_estimators, final_estimator=LogisticRegression(), n_jobs=n_jobs)
 
-    print("Loading features...")
-    if not os.path.exists(IN):
-        print(f"ERROR: {IN} not found.")
-        return
 
-    df = pd.read_csv(IN, parse_dates=["date"])
+def read_features(path=FEATURES_FILE):
+    """Return (rows with valid targets, feature column names)."""
+    df = pd.read_csv(path, parse_dates=["date"])
 
     # Remove invalid rows
     df = df.dropna(subset=["next_tp", "flood_label"])
 
     # Features
-    feature_cols = [c for c in df.columns if c.startswith("tp_lag") or 
+    feature_cols = [c for c in df.columns if c.startswith("tp_lag") or
                     c in ["tp_3d_sum","tp_7d_sum","t2m_7d_mean"]]
 
     # Validate feature columns exist
     for f in feature_cols:
         if f not in df.columns:
             raise ValueError(f"ERROR: Missing feature column: {f}")
+    return df, feature_cols
+
+
+def time_split_mask(dates, train_frac=0.8):
+    """True for rows in the first 80% of the distinct dates (time-aware split)."""
+    unique = sorted(dates.unique())
+    split_idx = int(len(unique) * train_frac)
+    return dates.isin(set(unique[:split_idx]))
+
+
+def load_training_data(path=FEATURES_FILE):
+    """Load features, apply the time-aware 80/20 date split and fit the scaler."""
+    df, feature_cols = read_features(path)
 
     X = df[feature_cols]
     y_reg = df["next_tp"]
     y_clf = df["flood_label"]
 
-    # Time-aware split
-    dates = sorted(df["date"].unique())
-    split_idx = int(len(dates) * 0.8)
-
-    train_dates = set(dates[:split_idx])
-    train_mask = df["date"].isin(train_dates)
-
+    train_mask = time_split_mask(df["date"])
     X_train, X_test = X[train_mask], X[~train_mask]
-    y_reg_train, y_reg_test = y_reg[train_mask], y_reg[~train_mask]
-    y_clf_train, y_clf_test = y_clf[train_mask], y_clf[~train_mask]
 
     # Scaling
     scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-
-    # ----------------------------
-    # 1. Baseline: Random Forest
-    # ----------------------------
-    print("\n--- Training Model 1: Random Forest (Baseline) ---")
-    rf_reg = RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42)
-    rf_reg.fit(X_train_scaled, y_reg_train)
-    
-    rf_clf = RandomForestClassifier(n_estimators=100, max_depth=10, class_weight="balanced", random_state=42)
-    rf_clf.fit(X_train_scaled, y_clf_train)
-
-    # ----------------------------
-    # 2. Standalone: XGBoost
-    # ----------------------------
-    print("\n--- Training Model 2: XGBoost (Modern Standalone) ---")
-    xgb_reg = xgb.XGBRegressor(n_estimators=100, max_depth=6, learning_rate=0.1, random_state=42)
-    xgb_reg.fit(X_train_scaled, y_reg_train)
-    
-    xgb_clf = xgb.XGBClassifier(n_estimators=100, max_depth=6, learning_rate=0.1, scale_pos_weight=5, random_state=42)
-    xgb_clf.fit(X_train_scaled, y_clf_train)
-
-    # ----------------------------
-    # 3. Hybrid: Hybrid Stacking (XGBoost + Neural Network)
-    # ----------------------------
-    print("\n--- Training Model 3: Hybrid (XGBoost + MLP Stacking) ---")
-    
-    # Hybrid Regressor
-    reg_estimators = [
-        ('xgb', xgb.XGBRegressor(n_estimators=50, max_depth=5, random_state=42)),
-        ('mlp', MLPRegressor(hidden_layer_sizes=(64, 32), max_iter=500, random_state=42))
-    ]
-    hybrid_reg = StackingRegressor(estimators=reg_estimators, final_estimator=Ridge())
-    hybrid_reg.fit(X_train_scaled, y_reg_train)
+    return {
+        "feature_cols": feature_cols,
+        "scaler": scaler,
+        "X_train": scaler.fit_transform(X_train),
+        "X_test": scaler.transform(X_test),
+        "y_reg_train": y_reg[train_mask].to_numpy(),
+        "y_reg_test": y_reg[~train_mask].to_numpy(),
+        "y_clf_train": y_clf[train_mask].to_numpy(),
+        "y_clf_test": y_clf[~train_mask].to_numpy(),
+    }
 
-    # Hybrid Classifier
-    clf_estimators = [
-        ('xgb', xgb.XGBClassifier(n_estimators=50, max_depth=5, random_state=42)),
-        ('mlp', MLPClassifier(hidden_layer_sizes=(64, 32), max_iter=500, random_state=42))
-    ]
-    hybrid_clf = StackingClassifier(estimators=clf_estimators, final_estimator=LogisticRegression())
-    hybrid_clf.fit(X_train_scaled, y_clf_train)
 
-    # Evaluate and Save
-    models = {
-        "rf": (rf_reg, rf_clf),
-        "xgb": (xgb_reg, xgb_clf),
-        "hybrid": (hybrid_reg, hybrid_clf)
+def plan_parallelism(n_tasks, cores):
+    """
+    Split the core budget: as many fits side by side as possible, leftover
+    cores inside each fit. Returns (outer, threads) with one thread count
+    per task; the cores // outer split leaves cores % outer over, and those
+    go to the first fits.
+    """
+    outer = max(1, min(n_tasks, cores))
+    inner, extra = divmod(max(cores, 1), outer)
+    threads = [max(1, inner + (1 if i < extra else 0)) for i in range(n_tasks)]
+    return outer, threads
+
+
+def share_arrays(data, folder):
+    """Write the training arrays once as .npy; workers memory-map them instead of receiving copies."""
+    paths = {}
+    for key in ["X_train", "X_test", "y_reg_train", "y_clf_train"]:
+        paths[key] = os.path.join(folder, f"{key}.npy")
+        np.save(paths[key], np.ascontiguousarray(data[key]))
+    return paths
+
+
+def fit_one(name, task, paths, n_jobs, params=None):
+    """Worker: fit one estimator on the shared arrays, score the test split, report timings."""
+    X_train = np.load(paths["X_train"], mmap_mode="r")
+    X_test = np.load(paths["X_test"], mmap_mode="r")
+    y_train = np.load(paths["y_reg_train" if task == "regression" else "y_clf_train"], mmap_mode="r")
+
+    model = build_estimator(name, task, n_jobs, params)
+    t0 = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    pred = model.predict(X_test) if task == "regression" else model.predict_proba(X_test)[:, 1]
+    predict_s = time.perf_counter() - t0
+
+    timing = {
+        "fit_seconds": round(fit_s, 3),
+        "predict_seconds": round(predict_s, 3),
+        "predict_rows": int(X_test.shape[0]),
+        # ru_maxrss is KiB on Linux; each worker runs a single fit, so this is that model's peak
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "n_jobs": n_jobs,
     }
+    return name, task, model, pred, timing
+
+
+def fit_all(data, jobs, names=MODEL_NAMES, tuned=None):
+    """Fit every (model, task) pair across a process pool. Returns {(name, task): (model, pred, timing)}."""
+    tuned = tuned or {}
+    work = [(name, task) for name in names for task in TASKS]
+    outer, threads = plan_parallelism(len(work), jobs)
+    print(f"Training {len(work)} models: {outer} in parallel x {min(threads)}-{max(threads)} threads each")
+
+    results = {}
+    folder = tempfile.mkdtemp(prefix="train_models_")
+    try:
+        paths = share_arrays(data, folder)
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=outer, mp_context=ctx, max_tasks_per_child=1) as pool:
+            futures = [
+                pool.submit(fit_one, name, task, paths, n_jobs, tuned.get(name, {}).get(task, {}).get("best_params"))
+                for (name, task), n_jobs in zip(work, threads)
+            ]
+            for fut in futures:
+                name, task, model, pred, timing = fut.result()
+                print(f"[OK] {name} {task}: fit {timing['fit_seconds']}s, peak RSS {timing['peak_rss_mb']} MB")
+                results[(name, task)] = (model, pred, timing)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def reported_params(name, model):
+    """JSON-friendly hyperparameters worth showing next to a served model."""
+    keys = list(tune_models.SEARCH_SPACE.get(name, {})) + ["n_estimators"] if name in tune_models.SEARCH_SPACE else []
+    params = model.get_params()
+    return {k: params[k] for k in keys if k in params}
+
+
+def save_pair(name, reg, clf, scaler, feature_cols, metadata):
+    joblib.dump({"model": reg, "scaler": scaler, "features": feature_cols, "metadata": {**metadata, "task": "regression"}},
+                os.path.join(MODEL_DIR, f"{name}_regressor.joblib"))
+    joblib.dump({"model": clf, "scaler": scaler, "features": feature_cols, "metadata": {**metadata, "task": "classification"}},
+                os.path.join(MODEL_DIR, f"{name}_classifier.joblib"))
+
+
+def run_tuning(models, budget, candidates, folds, jobs):
+    print("Loading features...")
+    if not os.path.exists(FEATURES_FILE):
+        print(f"ERROR: {FEATURES_FILE} not found.")
+        return
+
+    df, feature_cols = read_features(FEATURES_FILE)
+    # tune on the training dates only: the last 20% are train()'s test set
+    df = df[time_split_mask(df["date"])]
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    report = tune_models.tune(df, feature_cols, build_estimator, models=models, n_candidates=candidates,
+                              n_folds=folds, budget_s=budget, n_jobs=jobs or os.cpu_count() or 1, out_dir=MODEL_DIR)
+    print(f"\n✅ Best parameters saved to {os.path.join(MODEL_DIR, tune_models.TUNING_REPORT)}")
+    print("   Run `python train_models.py train` to retrain with them.")
+    return report
+
+
+def train(jobs=None):
+    os.makedirs(MODEL_DIR, exist_ok=True)
+
+    print("Loading features...")
+    if not os.path.exists(FEATURES_FILE):
+        print(f"ERROR: {FEATURES_FILE} not found.")
+        return
+
+    data = load_training_data(FEATURES_FILE)
+    scaler, feature_cols = data["scaler"], data["feature_cols"]
+
+    tuned = tune_models.load_tuned_params(MODEL_DIR)
+    if tuned:
+        print(f"Using tuned parameters from {tune_models.TUNING_REPORT} for: {', '.join(tuned)}")
+
+    t0 = time.perf_counter()
+    results = fit_all(data, jobs or os.cpu_count() or 1, tuned=tuned)
+    wall = time.perf_counter() - t0
+
+    timing_report = {"wall_seconds": round(wall, 3), "cores": jobs or os.cpu_count(), "models": {}}
+
+    # Evaluate and Save
+    for name in MODEL_NAMES:
+        reg, p_reg, reg_timing = results[(name, "regression")]
+        clf, p_proba, clf_timing = results[(name, "classification")]
+        timing_report["models"][name] = {"regression": reg_timing, "classification": clf_timing}
 
-    for name, (reg, clf) in models.items():
         print(f"\nEvaluating {name.upper()}...")
-        p_reg = reg.predict(X_test_scaled)
-        p_proba = clf.predict_proba(X_test_scaled)[:, 1]
-        
-        rmse = mean_squared_error(y_reg_test, p_reg) ** 0.5
-        auc = roc_auc_score(y_clf_test, p_proba)
-        acc = accuracy_score(y_clf_test, (p_proba >= 0.5).astype(int))
-        
+        rmse = mean_squared_error(data["y_reg_test"], p_reg) ** 0.5
+        auc = roc_auc_score(data["y_clf_test"], p_proba)
+        acc = accuracy_score(data["y_clf_test"], (p_proba >= 0.5).astype(int))
+
         print(f"[{name}] RMSE: {rmse:.4f}, AUC: {auc:.4f}, Accuracy: {acc:.4f}")
 
         # Metadata
@@ -122,15 +260,135 @@ def train():
             "version": "1.0",
             "features": feature_cols,
             "scaler": scaler,
-            "model": reg if "regressor" in name else None # Placeholder, we save actual below
+            "model": reg if "regressor" in name else None, # Placeholder, we save actual below
+            "params": {"regression": reported_params(name, reg), "classification": reported_params(name, clf)},
+            "tuning": {task: {k: v for k, v in entry.items() if k in ("metric", "cv_score", "folds")}
+                       for task, entry in tuned.get(name, {}).items()},
         }
 
-        joblib.dump({"model": reg, "scaler": scaler, "features": feature_cols, "metadata": {**metadata, "task": "regression"}}, 
-                    os.path.join(MODEL_DIR, f"{name}_regressor.joblib"))
-        joblib.dump({"model": clf, "scaler": scaler, "features": feature_cols, "metadata": {**metadata, "task": "classification"}}, 
-                    os.path.join(MODEL_DIR, f"{name}_classifier.joblib"))
+        save_pair(name, reg, clf, scaler, feature_cols, metadata)
 
+    with open(os.path.join(MODEL_DIR, TIMING_REPORT), "w") as f:
+        json.dump(timing_report, f, indent=4)
+
+    print(f"\nTotal training wall time: {wall:.1f}s (timings in {TIMING_REPORT})")
     print("\n✅ All models trained and saved to", MODEL_DIR)
 
+
+def run_distill(rounds=None):
+    """Distill the saved hybrid pair into the hybrid-fast pair (see distill_hybrid.py)."""
+    import distill_hybrid
+
+    reg_path = os.path.join(MODEL_DIR, "hybrid_regressor.joblib")
+    clf_path = os.path.join(MODEL_DIR, "hybrid_classifier.joblib")
+    if not (os.path.exists(reg_path) and os.path.exists(clf_path)):
+        print("ERROR: hybrid models not found. Run `python train_models.py train` first.")
+        return
+    if not os.path.exists(FEATURES_FILE):
+        print(f"ERROR: {FEATURES_FILE} not found.")
+        return
+
+    teacher_reg, teacher_clf = joblib.load(reg_path), joblib.load(clf_path)
+    scaler, feature_cols = teacher_reg["scaler"], teacher_reg["features"]
+
+    df, _ = read_features(FEATURES_FILE)
+    train_mask = time_split_mask(df["date"])
+    X = scaler.transform(df[feature_cols])
+
+    print("Distilling HYBRID into HYBRID-FAST...")
+    reg, clf, report = distill_hybrid.distill(
+        teacher_reg["model"], teacher_clf["model"], X[train_mask.to_numpy()], X[~train_mask.to_numpy()],
+        df.loc[~train_mask, "flood_label"].to_numpy(), rounds=rounds or distill_hybrid.STUDENT_ROUNDS,
+    )
+    fid, lat = report["fidelity"], report["latency"]
+    print(f"[{distill_hybrid.STUDENT}] rainfall R2 vs teacher: {fid['rainfall_r2_vs_teacher']:.4f}, "
+          f"risk band agreement: {fid['risk_band_agreement']:.2%}")
+    print(f"[{distill_hybrid.STUDENT}] single-row latency {lat['student']['single_row_ms']}ms "
+          f"vs {lat['teacher']['single_row_ms']}ms ({lat['single_row_speedup']}x)")
+
+    metadata = {
+        "name": "HYBRID-FAST Model",
+        "type": "Distilled",
+        "version": teacher_reg["metadata"].get("version", "1.0"),
+        "features": feature_cols,
+        "scaler": scaler,
+        "model": None,
+        "params": {"student": report["student_params"]},
+        "tuning": {},
+        "distillation": {k: report[k] for k in ("teacher", "fidelity", "latency")},
+    }
+    save_pair(distill_hybrid.STUDENT, reg, clf, scaler, feature_cols, metadata)
+    with open(os.path.join(MODEL_DIR, distill_hybrid.DISTILL_REPORT), "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"\n✅ Saved {distill_hybrid.STUDENT} pair and {distill_hybrid.DISTILL_REPORT} to", MODEL_DIR)
+    return report
+
+
+def train_ooc(path=FEATURES_FILE, batch_rows=None):
+    """XGB pair only, streamed from disk in batches (see stream_training.py)."""
+    import stream_training
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    if not os.path.exists(path):
+        print(f"ERROR: {path} not found.")
+        return
+
+    tuned = tune_models.load_tuned_params(MODEL_DIR).get("xgb", {})
+    if tuned:
+        print(f"Using tuned parameters from {tune_models.TUNING_REPORT} for: xgb")
+
+    t0 = time.perf_counter()
+    reg, clf, scaler, metrics = stream_training.train_out_of_core(
+        path, batch_rows or stream_training.BATCH_ROWS, tuned=tuned
+    )
+    wall = time.perf_counter() - t0
+    print(f"[xgb] RMSE: {metrics['rmse']:.4f}, AUC: {metrics['auc']:.4f}, Accuracy: {metrics['accuracy']:.4f}")
+
+    feature_cols = list(stream_training.FEATURE_COLS)
+    metadata = {
+        "name": "XGB Model",
+        "type": "Standalone",
+        "version": "1.0",
+        "features": feature_cols,
+        "scaler": scaler,
+        "model": None,
+        "params": {"regression": reported_params("xgb", reg), "classification": reported_params("xgb", clf)},
+        "tuning": {task: {k: v for k, v in entry.items() if k in ("metric", "cv_score", "folds")}
+                   for task, entry in tuned.items()},
+        "training": {"mode": "out-of-core", "batch_rows": batch_rows or stream_training.BATCH_ROWS,
+                     "wall_seconds": round(wall, 3), "test_rows": metrics["rows"],
+                     "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)},
+    }
+    save_pair("xgb", reg, clf, scaler, feature_cols, metadata)
+    print(f"\n✅ XGB pair trained out of core in {wall:.1f}s and saved to", MODEL_DIR)
+    return metrics
+
+
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train the RF, XGB and hybrid model pairs.")
+    parser.add_argument("--jobs", type=int, default=None, help="Total CPU cores to use (default: all)")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("train", help="Train and save all model pairs (default)")
+
+    p = sub.add_parser("tune", help="Rolling-origin CV search with successive halving")
+    p.add_argument("--models", nargs="+", choices=list(tune_models.SEARCH_SPACE), default=list(tune_models.SEARCH_SPACE))
+    p.add_argument("--budget", type=float, default=900, help="Wall-clock budget in seconds for the whole search")
+    p.add_argument("--candidates", type=int, default=12)
+    p.add_argument("--folds", type=int, default=3)
+
+    p = sub.add_parser("train-ooc", help="Train the XGB pair out of core, streaming the features in batches")
+    p.add_argument("--input", default=FEATURES_FILE, help="Features CSV or partitioned store")
+    p.add_argument("--batch-rows", type=int, default=None, help="Rows per batch (bounds peak memory)")
+
+    p = sub.add_parser("distill", help="Distill the hybrid pair into a single-model hybrid-fast pair")
+    p.add_argument("--rounds", type=int, default=None, help="Boosting rounds of the student")
+
+    args = parser.parse_args()
+    if args.command == "tune":
+        run_tuning(args.models, args.budget, args.candidates, args.folds, args.jobs)
+    elif args.command == "distill":
+        run_distill(args.rounds)
+    elif args.command == "train-ooc":
+        train_ooc(args.input, args.batch_rows)
+    else:
+        train(args.jobs)
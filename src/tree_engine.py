@@ -0,0 +1,271 @@
+# tree_engine.py
+"""
+NumPy inference engine for the RF and XGB bundles.
+
+`export_model` flattens a fitted forest / booster into contiguous node
+arrays (int32 feature and child indices, float32 thresholds and leaf
+values) with every tree appended to one table. `CompiledEnsemble` then
+scores a whole batch by walking all trees one level per step:
+
+    node[row, tree] -> feature -> go left/right -> node[row, tree]
+
+Leaves point to themselves, so after `depth` steps every (row, tree) sits
+on its leaf and the prediction is a single gather + reduction. No sklearn
+or xgboost import is needed at inference time, and there is no per-call
+validation or thread dispatch.
+
+The win is per-call overhead: on one core it is tens of times faster than
+sklearn's RF for single rows and still ahead at a few hundred rows (a grid
+refresh), while the compiled C loops of sklearn/xgboost overtake it around
+10k rows (`python benchmarks.py trees`).
+
+All splits are stored as `x <= threshold` on float32 inputs: sklearn's
+thresholds are rounded down to float32, XGBoost's `x < c` becomes
+`x <= nextafter(c, -inf)`. NaNs follow the learned default direction.
+
+    python tree_engine.py export                # all exportable bundles in ../models
+    python tree_engine.py export --models rf
+"""
+import os
+import json
+import argparse
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.path.join(BASE_DIR, "models")
+SUFFIX = ".trees.npz"
+ARRAYS = ["feature", "threshold", "children", "default_left", "value", "roots"]
+BLOCK_CELLS = 1 << 15
+
+
+class CompiledEnsemble:
+    """
+    Flattened tree ensemble with the sklearn predict / predict_proba
+    interface. output = link(scale * sum_t leaf_t + offset)
+    """
+
+    def __init__(self, arrays, meta):
+        for key in ARRAYS:
+            setattr(self, key, arrays[key])
+        self.meta = meta
+        self.task = meta["task"]
+        self.depth = int(meta["depth"])
+        self.scale = float(meta["scale"])
+        self.offset = float(meta["offset"])
+        self.link = meta["link"]
+        self.n_features_in_ = int(meta["n_features"])
+        if self.task == "classification":
+            self.classes_ = np.array([0, 1])
+        # platform-int copies: fancy indexing with int32 would convert on every step
+        self._feature = self.feature.astype(np.intp)
+        self._children = self.children.astype(np.intp).ravel()
+        self._roots = self.roots.astype(np.intp)
+
+    def leaves(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows, n_features = X.shape
+        if n_features != self.n_features_in_:
+            raise ValueError(f"X has {n_features} features, but the model expects {self.n_features_in_}")
+
+        flat = np.ascontiguousarray(X).ravel()
+        has_nan = np.isnan(flat).any()
+        out = np.empty((n_rows, len(self._roots)), dtype=np.intp)
+        # keep each (rows x trees) block around BLOCK_CELLS so the working set stays in cache
+        step = max(1, BLOCK_CELLS // max(n_rows, 1))
+        for t0 in range(0, len(self._roots), step):
+            node = np.repeat(self._roots[t0:t0 + step][None, :], n_rows, axis=0)
+            row_base = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+            for _ in range(self.depth):
+                x = flat[row_base + self._feature[node]]
+                go_right = ~(x <= self.threshold[node])
+                if has_nan:
+                    go_right = np.where(np.isnan(x), ~self.default_left[node], go_right)
+                node = self._children[2 * node + go_right]
+            out[:, t0:t0 + step] = node
+        return out
+
+    def raw(self, X):
+        total = self.value[self.leaves(X)].sum(axis=1, dtype=np.float64)
+        out = self.scale * total + self.offset
+        if self.link == "logistic":
+            out = 1.0 / (1.0 + np.exp(-out))
+        return out
+
+    def predict(self, X):
+        out = self.raw(X)
+        if self.task == "classification":
+            return (out >= 0.5).astype(int)
+        return out
+
+    def predict_proba(self, X):
+        p = self.raw(X)
+        return np.column_stack([1.0 - p, p])
+
+    def save(self, path):
+        np.savez(path, meta=np.array(json.dumps(self.meta)), **{k: getattr(self, k) for k in ARRAYS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            arrays = {k: f[k] for k in ARRAYS}
+            meta = json.loads(str(f["meta"]))
+        return cls(arrays, meta)
+
+
+# ---------------------------
+# Export
+# ---------------------------
+def round_down_f32(thr):
+    """Largest float32 <= thr, so `x32 <= result` equals `x32 <= thr` for every float32 x."""
+    f = np.asarray(thr, dtype=np.float64).astype(np.float32)
+    return np.where(f.astype(np.float64) > thr, np.nextafter(f, np.float32(-np.inf)), f).astype(np.float32)
+
+
+def pack(trees, task, scale, offset, link, n_features):
+    """
+    trees: list of (feature, threshold32, left, right, default_left, value)
+    per tree with -1 children on leaves. Returns a CompiledEnsemble.
+    """
+    feature, threshold, children, default_left, value, roots = [], [], [], [], [], []
+    depth, start = 0, 0
+    for feat, thr, left, right, dleft, val in trees:
+        n = len(feat)
+        leaf = left < 0
+        ids = np.arange(n)
+        ch = np.column_stack([np.where(leaf, ids, left), np.where(leaf, ids, right)]) + start
+        feature.append(np.where(leaf, 0, feat))
+        threshold.append(np.where(leaf, 0, thr))
+        children.append(ch)
+        default_left.append(np.where(leaf, True, dleft))
+        value.append(val)
+        roots.append(start)
+        depth = max(depth, tree_depth(left, right))
+        start += n
+
+    arrays = {
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float32),
+        "children": np.concatenate(children).astype(np.int32),
+        "default_left": np.concatenate(default_left).astype(bool),
+        "value": np.concatenate(value).astype(np.float32),
+        "roots": np.array(roots, dtype=np.int32),
+    }
+    meta = {"task": task, "depth": depth, "scale": scale, "offset": offset, "link": link,
+            "n_features": int(n_features), "n_trees": len(roots), "n_nodes": int(start)}
+    return CompiledEnsemble(arrays, meta)
+
+
+def tree_depth(left, right):
+    depth, level = 0, [0]
+    while True:
+        level = [c for n in level for c in (left[n], right[n]) if c >= 0]
+        if not level:
+            return depth
+        depth += 1
+
+
+def export_sklearn_forest(model, task):
+    trees = []
+    for est in model.estimators_:
+        t = est.tree_
+        if task == "classification":
+            if t.value.shape[2] != 2:
+                raise ValueError("Only binary classifiers can be exported")
+            counts = t.value[:, 0, :]
+            val = counts[:, 1] / np.maximum(counts.sum(axis=1), 1e-300)
+        else:
+            val = t.value[:, 0, 0]
+        dleft = getattr(t, "missing_go_to_left", np.zeros(t.node_count, dtype=bool)).astype(bool)
+        trees.append((t.feature, round_down_f32(t.threshold), t.children_left, t.children_right, dleft, val))
+    return pack(trees, task, 1.0 / len(trees), 0.0, "identity", model.n_features_in_)
+
+
+def export_xgboost(booster, task):
+    model = json.loads(bytes(booster.save_raw("json")))["learner"]
+    objective = model["objective"]["name"]
+    if objective not in ("reg:squarederror", "binary:logistic", "reg:logistic"):
+        raise ValueError(f"Unsupported XGBoost objective: {objective}")
+    base_score = float(str(model["learner_model_param"]["base_score"]).strip("[]").split(",")[0])
+    n_features = int(model["learner_model_param"]["num_feature"])
+
+    link = "identity" if objective == "reg:squarederror" else "logistic"
+    offset = base_score if link == "identity" else float(np.log(base_score / (1 - base_score)))
+
+    trees = []
+    for t in model["gradient_booster"]["model"]["trees"]:
+        left = np.array(t["left_children"], dtype=np.int64)
+        right = np.array(t["right_children"], dtype=np.int64)
+        cond = np.array(t["split_conditions"], dtype=np.float32)
+        leaf = left < 0
+        # XGBoost splits on x < c; leaves keep their value in split_conditions
+        thr = np.where(leaf, 0, np.nextafter(cond, np.float32(-np.inf)))
+        trees.append((np.array(t["split_indices"]), thr, left, right,
+                      np.array(t["default_left"], dtype=bool), np.where(leaf, cond, 0)))
+    return pack(trees, task, 1.0, offset, link, n_features)
+
+
+def export_model(model, task):
+    """Flatten a fitted RF / XGBoost estimator (or a TransformedTargetRegressor around one)."""
+    kind = type(model).__name__
+    if kind in ("RandomForestRegressor", "RandomForestClassifier", "ExtraTreesRegressor", "ExtraTreesClassifier"):
+        return export_sklearn_forest(model, task)
+    if kind in ("XGBRegressor", "XGBClassifier"):
+        return export_xgboost(model.get_booster(), task)
+    if kind == "Booster":
+        return export_xgboost(model, task)
+    if kind == "TransformedTargetRegressor" and type(model.transformer_).__name__ == "StandardScaler":
+        inner = export_model(model.regressor_, task)
+        if inner.link != "identity":
+            raise ValueError("Cannot fold a target transform into a logistic output")
+        s, m = float(model.transformer_.scale_[0]), float(model.transformer_.mean_[0])
+        inner.scale, inner.offset = inner.scale * s, inner.offset * s + m
+        inner.meta.update(scale=inner.scale, offset=inner.offset)
+        return inner
+    raise TypeError(f"Cannot export {kind}: only RF and XGBoost tree ensembles are supported")
+
+
+def compiled_path(bundle_path):
+    return bundle_path[:-len(".joblib")] + SUFFIX
+
+
+def load_compiled(bundle_path):
+    """The exported arrays for a bundle, or None if missing or older than the bundle."""
+    path = compiled_path(bundle_path)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(bundle_path):
+        return None
+    return CompiledEnsemble.load(path)
+
+
+def export_bundles(model_dir=MODEL_DIR, models=None):
+    import joblib
+
+    exported = []
+    for fname in sorted(os.listdir(model_dir)):
+        if not fname.endswith(".joblib"):
+            continue
+        m_type, _, kind = fname[:-len(".joblib")].rpartition("_")
+        if kind not in ("regressor", "classifier") or (models and m_type not in models):
+            continue
+        path = os.path.join(model_dir, fname)
+        task = "regression" if kind == "regressor" else "classification"
+        try:
+            compiled = export_model(joblib.load(path)["model"], task)
+        except (TypeError, ValueError) as e:
+            print(f"[WARN] Skipping {fname}: {e}")
+            continue
+        compiled.save(compiled_path(path))
+        print(f"[OK] {fname}: {compiled.meta['n_trees']} trees, {compiled.meta['n_nodes']} nodes, depth {compiled.depth}")
+        exported.append(fname)
+    return exported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export RF/XGB bundles to flat NumPy tree arrays.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("export", help="Write <bundle>.trees.npz next to every exportable bundle")
+    p.add_argument("--model-dir", default=MODEL_DIR)
+    p.add_argument("--models", nargs="+", default=None, help="Model types to export (default: all)")
+    args = parser.parse_args()
+    export_bundles(args.model_dir, args.models)
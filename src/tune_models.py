@@ -0,0 +1,204 @@
+# tune_models.py
+"""
+Hyperparameter search for the RF and XGB models (`train_models.py tune`).
+
+* Rolling-origin CV on the date axis: every fold trains on all days before
+  its cut-off and validates on the block of days right after it.
+* Successive halving over the number of trees: all candidates start with
+  a small forest, only the best 1/eta of each rung get eta times more trees.
+* Fold splits and their scaled matrices are built once and shared by all
+  trials.
+* The whole search stops at a wall-clock budget (checked before every fold
+  fit) and keeps the best configuration found so far.
+* Only the training dates are searched; the held-out test period of
+  `train_models.py train` never takes part in the selection.
+"""
+import json
+import math
+import os
+import time
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import mean_squared_error, roc_auc_score
+
+SEARCH_SPACE = {
+    "rf": {
+        "max_depth": [6, 8, 10, 14, None],
+        "min_samples_leaf": [1, 5, 20],
+        "max_features": [1.0, 0.5, "sqrt"],
+    },
+    "xgb": {
+        "max_depth": [3, 4, 6, 8],
+        "learning_rate": [0.03, 0.1, 0.2],
+        "subsample": [0.7, 1.0],
+        "colsample_bytree": [0.7, 1.0],
+        "min_child_weight": [1, 5],
+    },
+}
+METRICS = {"regression": "rmse", "classification": "auc"}
+TUNING_REPORT = "tuning_report.json"
+
+
+def rolling_origin_folds(dates, n_folds=3, min_train_frac=0.5):
+    """
+    Expanding-window folds over the sorted unique dates. Returns a list of
+    (train_mask, val_mask) boolean arrays aligned with `dates`.
+    """
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy()
+    unique = np.unique(dates)
+    first_cut = int(len(unique) * min_train_frac)
+    block = (len(unique) - first_cut) // n_folds
+    if first_cut == 0 or block == 0:
+        raise ValueError("Not enough distinct dates for rolling-origin CV")
+
+    folds = []
+    for k in range(n_folds):
+        cut = unique[first_cut + k * block]
+        end = unique[first_cut + (k + 1) * block] if k < n_folds - 1 else unique[-1] + np.timedelta64(1, "D")
+        folds.append((dates < cut, (dates >= cut) & (dates < end)))
+    return folds
+
+
+class FoldCache:
+    """Scaled (X_train, y_train, X_val, y_val) per fold, computed on first use."""
+
+    def __init__(self, X, y_reg, y_clf, folds):
+        self.X = np.asarray(X, dtype=float)
+        self.targets = {"regression": np.asarray(y_reg), "classification": np.asarray(y_clf)}
+        self.folds = folds
+        self.scaled = {}
+
+    def get(self, k, task):
+        if k not in self.scaled:
+            train_mask, val_mask = self.folds[k]
+            scaler = StandardScaler()
+            self.scaled[k] = (scaler.fit_transform(self.X[train_mask]), scaler.transform(self.X[val_mask]))
+        X_train, X_val = self.scaled[k]
+        train_mask, val_mask = self.folds[k]
+        y = self.targets[task]
+        return X_train, y[train_mask], X_val, y[val_mask]
+
+
+def sample_candidates(name, n, seed=42):
+    rng = np.random.default_rng(seed)
+    space = SEARCH_SPACE[name]
+    seen, out = set(), []
+    total = math.prod(len(v) for v in space.values())
+    while len(out) < min(n, total):
+        cand = {k: v[rng.integers(len(v))] for k, v in space.items()}
+        key = json.dumps(cand, sort_keys=True, default=str)
+        if key not in seen:
+            seen.add(key)
+            out.append(cand)
+    return out
+
+
+def score_fold(model, task, X_val, y_val):
+    if task == "regression":
+        return mean_squared_error(y_val, model.predict(X_val)) ** 0.5
+    if len(np.unique(y_val)) < 2:
+        return None
+    return roc_auc_score(y_val, model.predict_proba(X_val)[:, 1])
+
+
+def successive_halving(name, task, cache, build, candidates, max_trees=200, eta=3, budget_s=600, n_jobs=1):
+    """
+    Run successive halving for one (model, task). `build(name, task, n_jobs, params)`
+    returns an unfitted estimator. Returns (best_params, best_score, trials).
+    """
+    deadline = time.monotonic() + budget_s
+    higher_is_better = METRICS[task] == "auc"
+    n_rungs = max(1, int(math.log(len(candidates), eta)) + 1)
+    alive = list(candidates)
+    trials = []
+    best = (None, None)
+
+    for rung in range(n_rungs):
+        trees = max(10, int(max_trees / eta ** (n_rungs - 1 - rung)))
+        scored = []
+        for params in alive:
+            if time.monotonic() > deadline:
+                break
+            trial_params = {**params, "n_estimators": trees}
+            fold_scores = []
+            for k in range(len(cache.folds)):
+                if time.monotonic() > deadline:
+                    # a partly evaluated candidate is not comparable with the others
+                    fold_scores = []
+                    break
+                X_train, y_train, X_val, y_val = cache.get(k, task)
+                model = build(name, task, n_jobs, trial_params).fit(X_train, y_train)
+                s = score_fold(model, task, X_val, y_val)
+                if s is not None:
+                    fold_scores.append(s)
+            if not fold_scores:
+                continue
+            score = float(np.mean(fold_scores))
+            trials.append({"rung": rung, "params": trial_params, "score": score})
+            scored.append((score, trial_params, params))
+
+        if not scored:
+            break
+        scored.sort(key=lambda t: t[0], reverse=higher_is_better)
+        # a result from a bigger rung always wins over an earlier, cheaper one
+        best = (scored[0][1], scored[0][0])
+        alive = [p for _, _, p in scored[:max(1, len(scored) // eta)]]
+        if time.monotonic() > deadline:
+            print(f"[WARN] {name} {task}: wall-clock budget reached in rung {rung}")
+            break
+
+    return best[0], best[1], trials
+
+
+def tune(data_frame, feature_cols, build, models=("rf", "xgb"), n_candidates=12, n_folds=3,
+         max_trees=200, eta=3, budget_s=900, n_jobs=1, out_dir=None):
+    """
+    Tune every (model, task) inside one shared budget and write the best
+    parameters to <out_dir>/tuning_report.json. `data_frame` must hold the
+    training dates only: the folds cover all of it, so rows of the final
+    test period would take part in the selection.
+    """
+    folds = rolling_origin_folds(data_frame["date"], n_folds)
+    cache = FoldCache(data_frame[feature_cols], data_frame["next_tp"], data_frame["flood_label"], folds)
+
+    started = time.monotonic()
+    work = [(m, t) for m in models for t in ["regression", "classification"]]
+    report = {}
+    for i, (name, task) in enumerate(work):
+        remaining = budget_s - (time.monotonic() - started)
+        if remaining <= 0:
+            print(f"[WARN] Budget exhausted before tuning {name} {task}")
+            break
+        # split what is left evenly over the remaining searches
+        share = remaining / (len(work) - i)
+        t0 = time.monotonic()
+        params, score, trials = successive_halving(
+            name, task, cache, build, sample_candidates(name, n_candidates), max_trees, eta, share, n_jobs
+        )
+        if params is None:
+            continue
+        print(f"[OK] {name} {task}: best {METRICS[task]}={score:.4f} with {params}")
+        report.setdefault(name, {})[task] = {
+            "best_params": params,
+            "metric": METRICS[task],
+            "cv_score": score,
+            "folds": n_folds,
+            "last_date": str(pd.Timestamp(data_frame["date"].max()).date()),
+            "trials": len(trials),
+            "elapsed_seconds": round(time.monotonic() - t0, 2),
+        }
+
+    if out_dir:
+        with open(os.path.join(out_dir, TUNING_REPORT), "w") as f:
+            json.dump(report, f, indent=4, default=str)
+    return report
+
+
+def load_tuned_params(model_dir):
+    """{model: {task: entry}} from a previous tuning run, or {} if none."""
+    path = os.path.join(model_dir, TUNING_REPORT)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
@@ -0,0 +1,138 @@
+# weather_client.py
+"""
+OpenWeather access for the API: one pooled client, a bounded cache and
+single-flight fetches.
+
+* Current weather + forecast for a point are fetched together and cached
+  under (round(lat, 3), round(lon, 3)) for `ttl` seconds. The cache holds
+  at most `max_entries` points and drops the least recently used one.
+* Concurrent misses for the same point share one upstream fetch instead of
+  each calling OpenWeather ("coalesced" in the counters).
+* All requests go through one keep-alive httpx.AsyncClient, so repeated
+  fetches reuse TCP/TLS connections. It is created on first use and closed
+  with `aclose()` on app shutdown.
+
+`base_url` can point at a local fake server (OPENWEATHER_BASE_URL).
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+import httpx
+
+BASE_URL = "https://api.openweathermap.org/data/2.5"
+
+
+class WeatherClient:
+    def __init__(self, base_url=None, api_key=None, ttl=600, max_entries=2048, timeout=10.0,
+                 max_connections=50, max_keepalive=20):
+        self.base_url = (base_url or os.getenv("OPENWEATHER_BASE_URL") or BASE_URL).rstrip("/")
+        self.api_key = api_key
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.cache = OrderedDict()   # key -> (expires_at, (weather, forecast)), least recently used first
+        self.inflight = {}           # key -> asyncio.Task
+        self.client = None
+        self.client_loop = None
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "expired": 0, "evictions": 0,
+                         "upstream_requests": 0, "clients_created": 0}
+
+    @staticmethod
+    def key(lat, lon):
+        return (round(lat, 3), round(lon, 3))
+
+    # ---------------------------
+    # cache
+    # ---------------------------
+    def lookup(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self.cache[key]
+            self.counters["expired"] += 1
+            return None
+        self.cache.move_to_end(key)
+        return value
+
+    def put(self, lat, lon, value):
+        """Store (weather, forecast) for a point, evicting the least recently used entries."""
+        key = self.key(lat, lon)
+        self.cache[key] = (time.monotonic() + self.ttl, value)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def clear(self):
+        self.cache.clear()
+
+    # ---------------------------
+    # fetching
+    # ---------------------------
+    def http(self):
+        # The pool is tied to the event loop it was created in (the test client runs a loop per request)
+        loop = asyncio.get_running_loop()
+        if self.client is None or self.client_loop is not loop or self.client.is_closed:
+            self.client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+            self.client_loop = loop
+            self.counters["clients_created"] += 1
+        return self.client
+
+    async def get(self, lat, lon):
+        """(weather, forecast) JSON for a point, from the cache or a single shared upstream fetch."""
+        key = self.key(lat, lon)
+        value = self.lookup(key)
+        if value is not None:
+            self.counters["hits"] += 1
+            return value
+
+        task = self.inflight.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(task)
+
+        self.counters["misses"] += 1
+        task = asyncio.ensure_future(self.fetch(lat, lon))
+        self.inflight[key] = task
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            if self.inflight.get(key) is task:
+                del self.inflight[key]
+        self.put(lat, lon, value)
+        return value
+
+    async def fetch(self, lat, lon):
+        client = self.http()
+        params = {"lat": lat, "lon": lon, "appid": self.api_key or os.getenv("OPENWEATHER_API_KEY"), "units": "metric"}
+        self.counters["upstream_requests"] += 2
+        try:
+            curr_res, fore_res = await asyncio.gather(client.get("/weather", params=params),
+                                                      client.get("/forecast", params=params))
+            curr_res.raise_for_status()
+            fore_res.raise_for_status()
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        return curr_res.json(), fore_res.json()
+
+    async def aclose(self):
+        if self.client is not None and not self.client.is_closed:
+            await self.client.aclose()
+        self.client = None
+
+    def metrics(self):
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["coalesced"]
+        return {
+            **self.counters,
+            "entries": len(self.cache),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "inflight": len(self.inflight),
+            "hit_ratio": round(self.counters["hits"] / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,120 @@
+# weather_fetch.py
+"""
+Concurrent current-weather fetching for the grid pipeline.
+
+`fetch_grid(points)` gets OpenWeather /weather for every (lat, lon) over one
+pooled httpx.AsyncClient:
+
+* at most `concurrency` requests are in flight;
+* a token bucket keeps the request rate at `rate_per_minute` (our quota;
+  OPENWEATHER_CALLS_PER_MINUTE) with bursts of up to `burst` requests;
+* timeouts, connection errors, 429 and 5xx responses are retried up to
+  `retries` times with exponential backoff and full jitter (a 429's
+  Retry-After is honoured);
+* `progress(done, total)` is called as points complete.
+
+Results come back in input order; a point that still failed is returned as
+its exception, so one bad point does not lose the rest of the grid.
+"""
+import asyncio
+import os
+import random
+import time
+
+import httpx
+
+BASE_URL = "https://api.openweathermap.org/data/2.5"
+RATE_PER_MINUTE = float(os.getenv("OPENWEATHER_CALLS_PER_MINUTE", "60"))
+CONCURRENCY = int(os.getenv("WEATHER_CONCURRENCY", "8"))
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.waited = 0.0
+
+    async def acquire(self):
+        """Wait until a request may be sent."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+                self.waited += wait
+                await asyncio.sleep(wait)
+
+
+def backoff(attempt, base=0.5, cap=30.0):
+    """Full-jitter exponential backoff before retry `attempt` (0-based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RetryableStatus(Exception):
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+
+async def fetch_one(client, bucket, lat, lon, params, retries, stats):
+    for attempt in range(retries + 1):
+        await bucket.acquire()
+        stats["requests"] += 1
+        try:
+            response = await client.get("/weather", params={**params, "lat": lat, "lon": lon})
+            if response.status_code in RETRY_STATUS:
+                raise RetryableStatus(response)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.TransportError, RetryableStatus) as e:
+            if attempt == retries:
+                raise
+            stats["retries"] += 1
+            delay = backoff(attempt)
+            if isinstance(e, RetryableStatus) and e.response.headers.get("retry-after", "").isdigit():
+                delay = max(delay, float(e.response.headers["retry-after"]))
+            await asyncio.sleep(delay)
+
+
+async def fetch_all(points, base_url=None, api_key=None, concurrency=CONCURRENCY, rate_per_minute=RATE_PER_MINUTE,
+                    burst=None, retries=3, timeout=10.0, progress=None, stats=None):
+    """Weather JSON (or the exception) for every (lat, lon) in `points`, in order."""
+    base_url = (base_url or os.getenv("OPENWEATHER_BASE_URL") or BASE_URL).rstrip("/")
+    params = {"appid": api_key or os.getenv("OPENWEATHER_API_KEY"), "units": "metric"}
+    stats = stats if stats is not None else {}
+    stats.update(requests=0, retries=0, failed=0)
+    bucket = TokenBucket(rate_per_minute, burst)
+    gate = asyncio.Semaphore(concurrency)
+    results = [None] * len(points)
+    done = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def one(i, lat, lon):
+            nonlocal done
+            async with gate:
+                try:
+                    results[i] = await fetch_one(client, bucket, lat, lon, params, retries, stats)
+                except Exception as e:
+                    stats["failed"] += 1
+                    results[i] = e
+            done += 1
+            if progress:
+                progress(done, len(points))
+
+        await asyncio.gather(*[one(i, lat, lon) for i, (lat, lon) in enumerate(points)])
+    stats["rate_wait_seconds"] = round(bucket.waited, 3)
+    return results
+
+
+def fetch_grid(points, **kwargs):
+    """Blocking wrapper around fetch_all for scripts and worker threads."""
+    return asyncio.run(fetch_all(points, **kwargs))